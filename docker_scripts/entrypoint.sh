@@ -15,6 +15,9 @@ done
 # Run database migrations
 python ./manage.py migrate
 
+# Create the database cache table, if it doesn't already exist
+python ./manage.py createcachetable
+
 if [ "$DJANGO_RUN_ENV" = "dev" ]; then
   # Create default superuser for dev environment, using django env vars.
   # Logs will show error if this exists, which is OK.
@@ -36,6 +39,16 @@ else
   # -w number of gunicorn worker processes
   # -b IPADDR:PORT binding
   # --access-logfile where to send HTTP access logs (- is stdout)
-  export GUNICORN_CMD_ARGS="-w 3 -b 0.0.0.0:8000 --access-logfile -"
-  gunicorn project.wsgi:application
+  # -k worker class: uvicorn workers serve the ASGI application, so update streams
+  #    are held open by async connections instead of tying up a worker each, and
+  #    the async display views don't block a worker while waiting on LibCal
+  export GUNICORN_CMD_ARGS="-w 3 -b 0.0.0.0:8000 --access-logfile - -k uvicorn_worker.UvicornWorker"
+  # Each process writes its metrics to files here, and /metrics adds them all up.
+  # Start fresh each time, so counts from old processes aren't included.
+  export PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus_multiproc
+  rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+  mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+  # Keep LibCal data in the cache fresh in the background, so signs don't wait on LibCal
+  python ./manage.py prefetch_signage &
+  gunicorn project.asgi:application
 fi
@@ -55,7 +55,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "signs.middleware.AsyncWhiteNoiseMiddleware",
+    "signs.middleware.ServerTimingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -97,6 +98,22 @@ DATABASES = {
     }
 }
 
+# Caching
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The database cache is shared by all gunicorn workers.
+# Its table is created by "python manage.py createcachetable".
+# Once it has more than MAX_ENTRIES entries, a third of them are deleted, so
+# MAX_ENTRIES must be well above the number of keys the signs use (see README).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "signs_cache",
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("DJANGO_CACHE_MAX_ENTRIES", 20000)),
+        },
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -160,24 +177,32 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 LOGOUT_REDIRECT_URL = "/"
 
 # Logging
+# Log file, which is rotated when it reaches LOG_MAX_BYTES bytes,
+# keeping LOG_BACKUP_COUNT old files (application.log.1 being the newest)
+LOG_FILE = "./logs/application.log"
+LOG_MAX_BYTES = int(os.getenv("DJANGO_LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("DJANGO_LOG_BACKUP_COUNT", 5))
+# Maximum number of log records waiting to be written. Records are written by a
+# background thread, and dropped if the queue is full, so logging never blocks.
+LOG_QUEUE_SIZE = int(os.getenv("DJANGO_LOG_QUEUE_SIZE", 10000))
+# Log messages longer than this many characters are truncated
+LOG_MAX_MESSAGE_LENGTH = int(os.getenv("DJANGO_LOG_MAX_MESSAGE_LENGTH", 2000))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
-    "formatters": {
-        "verbose": {
-            "format": "{levelname} {asctime} {name} {module} {message}",
-            # Shortcut for str.format()
-            "style": "{",
-        },
-    },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
         },
+        # Writes records to LOG_FILE as JSON, one per line, from a background thread
         "file": {
-            "class": "logging.FileHandler",
-            "filename": "./logs/application.log",
-            "formatter": "verbose",
+            "()": "signs.log_handlers.get_queue_handler",
+            "filename": LOG_FILE,
+            "max_bytes": LOG_MAX_BYTES,
+            "backup_count": LOG_BACKUP_COUNT,
+            "queue_size": LOG_QUEUE_SIZE,
+            "max_message_length": LOG_MAX_MESSAGE_LENGTH,
         },
     },
     "loggers": {
@@ -192,3 +217,88 @@ LOGGING = {
 # LibCal widget URLs
 LIBCAL_HOURS_WIDGET = os.getenv("DJANGO_LIBCAL_HOURS_WIDGET")
 LIBCAL_EVENTS_WIDGET = os.getenv("DJANGO_LIBCAL_EVENTS_WIDGET")
+
+# LibCal API, used for events instead of the events widget when credentials are set
+LIBCAL_API_URL = os.getenv(
+    "DJANGO_LIBCAL_API_URL", "https://calendar.library.ucla.edu/1.1/"
+)
+LIBCAL_API_CLIENT_ID = os.getenv("DJANGO_LIBCAL_API_CLIENT_ID")
+LIBCAL_API_CLIENT_SECRET = os.getenv("DJANGO_LIBCAL_API_CLIENT_SECRET")
+# Maximum number of events requested from the LibCal API
+LIBCAL_API_EVENTS_LIMIT = int(os.getenv("DJANGO_LIBCAL_API_EVENTS_LIMIT", 100))
+
+# LibCal requests: seconds to wait for a connection and for a response,
+# number of retries, backoff factor between retries (seconds, doubling each retry),
+# and number of connections kept alive per host in each process
+LIBCAL_CONNECT_TIMEOUT = float(os.getenv("DJANGO_LIBCAL_CONNECT_TIMEOUT", 3.05))
+LIBCAL_READ_TIMEOUT = float(os.getenv("DJANGO_LIBCAL_READ_TIMEOUT", 10))
+LIBCAL_MAX_RETRIES = int(os.getenv("DJANGO_LIBCAL_MAX_RETRIES", 2))
+LIBCAL_RETRY_BACKOFF = float(os.getenv("DJANGO_LIBCAL_RETRY_BACKOFF", 0.5))
+LIBCAL_POOL_SIZE = int(os.getenv("DJANGO_LIBCAL_POOL_SIZE", 10))
+
+# Number of seconds LibCal hours responses are cached before being requested again
+LIBCAL_HOURS_CACHE_TTL = int(os.getenv("DJANGO_LIBCAL_HOURS_CACHE_TTL", 900))
+# Maximum number of weeks of hours requested from LibCal, for date ranges of hours
+LIBCAL_HOURS_MAX_WEEKS = int(os.getenv("DJANGO_LIBCAL_HOURS_MAX_WEEKS", 16))
+# Number of seconds rendered display_hours pages are cached. Pages are also
+# re-rendered whenever the hours or location name change, or the date changes.
+SIGNS_PAGE_CACHE_TTL = int(os.getenv("DJANGO_SIGNS_PAGE_CACHE_TTL", 86400))
+# Maximum number of rendered pages also kept in each process's memory (0 for none)
+SIGNS_LOCAL_PAGE_CACHE_ENTRIES = int(
+    os.getenv("DJANGO_SIGNS_LOCAL_PAGE_CACHE_ENTRIES", 1000)
+)
+# Whether formatted hours are stored in HoursSnapshot, and read from it when there
+# are no current cached hours
+SIGNS_HOURS_SNAPSHOTS = os.getenv("DJANGO_SIGNS_HOURS_SNAPSHOTS", "True") == "True"
+# Number of seconds players and proxies may cache display pages (Cache-Control max-age)
+SIGNS_DISPLAY_MAX_AGE = int(os.getenv("DJANGO_SIGNS_DISPLAY_MAX_AGE", 60))
+# Number of seconds between display shells' requests to the JSON API
+SIGNS_LIVE_POLL_INTERVAL = int(os.getenv("DJANGO_SIGNS_LIVE_POLL_INTERVAL", 60))
+# Number of seconds between checks for changes to the data behind update streams.
+# Each process checks once per interval, however many displays are connected.
+SIGNS_STREAM_CHECK_INTERVAL = float(os.getenv("DJANGO_SIGNS_STREAM_CHECK_INTERVAL", 5))
+# Number of seconds between comments sent to keep idle update streams open
+SIGNS_STREAM_KEEPALIVE = float(os.getenv("DJANGO_SIGNS_STREAM_KEEPALIVE", 15))
+# Number of seconds before update streams are closed, and displays reconnect
+SIGNS_STREAM_MAX_AGE = float(os.getenv("DJANGO_SIGNS_STREAM_MAX_AGE", 3600))
+# Maximum number of seconds each process keeps location names before reloading them.
+# Changes made in a process take effect there immediately.
+SIGNS_LOCATION_REGISTRY_TTL = int(os.getenv("DJANGO_SIGNS_LOCATION_REGISTRY_TTL", 60))
+# /metrics is only returned to requests from these addresses or networks
+# (comma separated), or with the token in an "Authorization: Bearer" header.
+# Don't allow the ingress's addresses, since it forwards public requests.
+SIGNS_METRICS_ALLOWED_IPS = os.getenv(
+    "DJANGO_SIGNS_METRICS_ALLOWED_IPS", "127.0.0.1,::1"
+).split(",")
+SIGNS_METRICS_TOKEN = os.getenv("DJANGO_SIGNS_METRICS_TOKEN")
+# Directory render_signs writes static copies of the display pages to
+SIGNS_SNAPSHOT_ROOT = os.getenv(
+    "DJANGO_SIGNS_SNAPSHOT_ROOT", os.path.join(BASE_DIR, "snapshots")
+)
+# Maximum number of concurrent background refreshes of stale hours per process
+LIBCAL_REFRESH_MAX_WORKERS = int(os.getenv("DJANGO_LIBCAL_REFRESH_MAX_WORKERS", 2))
+# Number of seconds formatted LibCal events are cached before being requested again
+LIBCAL_EVENTS_CACHE_TTL = int(os.getenv("DJANGO_LIBCAL_EVENTS_CACHE_TTL", 300))
+# Concurrent requests for the same LibCal data share one fetch.
+# Seconds a process may hold the shared fetch lock, seconds to wait for another
+# fetch's result before fetching directly, and seconds between checks for it.
+LIBCAL_FETCH_LOCK_TIMEOUT = int(os.getenv("DJANGO_LIBCAL_FETCH_LOCK_TIMEOUT", 45))
+LIBCAL_FETCH_WAIT = float(os.getenv("DJANGO_LIBCAL_FETCH_WAIT", 15))
+LIBCAL_FETCH_POLL_INTERVAL = float(os.getenv("DJANGO_LIBCAL_FETCH_POLL_INTERVAL", 0.1))
+
+# Maximum number of concurrent LibCal events requests per process
+LIBCAL_EVENTS_MAX_WORKERS = int(os.getenv("DJANGO_LIBCAL_EVENTS_MAX_WORKERS", 8))
+# Number of seconds to wait for all locations' events before displaying what's available
+LIBCAL_EVENTS_DEADLINE = float(os.getenv("DJANGO_LIBCAL_EVENTS_DEADLINE", 10))
+# Default part of the day shown by display_clicc_events, and minutes per grid row.
+# Displays can override these with ?start=07:00&end=22:00&slot=15.
+# Slots must divide an hour evenly.
+SIGNS_EVENTS_WINDOW_START = os.getenv("DJANGO_SIGNS_EVENTS_WINDOW_START", "08:00")
+SIGNS_EVENTS_WINDOW_END = os.getenv("DJANGO_SIGNS_EVENTS_WINDOW_END", "20:00")
+SIGNS_EVENTS_SLOT_MINUTES = int(os.getenv("DJANGO_SIGNS_EVENTS_SLOT_MINUTES", 30))
+
+# Number of seconds between prefetch_signage refreshes of the cache.
+# This should be shorter than the cache TTLs, so entries don't expire between runs.
+SIGNAGE_PREFETCH_INTERVAL = int(os.getenv("DJANGO_SIGNAGE_PREFETCH_INTERVAL", 240))
+# Maximum number of seconds prefetch_signage waits between LibCal requests
+SIGNAGE_PREFETCH_JITTER = float(os.getenv("DJANGO_SIGNAGE_PREFETCH_JITTER", 2))
@@ -1,5 +1,24 @@
 from django.contrib import admin
-from signs.models import Location
+from signs.models import EventRoom, EventScreen, HoursSnapshot, Location
 from signs.forms import LocationForm
 
+
+class EventRoomInline(admin.TabularInline):
+    model = EventRoom
+    extra = 1
+
+
+class EventScreenAdmin(admin.ModelAdmin):
+    list_display = ["name", "slug"]
+    inlines = [EventRoomInline]
+
+
+class HoursSnapshotAdmin(admin.ModelAdmin):
+    list_display = ["location_id", "date", "weekday", "rendered_hours", "fetched_at"]
+    list_filter = ["location_id"]
+    date_hierarchy = "date"
+
+
 admin.site.register(Location)
+admin.site.register(EventScreen, EventScreenAdmin)
+admin.site.register(HoursSnapshot, HoursSnapshotAdmin)
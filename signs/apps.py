@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SignsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'signs'
+
+    def ready(self):
+        # Connect the signals which keep the location registry up to date
+        from signs import location_registry  # noqa: F401
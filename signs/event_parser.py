@@ -0,0 +1,109 @@
+from html.parser import HTMLParser
+
+
+class EventListParser(HTMLParser):
+    """Extract events from LibCal events widget HTML in a single pass.
+
+    Events are in the form <li><a>Event Title</a><span>Event Times</span></li>.
+    For each <li>, in document order, the text of its first <a> and first <span>
+    descendants is collected, matching BeautifulSoup's li.find("a").text and
+    li.find("span").text with its html.parser builder, without building a
+    document tree. Malformed markup is handled as that builder handles it:
+    an end tag closes every tag opened since the matching start tag, and end
+    tags without one are ignored."""
+
+    # Tags whose text is collected for each <li>, and the event keys they fill
+    FIELDS = {"a": "title", "span": "times"}
+    # Tags without content or end tags, which are never left open
+    VOID_ELEMENTS = set(
+        "area base basefont bgsound br col command embed frame hr image img input "
+        "isindex keygen link menuitem meta nextid param source spacer track wbr".split()
+    )
+    # Tags whose text isn't part of their ancestors' text
+    STRING_CONTAINERS = {"rp", "rt", "script", "style", "template"}
+    # Tags whose text is collected with its whitespace intact
+    PRESERVE_WHITESPACE = {"pre", "textarea"}
+    ASCII_SPACES = " \n\t\x0c\r"
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.events = []
+        # Names of the open tags, innermost last
+        self.open_tags = []
+        # Open <li> elements, innermost last
+        self.open_items = []
+        # Text since the last tag, which is collected when the next one starts
+        self.pending_data = []
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        self.collect_data()
+        if tag in self.VOID_ELEMENTS:
+            return
+        level = len(self.open_tags)
+        if tag in self.FIELDS:
+            for item in self.open_items:
+                # Only the first matching descendant of each <li> is used
+                if tag not in item["found"]:
+                    item["found"].add(tag)
+                    # capturing maps tags whose text is being collected
+                    # to the level in open_tags they started at
+                    item["capturing"][tag] = level
+        self.open_tags.append(tag)
+        if tag == "li":
+            event = {"title": "", "times": ""}
+            self.events.append(event)
+            self.open_items.append(
+                {"event": event, "level": level, "found": set(), "capturing": {}}
+            )
+
+    def handle_endtag(self, tag: str) -> None:
+        self.collect_data()
+        if tag not in self.open_tags:
+            return
+        # Closing a tag also closes any tags opened inside it
+        level = len(self.open_tags) - 1 - self.open_tags[::-1].index(tag)
+        del self.open_tags[level:]
+        while self.open_items and self.open_items[-1]["level"] >= level:
+            self.open_items.pop()
+        for item in self.open_items:
+            for field_tag, started in list(item["capturing"].items()):
+                if started >= level:
+                    del item["capturing"][field_tag]
+
+    def handle_data(self, data: str) -> None:
+        self.pending_data.append(data)
+
+    def handle_comment(self, data: str) -> None:
+        self.collect_data()
+
+    def collect_data(self) -> None:
+        """Add the text since the last tag to the fields being collected."""
+        if not self.pending_data:
+            return
+        data = "".join(self.pending_data)
+        self.pending_data = []
+        if not any(item["capturing"] for item in self.open_items):
+            return
+        if self.STRING_CONTAINERS.intersection(self.open_tags):
+            return
+        preserve_whitespace = self.PRESERVE_WHITESPACE.intersection(self.open_tags)
+        if not preserve_whitespace and not data.strip(self.ASCII_SPACES):
+            # Whitespace between tags is collapsed
+            data = "\n" if "\n" in data else " "
+        for item in self.open_items:
+            for tag in item["capturing"]:
+                item["event"][self.FIELDS[tag]] += data
+
+    def close(self) -> list[dict]:
+        """Finish parsing, and return the events found."""
+        super().close()
+        self.collect_data()
+        return self.events
+
+
+def extract_events(html: str) -> list[dict]:
+    """Return a list of events in LibCal events widget HTML,
+    each as a dictionary with title and times."""
+    parser = EventListParser()
+    parser.feed(html)
+    return parser.close()
@@ -1,4 +1,5 @@
 from django import forms
+from signs.log_reader import LOG_LEVELS
 from signs.models import Location
 
 
@@ -18,3 +19,13 @@ class LocationForm(forms.ModelForm):
     class Meta:
         model = Location
         fields = []
+
+
+# LogFilterForm used in show_log view
+class LogFilterForm(forms.Form):
+    level = forms.ChoiceField(
+        choices=[("", "All levels")]
+        + [(level, f"{level} and above") for level in LOG_LEVELS],
+        required=False,
+    )
+    contains = forms.CharField(required=False, label="Containing")
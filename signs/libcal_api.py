@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import requests
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from signs import libcal_client, single_flight
+from signs.log_handlers import Abbreviated
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a token's expiry to stop using it, so it doesn't expire mid-request
+TOKEN_EXPIRY_MARGIN = 60
+
+
+class LibCalAPIError(Exception):
+    """Raised when the LibCal API can't be reached or returns an error."""
+
+
+def is_configured() -> bool:
+    """Return whether LibCal API credentials are set, so events can be
+    requested from the JSON API instead of the events widget."""
+    return bool(settings.LIBCAL_API_CLIENT_ID and settings.LIBCAL_API_CLIENT_SECRET)
+
+
+def get_access_token() -> str:
+    """Return an OAuth access token for the LibCal API, cached until shortly
+    before it expires."""
+    cache_key = get_token_cache_key()
+    token = cache.get(cache_key)
+    if token is not None:
+        return token
+
+    # Only one worker at a time needs to ask for a new token
+    return single_flight.call(
+        cache_key, request_access_token, lambda: cache.get(cache_key)
+    )
+
+
+def request_access_token() -> str:
+    """Request a new OAuth access token from the LibCal API, and cache it."""
+    try:
+        response = libcal_client.post(
+            f"{settings.LIBCAL_API_URL}oauth/token",
+            data={
+                "client_id": settings.LIBCAL_API_CLIENT_ID,
+                "client_secret": settings.LIBCAL_API_CLIENT_SECRET,
+                "grant_type": "client_credentials",
+            },
+        )
+        response.raise_for_status()
+        data = response.json()
+        token = data["access_token"]
+    except (requests.RequestException, ValueError, KeyError) as e:
+        raise LibCalAPIError(f"Unable to get LibCal API token: {e}") from e
+
+    timeout = int(data.get("expires_in", 3600)) - TOKEN_EXPIRY_MARGIN
+    if timeout > 0:
+        cache.set(get_token_cache_key(), token, timeout)
+    return token
+
+
+def get_token_cache_key() -> str:
+    """Return the cache key for the LibCal API access token."""
+    key_parts = f"{settings.LIBCAL_API_URL}|{settings.LIBCAL_API_CLIENT_ID}"
+    return f"libcal-api-token:{hashlib.sha256(key_parts.encode()).hexdigest()}"
+
+
+def get_events(calendar_ids: list[int], days: int = 0) -> dict[int, list[dict]]:
+    """Get events for several LibCal calendars in one request.
+    Returns each calendar's events, by calendar ID, as dicts with title and
+    start and end (as timezone-aware datetimes in the current time zone).
+    Malformed events are logged and skipped; raises LibCalAPIError if the
+    request fails, or the response isn't a list of events."""
+    response = request_events(calendar_ids, days, get_access_token())
+    if response.status_code == 401:
+        # The token was revoked or expired early, so get a new one and try again
+        cache.delete(get_token_cache_key())
+        response = request_events(calendar_ids, days, get_access_token())
+
+    try:
+        response.raise_for_status()
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        raise LibCalAPIError(f"Unable to get LibCal events: {e}") from e
+
+    if not isinstance(data, dict) or not isinstance(data.get("events", []), list):
+        raise LibCalAPIError(f"Unexpected LibCal events response: {Abbreviated(data)}")
+
+    events = {calendar_id: [] for calendar_id in calendar_ids}
+    for event in data.get("events", []):
+        try:
+            calendar_id = event["calendar"]["id"]
+            if calendar_id not in events:
+                continue
+            start = timezone.localtime(datetime.fromisoformat(event["start"]))
+            end = timezone.localtime(datetime.fromisoformat(event["end"]))
+            title = event["title"]
+        except (KeyError, TypeError, ValueError):
+            # e.g. a missing field, or a time without its UTC offset.
+            # One bad event mustn't hide every calendar's other events.
+            logger.error("Skipping malformed LibCal event: %s", Abbreviated(event))
+            continue
+        events[calendar_id].append({"title": title, "start": start, "end": end})
+    return events
+
+
+def request_events(calendar_ids: list[int], days: int, token: str) -> requests.Response:
+    """Make a single events request for several calendars."""
+    try:
+        return libcal_client.get(
+            f"{settings.LIBCAL_API_URL}events",
+            params={
+                "cal_id": ",".join(str(calendar_id) for calendar_id in calendar_ids),
+                "days": days,
+                "limit": settings.LIBCAL_API_EVENTS_LIMIT,
+            },
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    except requests.RequestException as e:
+        raise LibCalAPIError(f"Unable to get LibCal events: {e}") from e
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import threading
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from signs import metrics
+
+# Each process has its own session, so connections aren't shared between
+# gunicorn workers after they fork.
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+# The async client, and the event loop it was created in. Its connections
+# can only be used in that loop, e.g. a uvicorn worker's.
+_async_client = None
+_async_client_loop = None
+
+# Responses which are retried, as by the session's Retry
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+def get(
+    url: str, params: dict | None = None, headers: dict | None = None
+) -> requests.Response:
+    """Make a GET request to LibCal, using this process's pooled session.
+    Raises requests.RequestException if LibCal can't be reached."""
+    return send("GET", url, params=params, headers=headers)
+
+
+def post(url: str, data: dict) -> requests.Response:
+    """Make a POST request to LibCal, using this process's pooled session.
+    Raises requests.RequestException if LibCal can't be reached."""
+    return send("POST", url, data=data)
+
+
+async def aget(
+    url: str, params: dict | None = None, headers: dict | None = None
+) -> httpx.Response:
+    """Make a GET request to LibCal without blocking the event loop, for async
+    views, retrying like get(). Raises httpx.HTTPError if LibCal can't be reached."""
+    metrics.LIBCAL_REQUESTS.labels("GET").inc()
+    try:
+        with metrics.timed("libcal"):
+            response = await send_with_retries(
+                get_async_client(), url, params=params, headers=headers
+            )
+    except httpx.HTTPError as e:
+        metrics.LIBCAL_ERRORS.labels(type(e).__name__).inc()
+        raise
+    if response.status_code >= 400:
+        metrics.LIBCAL_ERRORS.labels(f"HTTP {response.status_code}").inc()
+    return response
+
+
+async def send_with_retries(
+    client: httpx.AsyncClient, url: str, **kwargs
+) -> httpx.Response:
+    """Make a GET request, retrying connection errors and RETRY_STATUSES
+    up to LIBCAL_MAX_RETRIES times, with exponential backoff. After the last
+    retry, LibCal's response is returned."""
+    for attempt in range(settings.LIBCAL_MAX_RETRIES + 1):
+        if attempt > 1:
+            # Like urllib3's Retry, the first retry is immediate
+            await asyncio.sleep(settings.LIBCAL_RETRY_BACKOFF * 2 ** (attempt - 1))
+        last_attempt = attempt == settings.LIBCAL_MAX_RETRIES
+        try:
+            response = await client.get(url, **kwargs)
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+            continue
+        if last_attempt or response.status_code not in RETRY_STATUSES:
+            return response
+
+
+def send(method: str, url: str, **kwargs) -> requests.Response:
+    """Make a request to LibCal, recording its time, and any error, in the metrics.
+    Retries are part of the same request."""
+    metrics.LIBCAL_REQUESTS.labels(method).inc()
+    try:
+        with metrics.timed("libcal"):
+            response = get_session().request(
+                method, url, timeout=get_timeout(), **kwargs
+            )
+    except requests.RequestException as e:
+        metrics.LIBCAL_ERRORS.labels(type(e).__name__).inc()
+        raise
+    if response.status_code >= 400:
+        metrics.LIBCAL_ERRORS.labels(f"HTTP {response.status_code}").inc()
+    return response
+
+
+def get_session() -> requests.Session:
+    """Return this process's LibCal session, creating it if needed."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = create_session()
+            _session_pid = os.getpid()
+        return _session
+
+
+def close_session() -> None:
+    """Close this process's LibCal session and its pooled connections, and
+    discard the async client. The next request creates a new session or client,
+    using the current settings."""
+    global _session, _session_pid, _async_client, _async_client_loop
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pid = None
+    # The async client can only be closed in its own loop, which may have ended,
+    # so its connections are closed when it's garbage collected
+    _async_client = None
+    _async_client_loop = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the async client for the running event loop, creating it if needed.
+    Under ASGI, each worker's loop keeps its client, and its connections alive.
+    Under WSGI, async views run in a new loop for each request, so each request
+    has its own client."""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = create_async_client()
+        _async_client_loop = loop
+    return _async_client
+
+
+def create_async_client() -> httpx.AsyncClient:
+    """Create an async client which keeps connections to LibCal alive."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            settings.LIBCAL_READ_TIMEOUT, connect=settings.LIBCAL_CONNECT_TIMEOUT
+        ),
+        limits=httpx.Limits(max_keepalive_connections=settings.LIBCAL_POOL_SIZE),
+    )
+
+
+def create_session() -> requests.Session:
+    """Create a session which keeps connections to LibCal alive, and retries
+    failed requests with exponential backoff."""
+    retry = Retry(
+        total=settings.LIBCAL_MAX_RETRIES,
+        backoff_factor=settings.LIBCAL_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        # After the last retry, return LibCal's response instead of raising,
+        # so callers can check and log the status.
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=settings.LIBCAL_POOL_SIZE)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_timeout() -> tuple[float, float]:
+    """Return the (connect, read) timeouts for LibCal requests, in seconds."""
+    return (settings.LIBCAL_CONNECT_TIMEOUT, settings.LIBCAL_READ_TIMEOUT)
@@ -0,0 +1,192 @@
+import json
+import random
+import threading
+import time
+from collections import namedtuple
+from collections.abc import Callable
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from django.utils import timezone
+
+# Paths of the LibCal widgets in DJANGO_LIBCAL_HOURS_WIDGET and
+# DJANGO_LIBCAL_EVENTS_WIDGET
+HOURS_WIDGET_PATH = "/widget/hours/grid"
+EVENTS_WIDGET_PATH = "/api_events.php"
+
+StubRequest = namedtuple(
+    "StubRequest", ["path", "query", "client_address", "method", "headers", "body"]
+)
+
+
+class LibCalStubServer:
+    """A local HTTP server standing in for LibCal, for tests and benchmarks.
+
+    Responses are registered by path with add_response(), or generated for
+    each request by a handler registered with add_handler(). Every request is
+    recorded in requests, as a StubRequest.
+
+    Every response is delayed by latency seconds. A fraction error_rate of
+    requests, chosen at random (reproducibly, given a seed), get a 503 error.
+    Use as a context manager, or call start() and stop()."""
+
+    def __init__(self, latency: float = 0, error_rate: float = 0, seed=None):
+        self.responses = {}
+        self.handlers = {}
+        self.requests = []
+        self.latency = latency
+        self.error_rate = error_rate
+        self.errors = 0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.make_handler())
+        self.server.daemon_threads = True
+        # Poll often, so stop() doesn't slow down tests
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            daemon=True,
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def add_response(
+        self,
+        path: str,
+        body: str | bytes,
+        status: int = 200,
+        content_type: str = "text/html",
+        delay: float = 0,
+    ) -> None:
+        """Register a response for a path. Registering the same path several
+        times queues the responses, and the last one is repeated."""
+        if isinstance(body, str):
+            body = body.encode()
+        with self.lock:
+            self.responses.setdefault(path, []).append(
+                (status, body, content_type, delay)
+            )
+
+    def add_handler(
+        self, path: str, handler: Callable[[dict[str, list[str]]], tuple[int, str, str]]
+    ) -> None:
+        """Register a function which returns the (status, body, content type)
+        of the response to each request for a path, given its query parameters."""
+        with self.lock:
+            self.handlers[path] = handler
+
+    def add_fixture_responses(self, fixtures_dir: str = "signs/fixtures") -> None:
+        """Respond to the hours and events widgets with responses from the
+        test fixtures, for any location. Hours are moved to the current week."""
+        with open(f"{fixtures_dir}/libcal_hours_response_two_weeks.json") as f:
+            hours = json.load(f)
+        with open(f"{fixtures_dir}/libcal_events_response_3363.html") as f:
+            events = f.read()
+        self.add_handler(
+            HOURS_WIDGET_PATH, lambda query: get_hours_response(hours, query)
+        )
+        self.add_handler(EVENTS_WIDGET_PATH, lambda query: (200, events, "text/html"))
+
+    def get_response(self, path: str, query: str) -> tuple[int, bytes, str, float]:
+        with self.lock:
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                return (503, b"Unavailable", "text/plain", 0)
+            handler = self.handlers.get(path)
+            queue = self.responses.get(path)
+        if handler is not None:
+            status, body, content_type = handler(parse_qs(query))
+            return (status, body.encode(), content_type, 0)
+        with self.lock:
+            if not queue:
+                return (404, b"Not found", "text/plain", 0)
+            return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    def record_request(self, request: StubRequest) -> None:
+        with self.lock:
+            self.requests.append(request)
+
+    def make_handler(self) -> type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1, so clients can keep connections alive
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.respond(b"")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.respond(self.rfile.read(length))
+
+            def respond(self, body: bytes):
+                path, _, query = self.path.partition("?")
+                stub.record_request(
+                    StubRequest(
+                        path,
+                        query,
+                        self.client_address,
+                        self.command,
+                        dict(self.headers),
+                        body,
+                    )
+                )
+                status, response_body, content_type, delay = stub.get_response(
+                    path, query
+                )
+                time.sleep(stub.latency + delay)
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(response_body)))
+                    self.end_headers()
+                    self.wfile.write(response_body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up waiting, e.g. after a timeout
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                # Keep test output quiet
+                pass
+
+        return Handler
+
+    def start(self) -> "LibCalStubServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "LibCalStubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def get_hours_response(
+    hours: dict, query: dict[str, list[str]]
+) -> tuple[int, str, str]:
+    """Return an hours widget response for the requested location, using the
+    hours of the first location in hours, moved to weeks starting this Sunday."""
+    location_id = query.get("lid", ["0"])[0]
+    location = dict(next(iter(hours.values())))
+    location.update({"lid": int(location_id), "parent_lid": None})
+    first_day = date.fromisoformat(location["weeks"][0]["Sunday"]["date"])
+    today = timezone.localdate()
+    offset = today - timedelta(days=(today.weekday() + 1) % 7) - first_day
+    location["weeks"] = [
+        {
+            weekday: day
+            | {"date": (date.fromisoformat(day["date"]) + offset).isoformat()}
+            for weekday, day in week.items()
+        }
+        for week in location["weeks"]
+    ]
+    return (200, json.dumps({f"loc_{location_id}": location}), "application/json")
@@ -0,0 +1,76 @@
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from signs.models import Location
+
+# Location names by LibCal location ID, loaded from the database when first
+# needed, and reloaded after locations change or the registry expires.
+locations: dict[int, str] | None = None
+loaded_at = 0.0
+# Incremented whenever the registry is invalidated, so a load which started
+# before a change doesn't replace the registry with old data
+generation = 0
+lock = threading.Lock()
+
+
+def get_location_name(location_id: int) -> str | None:
+    """Return the name of the location with this LibCal ID, or None if there's
+    no such location. Names are usually returned without a database query."""
+    return get_locations().get(location_id)
+
+
+async def aget_location_name(location_id: int) -> str | None:
+    """Async version of get_location_name, for async views. When the registry
+    needs loading, it's loaded in a thread, so the event loop isn't blocked."""
+    current = locations
+    if current is None or is_expired():
+        current = await sync_to_async(get_locations)()
+    return current.get(location_id)
+
+
+def get_locations() -> dict[int, str]:
+    """Return location names by LibCal location ID."""
+    global locations, loaded_at
+    current = locations
+    if current is not None and not is_expired():
+        return current
+
+    with lock:
+        # Another thread may have loaded the registry while this one waited
+        if locations is not None and not is_expired():
+            return locations
+        started = generation
+        loaded = dict(Location.objects.values_list("location_id", "name"))
+        if started == generation:
+            locations = loaded
+            loaded_at = time.monotonic()
+        return loaded
+
+
+def is_expired() -> bool:
+    """Return whether the registry is older than SIGNS_LOCATION_REGISTRY_TTL.
+    Signals only reach the process which changed a location, so other
+    processes see changes when their registry expires."""
+    return time.monotonic() - loaded_at >= settings.SIGNS_LOCATION_REGISTRY_TTL
+
+
+def invalidate() -> None:
+    """Discard the registry, so it's reloaded when next needed."""
+    global locations, generation
+    with lock:
+        locations = None
+        generation += 1
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def location_changed(sender, **kwargs) -> None:
+    """Invalidate the registry when a location is saved or deleted."""
+    invalidate()
+    # Invalidate again once the change is committed, in case the registry was
+    # reloaded in the meantime, before the change was visible
+    transaction.on_commit(invalidate)
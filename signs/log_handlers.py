@@ -0,0 +1,165 @@
+import atexit
+import copy
+import fcntl
+import json
+import logging
+import os
+import queue
+import reprlib
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Limits on the size of logged data, e.g. LibCal responses, so an outage
+# doesn't write whole responses to the log on every request
+abbreviated_repr = reprlib.Repr()
+abbreviated_repr.maxlevel = 3
+abbreviated_repr.maxdict = 10
+abbreviated_repr.maxlist = 10
+abbreviated_repr.maxstring = 200
+abbreviated_repr.maxother = 200
+# Maximum length of an abbreviated value, however deeply it's nested
+ABBREVIATED_MAX_LENGTH = 1000
+
+
+class Abbreviated:
+    """Wrap a log message argument, so it's logged with reprlib's limits on the
+    size of strings, lists and dicts. The argument is only formatted if the
+    record is logged, e.g. logger.error("Bad response: %s", Abbreviated(data))."""
+
+    def __init__(self, value: object):
+        self.value = value
+
+    def __str__(self) -> str:
+        text = abbreviated_repr.repr(self.value)
+        if len(text) > ABBREVIATED_MAX_LENGTH:
+            return f"{text[:ABBREVIATED_MAX_LENGTH]}..."
+        return text
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as JSON objects, one per line, with any traceback
+    in the same line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            # signs.log_reader looks for the level first
+            "level": record.levelname,
+            "time": datetime.fromtimestamp(record.created).astimezone().isoformat(),
+            "name": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["traceback"] = record.exc_text
+        return json.dumps(data)
+
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler for a log file written by several processes, e.g.
+    gunicorn's workers and prefetch_signage. Each record is written while
+    holding a lock on filename.lock, so only one process rotates the file.
+    As in WatchedFileHandler, the file is reopened if another process has
+    rotated it, so records aren't written to a renamed backup."""
+
+    def __init__(self, filename: str, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.lock_filename = f"{self.baseFilename}.lock"
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            with open(self.lock_filename, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # The lock is released when the file is closed
+                self.reopen_if_rotated()
+                super().emit(record)
+        except Exception:
+            self.handleError(record)
+
+    def reopen_if_rotated(self) -> None:
+        """Reopen the log file if it isn't the file at filename any more."""
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is None or (current.st_dev, current.st_ino) != (
+            opened.st_dev,
+            opened.st_ino,
+        ):
+            self.stream.close()
+            self.stream = self._open()
+
+
+class LogQueueHandler(QueueHandler):
+    """Queue records for a QueueListener thread to write, so logging doesn't
+    block on file writes. If the queue is full, records are dropped rather
+    than waiting."""
+
+    def __init__(self, log_queue: queue.Queue, max_message_length: int):
+        super().__init__(log_queue)
+        self.max_message_length = max_message_length
+        # Number of records dropped because the queue was full, not yet logged
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Format the message and traceback now, since the arguments may change
+        or not be safe to use in the listener's thread. Unlike QueueHandler,
+        keep the traceback separate from the message, for JSONFormatter."""
+        message = record.getMessage()
+        if len(message) > self.max_message_length:
+            omitted = len(message) - self.max_message_length
+            message = f"{message[:self.max_message_length]}... ({omitted} more)"
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.dropped:
+                self.queue.put_nowait(self.get_dropped_record())
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def get_dropped_record(self) -> logging.LogRecord:
+        """Return a record saying how many records were dropped."""
+        return logging.makeLogRecord(
+            {
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"Log queue was full, {self.dropped} records dropped",
+            }
+        )
+
+
+def get_queue_handler(
+    filename: str,
+    max_bytes: int,
+    backup_count: int,
+    queue_size: int,
+    max_message_length: int,
+) -> LogQueueHandler:
+    """Return a handler which queues records, and start a listener thread which
+    writes them to a rotating log file as JSON. Used by LOGGING in settings."""
+    file_handler = SharedRotatingFileHandler(
+        filename, maxBytes=max_bytes, backupCount=backup_count
+    )
+    file_handler.setFormatter(JSONFormatter())
+    log_queue = queue.Queue(maxsize=queue_size)
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    # Write any queued records before the process exits
+    atexit.register(listener.stop)
+    handler = LogQueueHandler(log_queue, max_message_length)
+    handler.listener = listener
+    return handler
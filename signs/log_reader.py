@@ -0,0 +1,109 @@
+import json
+import os
+from collections.abc import Iterator
+from typing import BinaryIO
+
+# Log levels, from lowest to highest
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+# Number of bytes read from a log file at a time
+BLOCK_SIZE = 64 * 1024
+
+
+def tail_log(
+    paths: list[str],
+    line_count: int,
+    level: str | None = None,
+    contains: str | None = None,
+) -> list[str]:
+    """Return the last line_count lines of a log, from records at or above level
+    which contain the text contains (ignoring case), in file order.
+
+    paths are the log file and its rotated backups, newest first. Files are read
+    backwards from the end, a block at a time, and reading stops once there are
+    enough lines, so the time taken depends on line_count, not the log's size."""
+    lines = []
+    for record in iter_records(paths):
+        if is_match(record, level, contains):
+            lines.extend(reversed(record))
+            if len(lines) >= line_count:
+                break
+    return lines[:line_count][::-1]
+
+
+def is_match(record: list[str], level: str | None, contains: str | None) -> bool:
+    """Return whether a log record is at or above level, and contains the text
+    contains (ignoring case)."""
+    if level:
+        record_level = get_level(record[0])
+        if record_level is None:
+            return False
+        if LOG_LEVELS.index(record_level) < LOG_LEVELS.index(level):
+            return False
+    if contains:
+        return any(contains.casefold() in line.casefold() for line in record)
+    return True
+
+
+def get_level(line: str) -> str | None:
+    """Return the level of the log record starting with this line,
+    or None if the line doesn't start a record. Records are JSON objects
+    (see signs.log_handlers.JSONFormatter), or in older logs, lines
+    starting with their level."""
+    if line.startswith("{"):
+        try:
+            level = json.loads(line).get("level")
+        except ValueError:
+            return None
+    else:
+        level = line.split(" ", 1)[0]
+    return level if level in LOG_LEVELS else None
+
+
+def iter_records(paths: list[str]) -> Iterator[list[str]]:
+    """Yield the records in a log, newest first, each as a list of its lines
+    in file order. A record is a line starting with its level, followed by
+    any lines which don't start a record (e.g. a traceback)."""
+    record = []
+    for line in iter_lines_reversed(paths):
+        record.append(line)
+        if get_level(line) is not None:
+            yield record[::-1]
+            record = []
+    # Lines before the first record in the oldest file
+    if record:
+        yield record[::-1]
+
+
+def iter_lines_reversed(paths: list[str]) -> Iterator[str]:
+    """Yield the lines in a log's files, newest first, without line endings.
+    Files which don't exist are skipped."""
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                yield from read_lines_reversed(f)
+        except FileNotFoundError:
+            continue
+
+
+def read_lines_reversed(f: BinaryIO, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    """Yield the lines in a file, last first, reading blocks from the end."""
+    position = f.seek(0, os.SEEK_END)
+    if position == 0:
+        return
+    # Part of a line which started in an earlier block
+    remainder = b""
+    at_end = True
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+        block = f.read(size) + remainder
+        if at_end:
+            # The file's last line ending doesn't start another line
+            block = block.removesuffix(b"\n")
+            at_end = False
+        lines = block.split(b"\n")
+        remainder = lines.pop(0)
+        for line in reversed(lines):
+            yield line.decode("utf-8", errors="replace")
+    yield remainder.decode("utf-8", errors="replace")
@@ -0,0 +1,289 @@
+import json
+import platform
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from signs import libcal_client
+from signs.forms import ORIENTATION_CHOICES
+from signs.libcal_stub import EVENTS_WIDGET_PATH, HOURS_WIDGET_PATH, LibCalStubServer
+from signs.models import Location
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the display views, with simulated players requesting them "
+        "concurrently, and a local stub server standing in for LibCal. Requests "
+        "go through Django's test client, which serves the async views through "
+        "the WSGI handler, so this measures the views and caches as served by "
+        "sync workers, not an ASGI server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--players",
+            type=int,
+            default=10,
+            help="Number of players requesting displays at the same time.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=50,
+            help="Number of requests made by each player.",
+        )
+        parser.add_argument(
+            "--events-share",
+            type=float,
+            default=0.25,
+            help="Fraction of requests for the CLICC events display; "
+            "the rest are for hours displays.",
+        )
+        parser.add_argument(
+            "--locations",
+            type=int,
+            nargs="*",
+            help="LibCal location ids of the hours displays (default: all locations).",
+        )
+        parser.add_argument(
+            "--orientation",
+            choices=[key for key, _ in ORIENTATION_CHOICES],
+            default="portrait_small",
+            help="Orientation of the hours displays.",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.05,
+            help="Seconds the LibCal stub waits before each response.",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="Fraction of LibCal stub responses which are errors.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            help="Random seed, to repeat the same requests and errors.",
+        )
+        parser.add_argument(
+            "--output",
+            help="File to write the results to, as JSON.",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="Results file from an earlier run, to compare this run with.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Fraction by which p95 latency may exceed the baseline's "
+            "before the command fails.",
+        )
+
+    def handle(self, *args, **options):
+        location_ids = options["locations"] or list(
+            Location.objects.values_list("location_id", flat=True)
+        )
+        if not location_ids:
+            raise CommandError("No locations to benchmark; add one, or use --locations")
+        urls = {
+            "display_hours": [
+                reverse("display_hours", args=[location_id, options["orientation"]])
+                for location_id in location_ids
+            ],
+            "display_clicc_events": [reverse("display_clicc_events")],
+        }
+
+        stub = LibCalStubServer(
+            latency=options["latency"],
+            error_rate=options["error_rate"],
+            seed=options["seed"],
+        )
+        stub.add_fixture_responses()
+        events_query = "?m=today&simple=ul_date&cid="
+        with stub, override_settings(
+            LIBCAL_HOURS_WIDGET=f"{stub.url}{HOURS_WIDGET_PATH}?",
+            LIBCAL_EVENTS_WIDGET=f"{stub.url}{EVENTS_WIDGET_PATH}{events_query}",
+            # Events come from the stub's events widget, not the LibCal API
+            LIBCAL_API_CLIENT_ID=None,
+            LIBCAL_API_CLIENT_SECRET=None,
+            ALLOWED_HOSTS=["testserver"],
+            # The stub's hours mustn't reach the shared cache, this process's
+            # own pages, or HoursSnapshot, which is keyed by location only, so
+            # signs could display them. Stored hours aren't read either, so the
+            # benchmark measures the stub's hours.
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                    "LOCATION": "benchmark_signs",
+                }
+            },
+            SIGNS_LOCAL_PAGE_CACHE_ENTRIES=0,
+            SIGNS_HOURS_SNAPSHOTS=False,
+        ):
+            # The session's settings (e.g. retries) are read when it's created
+            libcal_client.close_session()
+            try:
+                results = self.run_benchmark(stub, urls, options)
+            finally:
+                libcal_client.close_session()
+
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+        if options["baseline"]:
+            self.compare(results, options["baseline"], options["tolerance"])
+
+    def run_benchmark(self, stub: LibCalStubServer, urls: dict, options: dict) -> dict:
+        """Request every display once to fill the caches, then have each player
+        request random displays, and return the results."""
+        for endpoint_urls in urls.values():
+            for url in endpoint_urls:
+                Client().get(url)
+        warmup_requests = len(stub.requests)
+        warmup_errors = stub.errors
+
+        rng = random.Random(options["seed"])
+        plans = [
+            [
+                self.choose_request(rng, urls, options["events_share"])
+                for _ in range(options["requests"])
+            ]
+            for _ in range(options["players"])
+        ]
+        samples = []
+        samples_lock = threading.Lock()
+
+        def play(plan: list[tuple[str, str]]) -> None:
+            client = Client()
+            try:
+                for endpoint, url in plan:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    duration = time.perf_counter() - started
+                    with samples_lock:
+                        samples.append((endpoint, duration, response.status_code))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=play, args=[plan]) for plan in plans]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        upstream = Counter(request.path for request in stub.requests[warmup_requests:])
+        return {
+            "timestamp": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "config": {
+                key: options[key]
+                for key in [
+                    "players",
+                    "requests",
+                    "events_share",
+                    "latency",
+                    "error_rate",
+                    "seed",
+                ]
+            },
+            "elapsed_seconds": round(elapsed, 3),
+            "endpoints": {
+                endpoint: summarize(
+                    [sample for sample in samples if sample[0] == endpoint], elapsed
+                )
+                for endpoint in urls
+            },
+            "overall": summarize(samples, elapsed),
+            "upstream": {
+                "warmup_requests": warmup_requests,
+                "warmup_errors": warmup_errors,
+                "requests": dict(upstream),
+                "errors": stub.errors - warmup_errors,
+            },
+        }
+
+    def choose_request(
+        self, rng: random.Random, urls: dict, events_share: float
+    ) -> tuple[str, str]:
+        """Return the endpoint and URL of a player's next request."""
+        endpoint = (
+            "display_clicc_events" if rng.random() < events_share else "display_hours"
+        )
+        return (endpoint, rng.choice(urls[endpoint]))
+
+    def report(self, results: dict) -> None:
+        for name, summary in get_summaries(results).items():
+            if not summary["count"]:
+                continue
+            self.stdout.write(
+                f"{name}: {summary['count']} requests, {summary['errors']} errors, "
+                f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+                f"p99 {summary['p99_ms']} ms, {summary['throughput']} requests/s"
+            )
+        upstream = results["upstream"]
+        self.stdout.write(
+            f"LibCal: {sum(upstream['requests'].values())} requests "
+            f"({upstream['errors']} errors) after {upstream['warmup_requests']} "
+            "to warm up"
+        )
+
+    def compare(self, results: dict, baseline_path: str, tolerance: float) -> None:
+        """Raise CommandError if any endpoint's p95 latency is more than
+        tolerance slower than in the baseline results."""
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        previous_summaries = get_summaries(baseline)
+        regressions = []
+        for name, summary in get_summaries(results).items():
+            previous = previous_summaries.get(name)
+            if not summary["count"] or not previous or not previous["count"]:
+                continue
+            limit = previous["p95_ms"] * (1 + tolerance)
+            if summary["p95_ms"] > limit:
+                regressions.append(
+                    f"{name} p95 {summary['p95_ms']} ms > {limit:.1f} ms "
+                    f"(baseline {previous['p95_ms']} ms)"
+                )
+        if regressions:
+            raise CommandError("Slower than baseline: " + "; ".join(regressions))
+        self.stdout.write(f"Within {tolerance:.0%} of baseline {baseline_path}")
+
+
+def get_summaries(results: dict) -> dict[str, dict]:
+    """Return the summaries of each endpoint and overall, by name."""
+    return {**results["endpoints"], "overall": results["overall"]}
+
+
+def summarize(samples: list[tuple[str, float, int]], elapsed: float) -> dict:
+    """Return the count, server errors, latency percentiles in milliseconds,
+    and throughput in requests per second, of (endpoint, seconds, status) samples."""
+    durations = [duration * 1000 for _, duration, _ in samples]
+    if len(durations) > 1:
+        percentiles = statistics.quantiles(durations, n=100, method="inclusive")
+        p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+    else:
+        p50 = p95 = p99 = durations[0] if durations else 0
+    return {
+        "count": len(samples),
+        "errors": sum(1 for _, _, status in samples if status >= 500),
+        "p50_ms": round(p50, 1),
+        "p95_ms": round(p95, 1),
+        "p99_ms": round(p99, 1),
+        "throughput": round(len(samples) / elapsed, 1) if elapsed else 0,
+    }
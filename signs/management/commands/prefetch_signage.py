@@ -0,0 +1,129 @@
+import logging
+import random
+import time
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from signs import libcal_api
+from signs.models import EventRoom, Location
+from signs.views_utils import (
+    DISPLAY_HOURS_WEEKS,
+    get_hours_cache_key,
+    get_hours_parent_key,
+    refresh_hours_entry,
+    refresh_formatted_hours,
+    refresh_api_events,
+    refresh_location_events,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep LibCal hours and events in the shared cache fresh, "
+        "so signage views don't wait on LibCal."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.SIGNAGE_PREFETCH_INTERVAL,
+            help="Seconds between refreshes of all locations.",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=settings.SIGNAGE_PREFETCH_JITTER,
+            help="Maximum random seconds to wait between LibCal requests.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Refresh all locations once, then exit.",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        jitter = options["jitter"]
+
+        while True:
+            started = time.monotonic()
+            # As at the start of a request, close database connections which
+            # are broken or past CONN_MAX_AGE, so each pass can reconnect
+            close_old_connections()
+            for prefetch in [self.prefetch_hours, self.prefetch_events]:
+                try:
+                    prefetch(jitter)
+                except Exception:
+                    # e.g. the database is unavailable; try again next pass,
+                    # since nothing restarts this process if it exits
+                    logger.exception("Unable to prefetch LibCal data")
+            if options["once"]:
+                break
+            # Wait out the rest of the interval, so refreshes start on a regular schedule
+            elapsed = time.monotonic() - started
+            time.sleep(max(interval - elapsed, 0) + random.uniform(0, jitter))
+
+    def prefetch_hours(self, jitter: float) -> None:
+        """Refresh cached hours for every location."""
+        hours_widget_url = settings.LIBCAL_HOURS_WIDGET
+        started = timezone.now()
+        location_ids = Location.objects.values_list("location_id", flat=True)
+
+        for location_id in location_ids:
+            # Child locations are refreshed from their parent's response when possible
+            parent_id = cache.get(
+                get_hours_parent_key(hours_widget_url, location_id, DISPLAY_HOURS_WEEKS)
+            )
+            for lid in [parent_id, location_id]:
+                if lid is None or self.hours_refreshed(lid, started):
+                    continue
+                try:
+                    refresh_hours_entry(hours_widget_url, lid)
+                except Exception:
+                    logger.exception("Unable to prefetch hours for %s", lid)
+                time.sleep(random.uniform(0, jitter))
+            if not self.hours_refreshed(location_id, started):
+                continue
+            try:
+                # LibCal hours are cached now, so this doesn't make another request
+                refresh_formatted_hours(hours_widget_url, location_id)
+            except Exception:
+                logger.exception("Unable to format hours for %s", location_id)
+
+    def hours_refreshed(self, location_id: int, since: datetime) -> bool:
+        """Return whether a location's cached hours were fetched after since."""
+        cache_key = get_hours_cache_key(
+            settings.LIBCAL_HOURS_WIDGET, location_id, DISPLAY_HOURS_WEEKS
+        )
+        entry = cache.get(cache_key)
+        return entry is not None and entry["fetched_at"] >= since
+
+    def prefetch_events(self, jitter: float) -> None:
+        """Refresh cached events for every room on an event screen."""
+        events_widget_url = settings.LIBCAL_EVENTS_WIDGET
+        location_ids = list(
+            EventRoom.objects.order_by("location_id")
+            .values_list("location_id", flat=True)
+            .distinct()
+        )
+
+        if libcal_api.is_configured():
+            # The LibCal API returns all rooms' events in one request
+            try:
+                refresh_api_events(location_ids)
+            except Exception:
+                logger.exception("Unable to prefetch events for %s", location_ids)
+            return
+
+        for location_id in location_ids:
+            try:
+                refresh_location_events(events_widget_url, location_id)
+            except Exception:
+                logger.exception("Unable to prefetch events for %s", location_id)
+            time.sleep(random.uniform(0, jitter))
@@ -0,0 +1,173 @@
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.template.loader import render_to_string
+from signs.forms import ORIENTATION_CHOICES
+from signs.models import EventScreen, Location
+from signs.views_utils import (
+    get_display_events_context,
+    get_display_hours_context,
+    get_event_window,
+    get_formatted_hours_cache_key,
+    get_screen_events,
+    get_snapshot_hours_entry,
+    has_cached_events,
+    is_current_hours,
+    refresh_formatted_hours,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Render hours for every location and orientation, and every event screen, "
+        "into static HTML files which can be served without Django."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.SIGNS_SNAPSHOT_ROOT,
+            help="Directory to write rendered pages to.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of locations to render in parallel.",
+        )
+
+    def handle(self, *args, **options):
+        output = Path(options["output"])
+        locations = list(Location.objects.all())
+        screens = list(EventScreen.objects.prefetch_related("rooms"))
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = [
+                executor.submit(self.render_location, output, location)
+                for location in locations
+            ]
+            futures += [
+                executor.submit(self.render_screen, output, screen)
+                for screen in screens
+            ]
+            results = [future.result() for future in futures]
+
+        written = sum(result[0] for result in results)
+        unchanged = sum(result[1] for result in results)
+        failed = sum(result[2] for result in results)
+        self.stdout.write(
+            f"Rendered pages: {written} written, {unchanged} unchanged, {failed} failed"
+        )
+
+    def render_location(self, output: Path, location: Location) -> tuple[int, int, int]:
+        """Render a location's hours for every orientation.
+        Returns the number of pages (written, unchanged, failed).
+        Pages which fail keep their existing files."""
+        written = unchanged = 0
+        try:
+            hours = self.get_hours(location.location_id)
+            if not hours:
+                # Keep any existing pages, rather than replacing them with an error
+                logger.error(
+                    "No hours available to render for %s", location.location_id
+                )
+                return (0, 0, len(ORIENTATION_CHOICES))
+
+            for orientation, _ in ORIENTATION_CHOICES:
+                context = get_display_hours_context(location.name, orientation, hours)
+                content = render_to_string("signs/display.html", context)
+                path = (
+                    output
+                    / "display_hours"
+                    / str(location.location_id)
+                    / orientation
+                    / "index.html"
+                )
+                if write_if_changed(path, content):
+                    written += 1
+                else:
+                    unchanged += 1
+            return (written, unchanged, 0)
+        except Exception:
+            # One location's error mustn't stop the others from being rendered
+            logger.exception("Unable to render hours for %s", location.location_id)
+            return (written, unchanged, len(ORIENTATION_CHOICES) - written - unchanged)
+        finally:
+            # Worker threads aren't managed by Django's request cycle,
+            # so close any database connections the cache opened.
+            connections.close_all()
+
+    def get_hours(self, location_id: int) -> list[dict]:
+        """Return a location's current hours from LibCal (or the LibCal hours cache).
+        If they're unavailable, return its last known good hours, from the
+        formatted hours cache or this week's HoursSnapshot, as signs would display.
+        Unlike get_formatted_hours, stored hours aren't refreshed in the background,
+        since pages are only rendered from the hours available now.
+        Returns an empty list if there are no usable hours."""
+        widget_url = settings.LIBCAL_HOURS_WIDGET
+        entry = refresh_formatted_hours(widget_url, location_id)
+        if entry is None:
+            entry = cache.get(get_formatted_hours_cache_key(widget_url, location_id))
+            if entry is None or not is_current_hours(entry["hours"]):
+                entry = get_snapshot_hours_entry(location_id)
+        return entry["hours"] if entry is not None else []
+
+    def render_screen(self, output: Path, screen: EventScreen) -> tuple[int, int, int]:
+        """Render an event screen's page, with the default event window.
+        Returns the number of pages (written, unchanged, failed).
+        If any room's events are unavailable, the existing file is kept."""
+        try:
+            window = get_event_window()
+            widget_url = settings.LIBCAL_EVENTS_WIDGET
+            rooms = list(screen.rooms.all())
+            columns = get_screen_events(
+                widget_url, rooms, settings.LIBCAL_EVENTS_DEADLINE, window
+            )
+            # Rooms whose events failed or timed out are displayed without events,
+            # which mustn't replace a page with their events
+            if not has_cached_events(widget_url, [room.location_id for room in rooms]):
+                logger.error("Events unavailable to render for screen %s", screen.id)
+                return (0, 0, 1)
+            context = get_display_events_context(screen.name, columns, window)
+            content = render_to_string("signs/display_events.html", context)
+            path = output / "display_events" / str(screen.id) / "index.html"
+            written = write_if_changed(path, content)
+            return (written, 1 - written, 0)
+        except Exception:
+            logger.exception("Unable to render event screen %s", screen.id)
+            return (0, 0, 1)
+        finally:
+            connections.close_all()
+
+
+def write_if_changed(path: Path, content: str) -> int:
+    """Atomically write content to path, unless the file already has that content.
+    Returns 1 if the file was written, otherwise 0."""
+    data = content.encode()
+    try:
+        if path.read_bytes() == data:
+            return 0
+    except FileNotFoundError:
+        pass
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file in the same directory, then rename it over the
+    # original, so the file being served is never partly written.
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return 1
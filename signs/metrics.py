@@ -0,0 +1,106 @@
+import hmac
+import ipaddress
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.http import HttpRequest
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# When PROMETHEUS_MULTIPROC_DIR is set (as it is under gunicorn), each process
+# writes its metrics to files there, and /metrics adds up all of the processes'.
+STAGE_SECONDS = Histogram(
+    "signs_stage_seconds",
+    "Time spent in each stage of building a display, in seconds",
+    ["stage"],
+)
+CACHE_REQUESTS = Counter(
+    "signs_cache_requests",
+    "Cache lookups, by cache and result (hit or miss)",
+    ["cache", "result"],
+)
+LIBCAL_REQUESTS = Counter(
+    "signs_libcal_requests", "Requests to LibCal, by HTTP method", ["method"]
+)
+LIBCAL_ERRORS = Counter(
+    "signs_libcal_errors",
+    "Failed requests to LibCal, by error (exception name or HTTP status)",
+    ["error"],
+)
+
+# Stage timings for the current request's Server-Timing header, or None outside
+# of a request. Worker threads don't share the request's context, so stages run
+# in them are only recorded in the histograms.
+server_timings: ContextVar[list[tuple[str, float]] | None] = ContextVar(
+    "server_timings", default=None
+)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time a stage, as a context manager or function decorator."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage).observe(duration)
+        timings = server_timings.get()
+        if timings is not None:
+            timings.append((stage, duration))
+
+
+def record_cache(cache_name: str, hit: bool) -> None:
+    """Count a cache lookup."""
+    CACHE_REQUESTS.labels(cache_name, "hit" if hit else "miss").inc()
+
+
+def format_server_timing(timings: list[tuple[str, float]]) -> str:
+    """Return a Server-Timing header value, with the total milliseconds spent
+    in each stage, e.g. "location;dur=0.3, render;dur=2.1"."""
+    totals = {}
+    for stage, duration in timings:
+        totals[stage] = totals.get(stage, 0) + duration
+    return ", ".join(
+        f"{stage};dur={duration * 1000:.1f}" for stage, duration in totals.items()
+    )
+
+
+def generate_metrics() -> bytes:
+    """Return all processes' metrics in the Prometheus text format."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def is_scrape_allowed(request: HttpRequest) -> bool:
+    """Return whether a request may read the metrics: it's from one of
+    SIGNS_METRICS_ALLOWED_IPS, or has SIGNS_METRICS_TOKEN as a bearer token."""
+    token = settings.SIGNS_METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    # compare_digest only accepts ASCII strings, so headers are compared as bytes
+    if token and hmac.compare_digest(
+        authorization.encode(), f"Bearer {token}".encode()
+    ):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.SIGNS_METRICS_ALLOWED_IPS
+        if network
+    )
@@ -0,0 +1,78 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from collections.abc import Callable
+from django.http import HttpRequest, HttpResponse
+from whitenoise.middleware import WhiteNoiseMiddleware
+from signs import metrics
+
+
+class ServerTimingMiddleware:
+    """Add a Server-Timing header with the time spent in each stage of the
+    request (see signs.metrics.timed), for inspecting single requests in the
+    browser's developer tools."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+        # Under ASGI, async views run without switching to a thread
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.is_async:
+            return self.__acall__(request)
+        token = metrics.server_timings.set([])
+        try:
+            response = self.get_response(request)
+            timings = metrics.server_timings.get()
+        finally:
+            metrics.server_timings.reset(token)
+        return self.add_header(response, timings)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        token = metrics.server_timings.set([])
+        try:
+            response = await self.get_response(request)
+            timings = metrics.server_timings.get()
+        finally:
+            metrics.server_timings.reset(token)
+        return self.add_header(response, timings)
+
+    def add_header(
+        self, response: HttpResponse, timings: list[tuple[str, float]]
+    ) -> HttpResponse:
+        if timings:
+            response["Server-Timing"] = metrics.format_server_timing(timings)
+        return response
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise's middleware, which only supports sync requests, adapted so
+    that under ASGI, other requests are passed on without switching to a
+    thread. Static files are still served in a thread."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        super().__init__(get_response)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        # As in WhiteNoiseMiddleware.__call__
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
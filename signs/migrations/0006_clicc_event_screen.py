@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:20
+
+from django.db import migrations
+
+# The CLICC classrooms previously hardcoded in display_clicc_events,
+# in the order they were displayed, left to right
+CLICC_SCREEN_NAME = "CLICC Classroom Schedules"
+CLICC_ROOMS = [
+    ("Class B", 4357),
+    ("Class C", 4358),
+    ("Class A", 3363),
+    ("InqLab 3", 4799),
+]
+
+
+def create_clicc_screen(apps, schema_editor):
+    EventScreen = apps.get_model("signs", "EventScreen")
+    EventRoom = apps.get_model("signs", "EventRoom")
+    screen = EventScreen.objects.create(name=CLICC_SCREEN_NAME)
+    EventRoom.objects.bulk_create(
+        EventRoom(screen=screen, name=name, location_id=location_id, position=position)
+        for position, (name, location_id) in enumerate(CLICC_ROOMS, start=1)
+    )
+
+
+def delete_clicc_screen(apps, schema_editor):
+    EventScreen = apps.get_model("signs", "EventScreen")
+    EventScreen.objects.filter(name=CLICC_SCREEN_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("signs", "0005_eventscreen_eventroom"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_clicc_screen, delete_clicc_screen),
+    ]
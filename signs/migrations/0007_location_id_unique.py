@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:15
+
+from django.db import migrations, models
+
+
+def delete_duplicate_locations(apps, schema_editor):
+    # Signs couldn't display locations with duplicate IDs, so keep the first of each
+    Location = apps.get_model("signs", "Location")
+    seen = set()
+    for location in Location.objects.order_by("location_id", "id"):
+        if location.location_id in seen:
+            location.delete()
+        seen.add(location.location_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("signs", "0006_clicc_event_screen"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_locations, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="location",
+            name="location_id",
+            field=models.IntegerField(
+                help_text="Location ID must match LibCal ID exactly.", unique=True
+            ),
+        ),
+    ]
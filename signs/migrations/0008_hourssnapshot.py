@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("signs", "0007_location_id_unique"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HoursSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("location_id", models.IntegerField()),
+                ("date", models.DateField()),
+                ("weekday", models.CharField(max_length=9)),
+                ("rendered_hours", models.CharField(max_length=100)),
+                ("status", models.CharField(blank=True, max_length=20)),
+                (
+                    "fetched_at",
+                    models.DateTimeField(
+                        help_text="When these hours were first retrieved from LibCal."
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["location_id", "date"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("location_id", "date"), name="unique_location_date"
+                    )
+                ],
+            },
+        ),
+    ]
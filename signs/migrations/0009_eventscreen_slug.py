@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+# As in 0006_clicc_event_screen
+CLICC_SCREEN_NAME = "CLICC Classroom Schedules"
+CLICC_SCREEN_SLUG = "clicc"
+
+
+def set_clicc_slug(apps, schema_editor):
+    # display_clicc_events found the screen by name, so use the one it displayed
+    EventScreen = apps.get_model("signs", "EventScreen")
+    screen = EventScreen.objects.filter(name=CLICC_SCREEN_NAME).order_by("id").first()
+    if screen is not None:
+        screen.slug = CLICC_SCREEN_SLUG
+        screen.save(update_fields=["slug"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("signs", "0008_hourssnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventscreen",
+            name="slug",
+            field=models.SlugField(
+                blank=True,
+                help_text="Optional key for URLs which don't use the screen's ID, "
+                'e.g. "clicc" for /display_clicc_events/.',
+                null=True,
+                unique=True,
+            ),
+        ),
+        migrations.RunPython(set_clicc_slug, migrations.RunPython.noop),
+    ]
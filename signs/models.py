@@ -1,4 +1,5 @@
 from django.db import models
+from django.urls import reverse
 
 
 class Location(models.Model):
@@ -6,7 +7,7 @@ class Location(models.Model):
         max_length=100, help_text="This name will be displayed on the digital sign."
     )
     location_id = models.IntegerField(
-        help_text="Location ID must match LibCal ID exactly."
+        unique=True, help_text="Location ID must match LibCal ID exactly."
     )
 
     class Meta:
@@ -14,3 +15,70 @@ class Location(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class EventScreen(models.Model):
+    name = models.CharField(
+        max_length=100, help_text="This name will be displayed on the digital sign."
+    )
+    slug = models.SlugField(
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Optional key for URLs which don't use the screen's ID, "
+        'e.g. "clicc" for /display_clicc_events/.',
+    )
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return reverse("display_events", args=[self.id])
+
+
+class EventRoom(models.Model):
+    screen = models.ForeignKey(
+        EventScreen, on_delete=models.CASCADE, related_name="rooms"
+    )
+    name = models.CharField(
+        max_length=100, help_text="This name will be displayed above the room's events."
+    )
+    location_id = models.IntegerField(
+        help_text="Location ID must match LibCal calendar ID exactly."
+    )
+    position = models.PositiveIntegerField(
+        default=0, help_text="Rooms are displayed in order of position, left to right."
+    )
+
+    class Meta:
+        ordering = ["position", "name"]
+
+    def __str__(self):
+        return self.name
+
+
+class HoursSnapshot(models.Model):
+    """A location's hours for one day, as last retrieved from LibCal."""
+
+    location_id = models.IntegerField()
+    date = models.DateField()
+    weekday = models.CharField(max_length=9)
+    rendered_hours = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, blank=True)
+    fetched_at = models.DateTimeField(
+        help_text="When these hours were first retrieved from LibCal."
+    )
+
+    class Meta:
+        ordering = ["location_id", "date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["location_id", "date"], name="unique_location_date"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.location_id} {self.date}: {self.rendered_hours}"
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections.abc import Awaitable
+from concurrent.futures import Future, TimeoutError
+from typing import Callable, TypeVar
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Calls in flight in this process, by key
+in_flight: dict[str, Future] = {}
+in_flight_lock = threading.Lock()
+# Async calls in flight in this process's event loop, by key
+async_in_flight: dict[str, asyncio.Future] = {}
+
+
+def call(key: str, fetch: Callable[[], T], lookup: Callable[[], T | None]) -> T:
+    """Return fetch(), making sure only one fetch for key runs at a time.
+
+    Threads in this process which ask for the same key while a fetch is in
+    flight wait for, and share, its result. Other processes are coordinated by
+    a lock in the shared cache: while another process holds the lock, lookup()
+    is polled for the result it stores (e.g. a cache entry). If the lock holder
+    doesn't produce a result, the caller fetches for itself."""
+    with in_flight_lock:
+        future = in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            in_flight[key] = future
+
+    if not leader:
+        try:
+            return future.result(timeout=settings.LIBCAL_FETCH_WAIT)
+        except TimeoutError:
+            logger.warning("Timed out waiting for in-flight fetch of %s", key)
+            return fetch()
+
+    try:
+        result = call_across_processes(key, fetch, lookup)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with in_flight_lock:
+            in_flight.pop(key, None)
+
+
+def call_across_processes(
+    key: str, fetch: Callable[[], T], lookup: Callable[[], T | None]
+) -> T:
+    """Return fetch() if this process gets the cache lock for key,
+    otherwise wait for the lock holder's result via lookup()."""
+    lock_key = f"single-flight:{key}"
+    # The lock expires on its own, in case its holder dies while fetching
+    if cache.add(lock_key, os.getpid(), settings.LIBCAL_FETCH_LOCK_TIMEOUT):
+        try:
+            return fetch()
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + settings.LIBCAL_FETCH_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(settings.LIBCAL_FETCH_POLL_INTERVAL)
+        result = lookup()
+        if result is not None:
+            return result
+        if cache.get(lock_key) is None:
+            # The lock holder finished; its result may have arrived since the lookup
+            result = lookup()
+            if result is not None:
+                return result
+            break
+    logger.info("No result from other process for %s, fetching directly", key)
+    return fetch()
+
+
+async def acall(
+    key: str,
+    fetch: Callable[[], Awaitable[T]],
+    lookup: Callable[[], Awaitable[T | None]],
+) -> T:
+    """Async version of call(), for async views. Tasks in the event loop which
+    ask for the same key while a fetch is in flight share its result, and other
+    processes (and threads using call()) are coordinated by the same cache lock."""
+    future = async_in_flight.get(key)
+    if future is not None and future.get_loop() is asyncio.get_running_loop():
+        try:
+            # Don't cancel the fetch for the other tasks if this one is cancelled
+            return await asyncio.wait_for(
+                asyncio.shield(future), settings.LIBCAL_FETCH_WAIT
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Timed out waiting for in-flight fetch of %s", key)
+            return await fetch()
+
+    future = asyncio.ensure_future(acall_across_processes(key, fetch, lookup))
+    async_in_flight[key] = future
+    future.add_done_callback(lambda _: remove_async_call(key, future))
+    return await asyncio.shield(future)
+
+
+def remove_async_call(key: str, future: asyncio.Future) -> None:
+    """Forget a finished async call, unless another has replaced it."""
+    if async_in_flight.get(key) is future:
+        del async_in_flight[key]
+
+
+async def acall_across_processes(
+    key: str,
+    fetch: Callable[[], Awaitable[T]],
+    lookup: Callable[[], Awaitable[T | None]],
+) -> T:
+    """Async version of call_across_processes()."""
+    lock_key = f"single-flight:{key}"
+    if await cache.aadd(lock_key, os.getpid(), settings.LIBCAL_FETCH_LOCK_TIMEOUT):
+        try:
+            return await fetch()
+        finally:
+            await cache.adelete(lock_key)
+
+    deadline = time.monotonic() + settings.LIBCAL_FETCH_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.LIBCAL_FETCH_POLL_INTERVAL)
+        result = await lookup()
+        if result is not None:
+            return result
+        if await cache.aget(lock_key) is None:
+            result = await lookup()
+            if result is not None:
+                return result
+            break
+    logger.info("No result from other process for %s, fetching directly", key)
+    return await fetch()
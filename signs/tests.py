@@ -1,18 +1,107 @@
-from django.test import TestCase
+from unittest import mock, skipUnless
+from bs4 import BeautifulSoup
+from django.shortcuts import render
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.http import HttpResponse
-from signs.models import Location
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, IntegrityError
+from django.utils import timezone
+from django.utils.html import escape
+from signs import (
+    libcal_api,
+    libcal_client,
+    location_registry,
+    log_reader,
+    metrics,
+    single_flight,
+    update_stream,
+    views_utils,
+)
+from asgiref.sync import sync_to_async
+from prometheus_client import REGISTRY
+from signs.libcal_stub import LibCalStubServer
+from signs.log_handlers import (
+    Abbreviated,
+    LogQueueHandler,
+    SharedRotatingFileHandler,
+    get_queue_handler,
+)
+from signs.log_reader import tail_log
+from signs.location_registry import get_location_name
+from signs.event_parser import extract_events
+from signs.models import EventRoom, EventScreen, HoursSnapshot, Location
 from signs.views_utils import (
     construct_display_url,
+    get_hours,
+    get_hours_entry,
+    get_hours_cache_key,
+    fetch_hours,
+    get_formatted_hours,
+    get_formatted_hours_cache_key,
+    get_formatted_hours_entry,
+    get_digest,
+    get_display_week,
+    get_hours_range,
+    HoursRange,
+    get_snapshot_hours_entry,
+    save_hours_snapshot,
+    refresh_formatted_hours,
+    get_formatted_location_events,
+    get_all_location_events,
+    get_api_location_events,
+    get_screen_events,
+    aget_screen_events,
+    get_screen_rooms,
+    CLICC_SCREEN_SLUG,
     get_start_end_dates,
     get_single_location_hours,
     format_hours,
     format_date,
     parse_events,
     format_events,
+    format_timed_events,
+    get_timed_events,
     get_css_grid_row,
+    get_display_events_context,
+    get_event_window,
+    get_page_cache_key,
+    get_week_start,
+    EventWindow,
 )
+import asyncio
+import atexit
+import copy
 import json
+import logging
+import os
+import queue
 import datetime
+import httpx
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+import requests
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+
+def patch_libcal_get(test_case: TestCase, **kwargs) -> mock.Mock:
+    """Patch the LibCal client's get for the rest of a test, with aget (used by
+    the async display views) returning the same responses. Returns the mock."""
+    patcher = mock.patch("signs.libcal_client.get", **kwargs)
+    mock_get = patcher.start()
+    test_case.addCleanup(patcher.stop)
+    async_patcher = mock.patch("signs.libcal_client.aget", side_effect=mock_get)
+    async_patcher.start()
+    test_case.addCleanup(async_patcher.stop)
+    return mock_get
 
 
 class LocationTestCase(TestCase):
@@ -24,6 +113,50 @@ class LocationTestCase(TestCase):
         self.assertEqual(powell.name, "Powell Library")
 
 
+class LocationRegistryTestCase(TestCase):
+    def setUp(self):
+        location_registry.invalidate()
+        self.location = Location.objects.create(name="Powell Library", location_id=1)
+
+    def test_get_location_name(self):
+        self.assertEqual(get_location_name(1), "Powell Library")
+        # later lookups don't query the database
+        with self.assertNumQueries(0):
+            self.assertEqual(get_location_name(1), "Powell Library")
+            self.assertIsNone(get_location_name(2))
+
+    def test_location_saved(self):
+        get_location_name(1)
+        self.location.name = "Powell"
+        self.location.save()
+        Location.objects.create(name="Arts Library", location_id=4690)
+        self.assertEqual(get_location_name(1), "Powell")
+        self.assertEqual(get_location_name(4690), "Arts Library")
+
+    def test_location_deleted(self):
+        get_location_name(1)
+        self.location.delete()
+        self.assertIsNone(get_location_name(1))
+
+    def test_registry_expires(self):
+        get_location_name(1)
+        # changes which bypass signals are seen once the registry expires
+        Location.objects.filter(location_id=1).update(name="Powell")
+        self.assertEqual(get_location_name(1), "Powell Library")
+        with override_settings(SIGNS_LOCATION_REGISTRY_TTL=0):
+            self.assertEqual(get_location_name(1), "Powell")
+
+    def test_location_id_unique(self):
+        with self.assertRaises(IntegrityError):
+            Location.objects.create(name="Powell again", location_id=1)
+
+    def test_display_hours_not_found(self):
+        get_location_name(1)
+        with self.assertNumQueries(0):
+            response = self.client.get("/display_hours/2/portrait_small")
+        self.assertEqual(response.status_code, 404)
+
+
 class ConstructDisplayURLTestCase(TestCase):
     def setUp(self):
         Location.objects.create(name="Powell Library", location_id=1)
@@ -178,6 +311,1504 @@ class FormatHoursTestCase(TestCase):
         self.assertEqual(hours[6]["rendered_hours"], "Closed")
 
 
+class GetHoursTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.data = json.load(f)
+        # parent locations are covered in ParentLocationHoursTestCase
+        del self.data["loc_20525"]["parent_lid"]
+        self.widget_url = "https://calendar.example.com/widget/hours/grid?"
+        cache.clear()
+
+    def mock_response(self, data: dict) -> mock.Mock:
+        response = mock.Mock()
+        response.json.return_value = data
+        return response
+
+    @mock.patch("signs.libcal_client.get")
+    def test_get_hours_cached(self, mock_get):
+        mock_get.return_value = self.mock_response(self.data)
+        first = get_hours(self.widget_url, "20525")
+        second = get_hours(self.widget_url, "20525")
+        # second request should be served from the cache
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(first, second)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_get_hours_cache_key_parts(self, mock_get):
+        mock_get.return_value = self.mock_response(self.data)
+        get_hours(self.widget_url, "20525")
+        # different weeks, location or widget URL should not share cache entries
+        get_hours(self.widget_url, "20525", weeks=3)
+        get_hours(self.widget_url, "4690")
+        get_hours("https://other.example.com/widget/hours/grid?", "20525")
+        self.assertEqual(mock_get.call_count, 4)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_get_hours_entry_fetched_at(self, mock_get):
+        mock_get.return_value = self.mock_response(self.data)
+        entry = get_hours_entry(self.widget_url, "20525")
+        self.assertEqual(entry["data"], self.data)
+        self.assertIsInstance(entry["fetched_at"], datetime.datetime)
+        # cached entry keeps the original fetch time
+        cached_entry = get_hours_entry(self.widget_url, "20525")
+        self.assertEqual(cached_entry["fetched_at"], entry["fetched_at"])
+
+    @mock.patch("signs.libcal_client.get")
+    def test_get_hours_empty_not_cached(self, mock_get):
+        mock_get.return_value = self.mock_response({})
+        get_hours(self.widget_url, "20525")
+        get_hours(self.widget_url, "20525")
+        # empty responses are not cached, so LibCal is asked again
+        self.assertEqual(mock_get.call_count, 2)
+
+    @override_settings(LIBCAL_HOURS_CACHE_TTL=0)
+    @mock.patch("signs.libcal_client.get")
+    def test_get_hours_ttl(self, mock_get):
+        mock_get.return_value = self.mock_response(self.data)
+        get_hours(self.widget_url, "20525")
+        get_hours(self.widget_url, "20525")
+        # with a TTL of 0, entries expire immediately
+        self.assertEqual(mock_get.call_count, 2)
+
+
+class ParentLocationHoursTestCase(TestCase):
+    def setUp(self):
+        # response for parent location "Arts Library", ID 4690, which includes
+        # child location "Arts Library Reference Desk", ID 20525
+        with open("signs/fixtures/libcal_hours_response_multiple_locations.json") as f:
+            self.parent_data = json.load(f)
+        self.child_data = {"loc_20525": self.parent_data["loc_20525"]}
+        self.widget_url = "https://calendar.example.com/widget/hours/grid?"
+        cache.clear()
+
+    def mock_response(self, data: dict) -> mock.Mock:
+        response = mock.Mock()
+        response.json.return_value = data
+        return response
+
+    @mock.patch("signs.libcal_client.get")
+    def test_parent_fills_child_hours(self, mock_get):
+        mock_get.return_value = self.mock_response(self.parent_data)
+        get_hours(self.widget_url, "4690")
+        child_hours = get_hours(self.widget_url, "20525")
+        # child hours should come from the parent's response, without another request
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(child_hours, self.child_data)
+        self.assertEqual(
+            get_single_location_hours(child_hours, "20525"), self.child_data
+        )
+
+    @mock.patch("signs.libcal_client.get")
+    def test_child_requests_parent(self, mock_get):
+        mock_get.return_value = self.mock_response(self.child_data)
+        get_hours(self.widget_url, "20525")
+        # expire the child's hours; the next request should go to the parent
+        cache.delete(get_hours_cache_key(self.widget_url, "20525", 2))
+        mock_get.return_value = self.mock_response(self.parent_data)
+        child_hours = get_hours(self.widget_url, "20525")
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_get.call_args.kwargs["params"]["lid"], 4690)
+        self.assertEqual(child_hours, self.child_data)
+        # parent's hours were cached by the same request
+        get_hours(self.widget_url, "4690")
+        self.assertEqual(mock_get.call_count, 2)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_child_missing_from_parent(self, mock_get):
+        mock_get.return_value = self.mock_response(self.child_data)
+        get_hours(self.widget_url, "20525")
+        cache.delete(get_hours_cache_key(self.widget_url, "20525", 2))
+        # parent no longer includes the child, so the child is requested directly
+        mock_get.side_effect = [
+            self.mock_response({"loc_4690": self.parent_data["loc_4690"]}),
+            self.mock_response(self.child_data),
+        ]
+        child_hours = get_hours(self.widget_url, "20525")
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(mock_get.call_args.kwargs["params"]["lid"], "20525")
+        self.assertEqual(child_hours, self.child_data)
+
+
+class LogReaderTestCase(TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.log_file = f"{self.log_dir}/application.log"
+        self.lines = []
+        for number in range(1000):
+            level = ["INFO", "WARNING", "ERROR"][number % 3]
+            self.lines.append(f"{level} 2024-02-06 signs.views views Message {number}")
+            if level == "ERROR":
+                self.lines.append("Traceback (most recent call last):")
+                self.lines.append(f"ValueError: {number}")
+        with open(self.log_file, "w") as f:
+            f.write("\n".join(self.lines) + "\n")
+
+    def test_tail(self):
+        self.assertEqual(tail_log([self.log_file], 200), self.lines[-200:])
+        self.assertEqual(tail_log([self.log_file], 10000), self.lines)
+
+    def test_read_lines_reversed(self):
+        with open(self.log_file, "rb") as f:
+            # small blocks split lines between blocks
+            lines = list(log_reader.read_lines_reversed(f, block_size=7))
+        self.assertEqual(lines, self.lines[::-1])
+
+    def test_reads_only_needed_blocks(self):
+        with open(self.log_file, "rb") as f, mock.patch.object(
+            f, "read", wraps=f.read
+        ) as mock_read:
+            lines = log_reader.read_lines_reversed(f, block_size=100)
+            for line, expected in zip(lines, self.lines[:-6:-1]):
+                self.assertEqual(line, expected)
+            self.assertLess(sum(call.args[0] for call in mock_read.call_args_list), 400)
+
+    def test_level_filter(self):
+        lines = tail_log([self.log_file], 9, level="ERROR")
+        self.assertEqual(len(lines), 9)
+        self.assertTrue(lines[0].startswith("ERROR"))
+        # tracebacks are part of their records
+        self.assertEqual(
+            lines[1:3], ["Traceback (most recent call last):", "ValueError: 992"]
+        )
+        lines = tail_log([self.log_file], 1000, level="WARNING")
+        self.assertFalse(any(line.startswith("INFO") for line in lines))
+
+    def test_contains_filter(self):
+        lines = tail_log([self.log_file], 1000, contains="message 99")
+        # Message 99 and 990-999, with the tracebacks of the errors
+        self.assertEqual(len(lines), 11 + 2 * 3)
+        self.assertEqual(lines[0], "INFO 2024-02-06 signs.views views Message 99")
+        self.assertEqual(lines[-1], "INFO 2024-02-06 signs.views views Message 999")
+        self.assertEqual(tail_log([self.log_file], 10, contains="no such text"), [])
+
+    def test_rotated_files(self):
+        with open(f"{self.log_file}.1", "w") as f:
+            f.write("INFO 2024-02-05 signs.views views Older message\n")
+        paths = [self.log_file, f"{self.log_file}.1", f"{self.log_file}.2"]
+        lines = tail_log(paths, len(self.lines) + 1)
+        self.assertEqual(lines[0], "INFO 2024-02-05 signs.views views Older message")
+        self.assertEqual(lines[1:], self.lines)
+
+    def test_empty_file(self):
+        open(self.log_file, "w").close()
+        self.assertEqual(tail_log([self.log_file], 200), [])
+
+    def test_show_log(self):
+        user = User.objects.create_user("admin", password="password")
+        self.client.force_login(user)
+        with self.settings(LOG_FILE=self.log_file):
+            response = self.client.get("/logs/5?level=ERROR&contains=ValueError")
+        self.assertTrue(response.streaming)
+        content = response.getvalue().decode()
+        self.assertIn("ValueError: 998", content)
+        self.assertNotIn("Message 997", content)
+        self.assertIn('value="ValueError"', content)
+        with self.settings(LOG_FILE=f"{self.log_dir}/missing.log"):
+            response = self.client.get("/logs/")
+        self.assertContains(response, "missing.log not found")
+
+    def test_show_log_placeholder_in_filter(self):
+        user = User.objects.create_user("admin", password="password")
+        self.client.force_login(user)
+        for contains in ["__log_data__", "<!-- log data -->"]:
+            with self.subTest(contains=contains), self.settings(LOG_FILE=self.log_file):
+                response = self.client.get("/logs/5", {"contains": contains})
+                content = response.getvalue().decode()
+                # the (empty) log is streamed into the <pre>, not the form's input
+                self.assertIn(f'value="{escape(contains)}"', content)
+                self.assertIn("<pre>\n\n</pre>", content)
+
+    async def test_show_log_asgi(self):
+        with open(self.log_file, "a") as f:
+            f.write("ERROR 2024-02-06 signs.views views <b>Message</b>\n")
+        user = await User.objects.acreate_user("admin", password="password")
+        await self.async_client.aforce_login(user)
+        with self.settings(LOG_FILE=self.log_file):
+            response = await self.async_client.get("/logs/250")
+            content = "".join(
+                [chunk.decode() async for chunk in response.streaming_content]
+            )
+        lines = content.split("<pre>\n", 1)[1].split("\n</pre>", 1)[0].split("\n")
+        self.assertEqual(lines[:-1], self.lines[-249:])
+        self.assertEqual(
+            lines[-1],
+            "ERROR 2024-02-06 signs.views views &lt;b&gt;Message&lt;/b&gt;",
+        )
+
+
+class LogHandlersTestCase(TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.log_file = f"{self.log_dir}/application.log"
+        self.logger = logging.getLogger("signs.tests.log_handlers")
+        self.logger.propagate = False
+        self.addCleanup(setattr, self.logger, "propagate", True)
+
+    def add_queue_handler(self, **kwargs):
+        options = {
+            "filename": self.log_file,
+            "max_bytes": 1000000,
+            "backup_count": 1,
+            "queue_size": 100,
+            "max_message_length": 100,
+        }
+        handler = get_queue_handler(**(options | kwargs))
+        self.addCleanup(handler.listener.stop)
+        self.addCleanup(atexit.unregister, handler.listener.stop)
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        return handler
+
+    def read_records(self, handler):
+        # wait for the listener to write all queued records
+        handler.queue.join()
+        with open(self.log_file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_json_records(self):
+        handler = self.add_queue_handler()
+        self.logger.warning("Hours for %s", 20525)
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            self.logger.exception("Unable to divide")
+        records = self.read_records(handler)
+        self.assertEqual(list(records[0])[0], "level")
+        self.assertEqual(records[0]["level"], "WARNING")
+        self.assertEqual(records[0]["name"], "signs.tests.log_handlers")
+        self.assertEqual(records[0]["message"], "Hours for 20525")
+        self.assertNotIn("traceback", records[0])
+        self.assertEqual(records[1]["message"], "Unable to divide")
+        self.assertIn("ZeroDivisionError", records[1]["traceback"])
+        # each record, with its traceback, is one line of the log
+        self.assertEqual(
+            tail_log([self.log_file], 10, level="ERROR"),
+            [json.dumps(records[1])],
+        )
+
+    def test_abbreviated(self):
+        data = {f"loc_{number}": {"weeks": ["x" * 1000] * 100} for number in range(100)}
+        self.assertLessEqual(len(str(Abbreviated(data))), 1003)
+        # arguments are only formatted if the record is logged
+        self.logger.setLevel(logging.ERROR)
+        self.addCleanup(self.logger.setLevel, logging.NOTSET)
+        with mock.patch("signs.log_handlers.abbreviated_repr") as mock_repr:
+            self.logger.info("Data: %s", Abbreviated(data))
+        mock_repr.repr.assert_not_called()
+
+    def test_long_message_truncated(self):
+        handler = self.add_queue_handler(max_message_length=10)
+        self.logger.error("%s", "x" * 1000)
+        records = self.read_records(handler)
+        self.assertEqual(records[0]["message"], "xxxxxxxxxx... (990 more)")
+
+    def test_shared_rotation(self):
+        # two processes writing the same log, each with its own handler
+        for number in range(2):
+            handler = SharedRotatingFileHandler(
+                self.log_file, maxBytes=200, backupCount=5
+            )
+            self.addCleanup(handler.close)
+            self.logger.addHandler(handler)
+            self.addCleanup(self.logger.removeHandler, handler)
+        for number in range(20):
+            self.logger.error("Message %02d", number)
+        paths = [self.log_file] + [
+            f"{self.log_file}.{number}" for number in range(1, 6)
+        ]
+        lines = tail_log(paths, 100)
+        self.assertTrue(Path(f"{self.log_file}.2").exists())
+        # each record is written once by each handler, none to a rotated file
+        self.assertEqual(
+            lines, [f"Message {number:02d}" for number in range(20) for _ in range(2)]
+        )
+
+    def test_full_queue(self):
+        # without a listener, nothing is taken from the queue
+        handler = LogQueueHandler(queue.Queue(maxsize=2), max_message_length=100)
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        for number in range(5):
+            self.logger.error("Message %s", number)
+        self.assertEqual(handler.dropped, 3)
+        # once there's room, a note of how many records were dropped is queued
+        handler.queue.get_nowait()
+        handler.queue.get_nowait()
+        self.logger.error("Message 5")
+        messages = [handler.queue.get_nowait().getMessage() for number in range(2)]
+        self.assertEqual(
+            messages, ["Log queue was full, 3 records dropped", "Message 5"]
+        )
+        self.assertEqual(handler.dropped, 0)
+
+
+@override_settings(
+    LIBCAL_MAX_RETRIES=2, LIBCAL_RETRY_BACKOFF=0, LIBCAL_READ_TIMEOUT=0.5
+)
+class LibCalClientTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.hours_json = f.read()
+        self.stub = LibCalStubServer().start()
+        self.widget_url = f"{self.stub.url}/widget/hours/grid?"
+        # sessions are created from settings, so start each test with a new one
+        libcal_client.close_session()
+
+    def tearDown(self):
+        libcal_client.close_session()
+        self.stub.stop()
+
+    def test_connections_reused(self):
+        self.stub.add_response(
+            "/widget/hours/grid", self.hours_json, content_type="application/json"
+        )
+        for location_id in ["20525", "4690", "2572"]:
+            self.assertTrue(fetch_hours(self.widget_url, location_id))
+        # all requests should use the same kept-alive connection
+        client_addresses = {request[2] for request in self.stub.requests}
+        self.assertEqual(len(self.stub.requests), 3)
+        self.assertEqual(len(client_addresses), 1)
+
+    def test_retry_after_error(self):
+        self.stub.add_response("/widget/hours/grid", "Unavailable", status=503)
+        self.stub.add_response(
+            "/widget/hours/grid", self.hours_json, content_type="application/json"
+        )
+        data = fetch_hours(self.widget_url, "20525")
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertIn("loc_20525", data)
+
+    def test_retries_exhausted(self):
+        self.stub.add_response("/widget/hours/grid", "Unavailable", status=503)
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            data = fetch_hours(self.widget_url, "20525")
+        # first request, plus LIBCAL_MAX_RETRIES retries
+        self.assertEqual(len(self.stub.requests), 3)
+        self.assertEqual(data, {})
+
+    @override_settings(LIBCAL_MAX_RETRIES=0)
+    def test_read_timeout(self):
+        self.stub.add_response(
+            "/widget/hours/grid",
+            self.hours_json,
+            content_type="application/json",
+            delay=2,
+        )
+        started = time.monotonic()
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            data = fetch_hours(self.widget_url, "20525")
+        # the request should give up after LIBCAL_READ_TIMEOUT, not wait for LibCal
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(data, {})
+
+    def test_session_per_process(self):
+        session = libcal_client.get_session()
+        self.assertIs(libcal_client.get_session(), session)
+        # a forked worker process should not reuse its parent's session
+        with mock.patch("signs.libcal_client.os.getpid", return_value=-1):
+            self.assertIsNot(libcal_client.get_session(), session)
+
+
+class LibCalStubTestCase(TestCase):
+    def test_latency(self):
+        with LibCalStubServer(latency=0.2) as stub:
+            stub.add_response("/widget/hours/grid", "{}")
+            started = time.monotonic()
+            requests.get(f"{stub.url}/widget/hours/grid")
+            self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_error_rate(self):
+        with LibCalStubServer(error_rate=0.5, seed=1) as stub:
+            stub.add_response("/widget/hours/grid", "{}")
+            statuses = [
+                requests.get(f"{stub.url}/widget/hours/grid").status_code
+                for _ in range(20)
+            ]
+        # errors are chosen at random, but the same ones for the same seed
+        self.assertEqual(statuses.count(503), stub.errors)
+        self.assertTrue(0 < stub.errors < 20)
+        with LibCalStubServer(error_rate=0.5, seed=1) as stub:
+            stub.add_response("/widget/hours/grid", "{}")
+            repeated = [
+                requests.get(f"{stub.url}/widget/hours/grid").status_code
+                for _ in range(20)
+            ]
+        self.assertEqual(repeated, statuses)
+
+    def test_fixture_responses(self):
+        with LibCalStubServer() as stub:
+            stub.add_fixture_responses()
+            response = requests.get(
+                f"{stub.url}/widget/hours/grid", params={"lid": 4690, "weeks": 2}
+            )
+            events = requests.get(f"{stub.url}/api_events.php", params={"cid": 3363})
+        data = response.json()
+        # hours are for the requested location, in weeks starting this Sunday
+        self.assertEqual(list(data), ["loc_4690"])
+        self.assertEqual(data["loc_4690"]["lid"], 4690)
+        weeks = data["loc_4690"]["weeks"]
+        week_start = get_week_start(timezone.localdate())
+        self.assertEqual(weeks[0]["Sunday"]["date"], week_start.isoformat())
+        self.assertEqual(
+            weeks[1]["Saturday"]["date"],
+            (week_start + datetime.timedelta(days=13)).isoformat(),
+        )
+        self.assertTrue(parse_events(HttpResponse(events.content)))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    LIBCAL_HOURS_CACHE_TTL=60,
+)
+@mock.patch(
+    "signs.views_utils.timezone.localdate", return_value=datetime.date(2024, 2, 6)
+)
+class GetFormattedHoursTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.data = json.load(f)
+        self.widget_url = "https://calendar.example.com/widget/hours/grid?"
+        self.cache_key = get_formatted_hours_cache_key(self.widget_url, "20525")
+        cache.clear()
+        # Background refreshes run in worker threads, whose database connections
+        # are outside the test's transaction; snapshots are tested separately
+        patcher = mock.patch("signs.views_utils.save_hours_snapshot")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def mock_response(self, data: dict) -> mock.Mock:
+        response = mock.Mock()
+        response.json.return_value = data
+        return response
+
+    def set_stale_hours(self, rendered_hours: str = "Stale") -> None:
+        hours = format_hours(self.data)
+        for day in hours:
+            day["rendered_hours"] = rendered_hours
+        fetched_at = timezone.now() - datetime.timedelta(seconds=120)
+        cache.set(self.cache_key, {"hours": hours, "fetched_at": fetched_at}, None)
+
+    def wait_for_refreshes(self) -> None:
+        for future in list(views_utils.pending_refreshes.values()):
+            future.result()
+
+    @mock.patch("signs.libcal_client.get")
+    def test_fresh_hours_cached(self, mock_get, mock_localdate):
+        mock_get.return_value = self.mock_response(self.data)
+        first = get_formatted_hours(self.widget_url, "20525")
+        second = get_formatted_hours(self.widget_url, "20525")
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first[0]["rendered_hours"], "10am - 4pm")
+        self.assertEqual(views_utils.pending_refreshes, {})
+
+    @mock.patch("signs.libcal_client.get")
+    def test_stale_hours_served_while_refreshing(self, mock_get, mock_localdate):
+        self.set_stale_hours()
+        mock_get.return_value = self.mock_response(self.data)
+        hours = get_formatted_hours(self.widget_url, "20525")
+        # stale hours are returned right away...
+        self.assertEqual(hours[0]["rendered_hours"], "Stale")
+        # ...and replaced by the background refresh
+        self.wait_for_refreshes()
+        self.assertEqual(mock_get.call_count, 1)
+        hours = get_formatted_hours(self.widget_url, "20525")
+        self.assertEqual(hours[0]["rendered_hours"], "10am - 4pm")
+
+    @mock.patch("signs.libcal_client.get")
+    def test_last_known_good_hours_kept_on_error(self, mock_get, mock_localdate):
+        self.set_stale_hours("Last known good")
+        mock_get.side_effect = requests.ConnectionError("LibCal unavailable")
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            get_formatted_hours(self.widget_url, "20525")
+            self.wait_for_refreshes()
+            # still stale, so this schedules another refresh
+            hours = get_formatted_hours(self.widget_url, "20525")
+            self.wait_for_refreshes()
+        self.assertEqual(hours[0]["rendered_hours"], "Last known good")
+
+    @mock.patch("signs.libcal_client.get")
+    def test_outdated_hours_refreshed_inline(self, mock_get, mock_localdate):
+        self.set_stale_hours()
+        # stored hours end on Feb 11, so aren't used after that
+        mock_localdate.return_value = datetime.date(2024, 2, 12)
+        mock_get.return_value = self.mock_response(self.data)
+        hours = get_formatted_hours(self.widget_url, "20525")
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(hours[0]["rendered_hours"], "10am - 4pm")
+
+    @mock.patch("signs.libcal_client.get")
+    def test_past_hours_not_used_on_error(self, mock_get, mock_localdate):
+        self.set_stale_hours("Past")
+        # stored hours end on Feb 11, and LibCal is unavailable
+        mock_localdate.return_value = datetime.date(2024, 3, 1)
+        mock_get.side_effect = requests.ConnectionError("LibCal unavailable")
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            hours = get_formatted_hours(self.widget_url, "20525")
+        self.assertEqual(hours, [])
+
+    def test_past_hours_not_displayed_on_error(self, mock_localdate):
+        Location.objects.create(name="Arts Library Reference Desk", location_id=20525)
+        self.set_stale_hours("Past")
+        mock_localdate.return_value = datetime.date(2024, 3, 1)
+        # the display views use the async LibCal client
+        patch_libcal_get(self, side_effect=httpx.ConnectError("LibCal unavailable"))
+        with self.settings(LIBCAL_HOURS_WIDGET=self.widget_url), self.assertLogs(
+            "signs.views_utils", "ERROR"
+        ):
+            response = self.client.get("/display_hours/20525/portrait_small")
+        self.assertNotContains(response, "Past")
+        # the error page isn't cached by players
+        self.assertNotIn("ETag", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    @mock.patch("signs.libcal_client.get")
+    def test_no_hours_available(self, mock_get, mock_localdate):
+        mock_get.side_effect = requests.ConnectionError("LibCal unavailable")
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            hours = get_formatted_hours(self.widget_url, "20525")
+        self.assertEqual(hours, [])
+
+
+@mock.patch(
+    "signs.views_utils.timezone.localdate", return_value=datetime.date(2024, 2, 6)
+)
+class HoursSnapshotTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.data = json.load(f)
+        self.widget_url = "https://calendar.example.com/widget/hours/grid?"
+        self.hours = format_hours(copy.deepcopy(self.data))
+        self.fetched_at = timezone.now()
+        cache.clear()
+
+    def test_format_hours_status(self, mock_localdate):
+        self.assertEqual(self.hours[0]["status"], "open")
+        self.assertEqual(self.hours[6]["status"], "closed")
+
+    def test_get_display_week(self, mock_localdate):
+        for day, week in [
+            (datetime.date(2024, 2, 5), (5, 11)),
+            (datetime.date(2024, 2, 6), (5, 11)),
+            (datetime.date(2024, 2, 10), (5, 11)),
+            # LibCal's second week starts on Sunday
+            (datetime.date(2024, 2, 11), (12, 18)),
+        ]:
+            with self.subTest(day=day):
+                start, end = get_display_week(day)
+                self.assertEqual((start.day, end.day), week)
+
+    def test_save_only_changed_days(self, mock_localdate):
+        self.assertEqual(save_hours_snapshot(20525, self.hours, self.fetched_at), 7)
+        later = self.fetched_at + datetime.timedelta(hours=1)
+        self.assertEqual(save_hours_snapshot(20525, self.hours, later), 0)
+        self.hours[1]["rendered_hours"] = "Closed"
+        self.hours[1]["status"] = "closed"
+        with self.assertNumQueries(2):
+            self.assertEqual(save_hours_snapshot(20525, self.hours, later), 1)
+
+        snapshots = HoursSnapshot.objects.filter(location_id=20525)
+        self.assertEqual(snapshots.count(), 7)
+        changed = snapshots.get(date=datetime.date(2024, 2, 6))
+        self.assertEqual(changed.rendered_hours, "Closed")
+        self.assertEqual(changed.fetched_at, later)
+        unchanged = snapshots.get(date=datetime.date(2024, 2, 5))
+        self.assertEqual(unchanged.fetched_at, self.fetched_at)
+
+    def test_get_snapshot_hours_entry(self, mock_localdate):
+        self.assertIsNone(get_snapshot_hours_entry(20525))
+        save_hours_snapshot(20525, self.hours, self.fetched_at)
+        with self.assertNumQueries(1):
+            entry = get_snapshot_hours_entry(20525)
+        self.assertEqual(entry["hours"], self.hours)
+        self.assertEqual(entry["digest"], get_digest(self.hours))
+        # other weeks' hours aren't used
+        mock_localdate.return_value = datetime.date(2024, 2, 12)
+        self.assertIsNone(get_snapshot_hours_entry(20525))
+
+    @mock.patch("signs.libcal_client.get")
+    def test_snapshot_used_without_cache(self, mock_get, mock_localdate):
+        mock_get.return_value.json.return_value = self.data
+        entry = get_formatted_hours_entry(self.widget_url, 20525)
+        self.assertEqual(HoursSnapshot.objects.filter(location_id=20525).count(), 7)
+
+        # e.g. a new deployment with an empty cache, while LibCal is down
+        cache.clear()
+        mock_get.side_effect = requests.ConnectionError("LibCal unavailable")
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            snapshot_entry = get_formatted_hours_entry(self.widget_url, 20525)
+            for future in list(views_utils.pending_refreshes.values()):
+                future.result()
+        self.assertEqual(snapshot_entry["hours"], entry["hours"])
+        self.assertEqual(snapshot_entry["digest"], entry["digest"])
+
+    @override_settings(SIGNS_HOURS_SNAPSHOTS=False)
+    @mock.patch("signs.libcal_client.get")
+    def test_snapshots_disabled(self, mock_get, mock_localdate):
+        save_hours_snapshot(20525, self.hours, self.fetched_at)
+        mock_get.side_effect = requests.ConnectionError("LibCal unavailable")
+        # stored hours aren't read...
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            self.assertIsNone(get_formatted_hours_entry(self.widget_url, 20525))
+        # ...and new hours aren't stored
+        HoursSnapshot.objects.all().delete()
+        mock_get.side_effect = None
+        mock_get.return_value.json.return_value = self.data
+        self.assertIsNotNone(get_formatted_hours_entry(self.widget_url, 20525))
+        self.assertFalse(HoursSnapshot.objects.exists())
+
+
+@mock.patch(
+    "signs.views_utils.timezone.localdate", return_value=datetime.date(2024, 2, 6)
+)
+class GetHoursRangeTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.data = json.load(f)
+        del self.data["loc_20525"]["parent_lid"]
+        self.widget_url = "https://calendar.example.com/widget/hours/grid?"
+        cache.clear()
+        patcher = mock.patch("signs.libcal_client.get", side_effect=self.mock_get)
+        self.mock_get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def mock_get(self, url, params=None):
+        # LibCal returns the requested number of weeks, from this week's Sunday
+        data = copy.deepcopy(self.data)
+        weeks = data["loc_20525"]["weeks"]
+        while len(weeks) < params["weeks"]:
+            weeks.append(
+                {
+                    weekday: {
+                        **day,
+                        "date": (
+                            datetime.date.fromisoformat(day["date"])
+                            + datetime.timedelta(days=7)
+                        ).isoformat(),
+                    }
+                    for weekday, day in weeks[-1].items()
+                }
+            )
+        del weeks[params["weeks"] :]
+        response = mock.Mock()
+        response.json.return_value = data
+        return response
+
+    def requested_weeks(self) -> list[int]:
+        return [call.kwargs["params"]["weeks"] for call in self.mock_get.call_args_list]
+
+    def test_get_hours_range(self, mock_localdate):
+        hours = get_hours_range(
+            self.widget_url,
+            20525,
+            datetime.date(2024, 2, 5),
+            datetime.date(2024, 2, 11),
+        )
+        self.assertEqual(self.requested_weeks(), [2])
+        self.assertEqual(len(hours), 7)
+        self.assertEqual(list(hours), format_hours(copy.deepcopy(self.data)))
+
+    def test_fewest_weeks_requested(self, mock_localdate):
+        start = datetime.date(2024, 2, 4)
+        hours = get_hours_range(
+            self.widget_url, 20525, start, datetime.date(2024, 2, 6)
+        )
+        self.assertEqual(self.requested_weeks(), [1])
+        self.assertEqual(hours[0]["weekday"], "Sunday")
+        # "next 4 weeks"
+        hours = get_hours_range(
+            self.widget_url, 20525, start, datetime.date(2024, 3, 2)
+        )
+        self.assertEqual(self.requested_weeks(), [1, 4])
+        self.assertEqual(len(hours), 28)
+        self.assertEqual(hours[-1]["date"], "2024-03-02")
+
+    def test_cached_windows_reused(self, mock_localdate):
+        # the signs' 2 week window covers ranges within it
+        get_hours(self.widget_url, 20525)
+        get_hours_range(
+            self.widget_url,
+            20525,
+            datetime.date(2024, 2, 12),
+            datetime.date(2024, 2, 17),
+        )
+        self.assertEqual(self.requested_weeks(), [2])
+        get_hours_range(
+            self.widget_url,
+            20525,
+            datetime.date(2024, 2, 4),
+            datetime.date(2024, 2, 24),
+        )
+        get_hours_range(
+            self.widget_url,
+            20525,
+            datetime.date(2024, 2, 18),
+            datetime.date(2024, 2, 20),
+        )
+        self.assertEqual(self.requested_weeks(), [2, 3])
+
+    def test_slices(self, mock_localdate):
+        hours = get_hours_range(
+            self.widget_url,
+            20525,
+            datetime.date(2024, 2, 4),
+            datetime.date(2024, 2, 17),
+        )
+        weekend = hours[6:8]
+        self.assertIsInstance(weekend, HoursRange)
+        self.assertEqual([day["date"] for day in weekend], ["2024-02-10", "2024-02-11"])
+        self.assertEqual([day["weekday"] for day in hours[::7]], ["Sunday", "Sunday"])
+        self.assertEqual(hours[-1]["date"], "2024-02-17")
+        with self.assertRaises(IndexError):
+            hours[14]
+
+    def test_invalid_ranges(self, mock_localdate):
+        for start, end in [
+            (datetime.date(2024, 2, 8), datetime.date(2024, 2, 7)),
+            (datetime.date(2024, 2, 3), datetime.date(2024, 2, 7)),
+            (datetime.date(2024, 2, 4), datetime.date(2024, 6, 1)),
+        ]:
+            with self.subTest(start=start, end=end):
+                with self.assertRaises(ValueError):
+                    get_hours_range(self.widget_url, 20525, start, end)
+        self.assertEqual(self.requested_weeks(), [])
+
+    def test_hours_unavailable(self, mock_localdate):
+        self.mock_get.side_effect = requests.ConnectionError("LibCal unavailable")
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            hours = get_hours_range(
+                self.widget_url,
+                20525,
+                datetime.date(2024, 2, 5),
+                datetime.date(2024, 2, 6),
+            )
+        self.assertIsNone(hours)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    LIBCAL_FETCH_POLL_INTERVAL=0.01,
+)
+class SingleFlightTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.data = json.load(f)
+        del self.data["loc_20525"]["parent_lid"]
+        self.widget_url = "https://calendar.example.com/widget/hours/grid?"
+        self.cache_key = get_hours_cache_key(self.widget_url, "20525", 2)
+        self.upstream_calls = 0
+        self.upstream_lock = threading.Lock()
+        cache.clear()
+
+    def slow_get(self, url, params=None):
+        with self.upstream_lock:
+            self.upstream_calls += 1
+        time.sleep(0.2)
+        response = mock.Mock()
+        response.json.return_value = self.data
+        return response
+
+    def get_hours_concurrently(self, requests: int) -> list[dict]:
+        with ThreadPoolExecutor(max_workers=requests) as executor:
+            futures = [
+                executor.submit(get_hours, self.widget_url, "20525")
+                for _ in range(requests)
+            ]
+            return [future.result() for future in futures]
+
+    @mock.patch("signs.libcal_client.get")
+    def test_load_one_upstream_call_per_ttl_window(self, mock_get):
+        mock_get.side_effect = self.slow_get
+        # 100 simultaneous sign refreshes for the same location
+        results = self.get_hours_concurrently(100)
+        self.assertEqual(self.upstream_calls, 1)
+        self.assertTrue(all(result == self.data for result in results))
+
+        # still within the TTL window, so served from the cache
+        self.get_hours_concurrently(100)
+        self.assertEqual(self.upstream_calls, 1)
+
+        # once the cache entry expires, the next burst makes one more call
+        cache.delete(self.cache_key)
+        self.get_hours_concurrently(100)
+        self.assertEqual(self.upstream_calls, 2)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_wait_for_other_process(self, mock_get):
+        # another worker holds the lock, and caches its result shortly
+        cache.add(f"single-flight:{self.cache_key}", -1)
+
+        def finish_other_fetch():
+            time.sleep(0.2)
+            cache.set(self.cache_key, {"data": self.data, "fetched_at": None})
+            cache.delete(f"single-flight:{self.cache_key}")
+
+        threading.Thread(target=finish_other_fetch).start()
+        self.assertEqual(get_hours(self.widget_url, "20525"), self.data)
+        self.assertEqual(mock_get.call_count, 0)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_other_process_without_result(self, mock_get):
+        mock_get.side_effect = self.slow_get
+        # another worker held the lock, but didn't cache a result
+        cache.add(f"single-flight:{self.cache_key}", -1, 0.2)
+        self.assertEqual(get_hours(self.widget_url, "20525"), self.data)
+        self.assertEqual(self.upstream_calls, 1)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_error_shared_by_waiting_requests(self, mock_get):
+        def failing_get(url, params=None):
+            time.sleep(0.2)
+            raise RuntimeError("Unexpected error")
+
+        mock_get.side_effect = failing_get
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            futures = [
+                executor.submit(get_hours, self.widget_url, "20525") for _ in range(10)
+            ]
+            for future in futures:
+                with self.assertRaises(RuntimeError):
+                    future.result()
+        self.assertEqual(mock_get.call_count, 1)
+        # the lock is released, so the next request tries again
+        self.assertIsNone(cache.get(f"single-flight:{self.cache_key}"))
+
+
+@mock.patch(
+    "signs.views_utils.timezone.localdate", return_value=datetime.date(2024, 2, 6)
+)
+@mock.patch("signs.views.render", wraps=render)
+class DisplayHoursPageCacheTestCase(TestCase):
+    def setUp(self):
+        self.location = Location.objects.create(
+            name="Arts Library Reference Desk", location_id=20525
+        )
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.data = json.load(f)
+        self.url = "/display_hours/20525/portrait_small"
+        cache.clear()
+        views_utils.local_pages.clear()
+        self.mock_get = patch_libcal_get(self)
+        self.mock_get.return_value.json.return_value = self.data
+
+    def test_page_cached(self, mock_render, mock_localdate):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(mock_render.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+    def test_page_cached_in_memory(self, mock_render, mock_localdate):
+        first = self.client.get(self.url)
+        page_cache_key = get_page_cache_key(20525, "portrait_small", mock_localdate())
+        # the page is read from this process's memory, not the shared cache...
+        with mock.patch("signs.views_utils.cache.aget", wraps=cache.aget) as mock_aget:
+            second = self.client.get(self.url)
+        self.assertNotIn(
+            page_cache_key, [call.args[0] for call in mock_aget.mock_calls]
+        )
+        self.assertEqual(first.content, second.content)
+        # ...or from the shared cache, when another process rendered it
+        views_utils.local_pages.clear()
+        third = self.client.get(self.url)
+        self.assertEqual(mock_render.call_count, 1)
+        self.assertEqual(first.content, third.content)
+        self.assertIsNotNone(views_utils.local_pages.get(page_cache_key))
+
+    @override_settings(SIGNS_LOCAL_PAGE_CACHE_ENTRIES=0)
+    def test_page_not_cached_in_memory(self, mock_render, mock_localdate):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        # the page is still cached, but only in the shared cache
+        self.assertEqual(mock_render.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        page_cache_key = get_page_cache_key(20525, "portrait_small", mock_localdate())
+        self.assertIsNone(views_utils.local_pages.get(page_cache_key))
+        self.assertIsNotNone(cache.get(page_cache_key))
+
+    def test_page_cached_per_orientation(self, mock_render, mock_localdate):
+        self.client.get(self.url)
+        self.client.get("/display_hours/20525/landscape_small")
+        self.assertEqual(mock_render.call_count, 2)
+
+    def test_page_rendered_for_new_date(self, mock_render, mock_localdate):
+        self.client.get(self.url)
+        mock_localdate.return_value = datetime.date(2024, 2, 7)
+        self.client.get(self.url)
+        self.assertEqual(mock_render.call_count, 2)
+
+    def test_page_rendered_for_changed_hours(self, mock_render, mock_localdate):
+        first = self.client.get(self.url)
+        # same hours from LibCal don't change the page...
+        refresh_formatted_hours(settings.LIBCAL_HOURS_WIDGET, 20525)
+        self.client.get(self.url)
+        self.assertEqual(mock_render.call_count, 1)
+        # ...but new hours do
+        self.data["loc_20525"]["weeks"][0]["Tuesday"]["rendered"] = "Closed"
+        cache.delete(get_hours_cache_key(settings.LIBCAL_HOURS_WIDGET, 20525, 2))
+        refresh_formatted_hours(settings.LIBCAL_HOURS_WIDGET, 20525)
+        response = self.client.get(self.url)
+        self.assertEqual(mock_render.call_count, 2)
+        self.assertNotEqual(response.content, first.content)
+
+    def test_page_rendered_for_changed_name(self, mock_render, mock_localdate):
+        self.client.get(self.url)
+        self.location.name = "Arts Library Help Desk"
+        self.location.save()
+        response = self.client.get(self.url)
+        self.assertEqual(mock_render.call_count, 2)
+        self.assertContains(response, "Arts Library Help Desk")
+
+    def test_unknown_orientation_not_cached(self, mock_render, mock_localdate):
+        self.client.get("/display_hours/20525/sideways")
+        self.client.get("/display_hours/20525/sideways")
+        self.assertEqual(mock_render.call_count, 2)
+
+
+@override_settings(SIGNS_DISPLAY_MAX_AGE=60)
+@mock.patch(
+    "signs.views_utils.timezone.localdate", return_value=datetime.date(2024, 2, 6)
+)
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        Location.objects.create(name="Arts Library Reference Desk", location_id=20525)
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.data = json.load(f)
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            self.events_html = f.read()
+        self.url = "/display_hours/20525/portrait_small"
+        cache.clear()
+        self.mock_get = patch_libcal_get(self)
+        self.mock_get.return_value.json.return_value = self.data
+
+    def test_hours_etag(self, mock_localdate):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertIn("max-age=60", response["Cache-Control"])
+        # same ETag for the same hours, orientation and date
+        self.assertEqual(self.client.get(self.url)["ETag"], response["ETag"])
+        self.assertNotEqual(
+            self.client.get("/display_hours/20525/landscape_small")["ETag"],
+            response["ETag"],
+        )
+        mock_localdate.return_value = datetime.date(2024, 2, 7)
+        self.assertNotEqual(self.client.get(self.url)["ETag"], response["ETag"])
+
+    def test_hours_not_modified(self, mock_localdate):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+        self.assertIn("max-age=60", response["Cache-Control"])
+
+    def test_hours_modified(self, mock_localdate):
+        etag = self.client.get(self.url)["ETag"]
+        self.data["loc_20525"]["weeks"][0]["Tuesday"]["rendered"] = "Closed"
+        cache.delete(get_hours_cache_key(settings.LIBCAL_HOURS_WIDGET, 20525, 2))
+        refresh_formatted_hours(settings.LIBCAL_HOURS_WIDGET, 20525)
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_hours_error_not_cached(self, mock_localdate):
+        self.mock_get.return_value.json.return_value = {}
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            response = self.client.get(self.url)
+        self.assertContains(response, "There was an error retrieving hours")
+        self.assertFalse(response.has_header("ETag"))
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_events_not_modified(self, mock_localdate):
+        self.mock_get.return_value = HttpResponse(self.events_html)
+        response = self.client.get("/display_clicc_events/")
+        self.assertIn("max-age=60", response["Cache-Control"])
+        etag = response["ETag"]
+        response = self.client.get(
+            "/display_clicc_events/", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    SIGNS_DISPLAY_MAX_AGE=60,
+    SIGNS_LIVE_POLL_INTERVAL=30,
+)
+@mock.patch(
+    "signs.views_utils.timezone.localdate", return_value=datetime.date(2024, 2, 6)
+)
+class JsonAPITestCase(TestCase):
+    def setUp(self):
+        Location.objects.create(name="Arts Library Reference Desk", location_id=20525)
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.data = json.load(f)
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            self.events_html = f.read()
+        self.screen = EventScreen.objects.create(name="Study Rooms")
+        EventRoom.objects.create(
+            screen=self.screen, name="Room 1", location_id=3363, position=1
+        )
+        cache.clear()
+        self.mock_get = patch_libcal_get(self)
+        self.mock_get.return_value.json.return_value = self.data
+
+    def test_api_hours(self, mock_localdate):
+        response = self.client.get("/api/v1/hours/20525")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/json")
+        data = response.json()
+        self.assertEqual(
+            data["location"], {"id": 20525, "name": "Arts Library Reference Desk"}
+        )
+        self.assertEqual(data["today"], "2024-02-06")
+        self.assertEqual((data["start"], data["end"]), ("Feb 05", "Feb 11"))
+        self.assertEqual(len(data["hours"]), 7)
+        self.assertEqual(
+            set(data["hours"][0]), {"date", "weekday", "rendered_hours", "status"}
+        )
+        self.assertIn("max-age=60", response["Cache-Control"])
+
+    def test_api_hours_not_modified(self, mock_localdate):
+        etag = self.client.get("/api/v1/hours/20525")["ETag"]
+        response = self.client.get(
+            "/api/v1/hours/20525", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+        # the ETag changes with the date, which marks today's hours
+        mock_localdate.return_value = datetime.date(2024, 2, 7)
+        self.assertNotEqual(self.client.get("/api/v1/hours/20525")["ETag"], etag)
+
+    def test_api_hours_errors(self, mock_localdate):
+        response = self.client.get("/api/v1/hours/1")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"error": "No location 1"})
+
+        self.mock_get.side_effect = requests.exceptions.ConnectionError
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            response = self.client.get("/api/v1/hours/20525")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("error retrieving hours", response.json()["error"])
+        self.assertFalse(response.has_header("ETag"))
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_api_events(self, mock_localdate):
+        self.mock_get.return_value = HttpResponse(self.events_html)
+        response = self.client.get(f"/api/v1/events/{self.screen.id}")
+        data = response.json()
+        self.assertEqual(data["screen"], {"id": self.screen.id, "name": "Study Rooms"})
+        self.assertEqual(
+            data["window"], {"start": "08:00", "end": "20:00", "slot_minutes": 30}
+        )
+        self.assertEqual(data["grid_rows"], 26)
+        self.assertEqual(data["time_markers"][0], {"label": "8 AM", "css_row": "2"})
+        self.assertEqual(len(data["columns"]), 1)
+        self.assertEqual(data["columns"][0]["css_column"], "2")
+        event = data["columns"][0]["events"][0]
+        self.assertEqual(
+            set(event),
+            {
+                "title",
+                "start_time",
+                "end_time",
+                "times",
+                "start_css_row",
+                "end_css_row",
+                "lane",
+                "lanes",
+            },
+        )
+        self.assertRegex(event["start_time"], r"^\d\d:\d\d$")
+        self.assertIn("max-age=60", response["Cache-Control"])
+
+    def test_api_events_window(self, mock_localdate):
+        self.mock_get.return_value = HttpResponse(self.events_html)
+        url = f"/api/v1/events/{self.screen.id}"
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(f"{url}?start=18:00&end=22:00&slot=15")
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["window"]["slot_minutes"], 15)
+
+    def test_api_events_not_found(self, mock_localdate):
+        response = self.client.get(f"/api/v1/events/{self.screen.id + 100}")
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("error", response.json())
+
+    def test_api_smaller_than_page(self, mock_localdate):
+        page = self.client.get("/display_hours/20525/portrait_small")
+        data = self.client.get("/api/v1/hours/20525")
+        self.assertLess(len(data.content), len(page.content))
+
+    def test_display_hours_live(self, mock_localdate):
+        response = self.client.get("/live/display_hours/20525/landscape_small")
+        self.assertContains(response, "<h1>Arts Library Reference Desk</h1>")
+        self.assertContains(response, 'data-api-url="/api/v1/hours/20525"')
+        self.assertContains(response, 'data-poll-interval="30"')
+        self.assertContains(response, "<ul></ul>", count=2)
+        self.assertContains(response, "js/display.js")
+        # the shell doesn't need hours from LibCal
+        self.mock_get.assert_not_called()
+        response = self.client.get("/live/display_hours/1/portrait_small")
+        self.assertEqual(response.status_code, 404)
+
+    def test_display_events_live(self, mock_localdate):
+        response = self.client.get(
+            f"/live/display_events/{self.screen.id}?start=18:00&end=22:00"
+        )
+        self.assertContains(response, "<h1>Study Rooms</h1>")
+        self.assertContains(
+            response,
+            f'data-api-url="/api/v1/events/{self.screen.id}?start=18%3A00&amp;end=22%3A00"',
+        )
+        self.mock_get.assert_not_called()
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    SIGNS_LIVE_POLL_INTERVAL=30,
+    SIGNS_STREAM_CHECK_INTERVAL=0.01,
+    SIGNS_STREAM_KEEPALIVE=0.02,
+    SIGNS_STREAM_MAX_AGE=0.1,
+)
+@mock.patch(
+    "signs.views_utils.timezone.localdate", return_value=datetime.date(2024, 2, 6)
+)
+class UpdateStreamTestCase(TestCase):
+    def setUp(self):
+        Location.objects.create(name="Arts Library Reference Desk", location_id=20525)
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.data = json.load(f)
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            self.events_html = f.read()
+        self.screen = EventScreen.objects.create(name="Study Rooms")
+        EventRoom.objects.create(
+            screen=self.screen, name="Room 1", location_id=3363, position=1
+        )
+        cache.clear()
+        update_stream.versions.clear()
+        self.mock_get = patch_libcal_get(self)
+        self.mock_get.return_value.json.return_value = self.data
+
+    async def read_stream(self, key, get_version):
+        return [
+            message async for message in update_stream.stream_updates(key, get_version)
+        ]
+
+    async def test_stream_updates(self, mock_localdate):
+        get_version = mock.Mock(side_effect=["a", "a", None, "b"] + ["b"] * 100)
+        messages = await self.read_stream("test", get_version)
+        self.assertEqual(messages[0], "retry: 30000\n\n")
+        updates = [message for message in messages if message.startswith("event")]
+        self.assertEqual(
+            updates,
+            [
+                'event: update\ndata: {"etag": "a"}\n\n',
+                'event: update\ndata: {"etag": "b"}\n\n',
+            ],
+        )
+        self.assertIn(": keepalive\n\n", messages)
+
+    async def test_versions_forgotten_when_streams_close(self, mock_localdate):
+        get_version = mock.Mock(return_value="a")
+        first = update_stream.stream_updates("test", get_version)
+        second = update_stream.stream_updates("test", get_version)
+        await anext(first)
+        await anext(second)
+        await anext(first)
+        self.assertIn("test", update_stream.versions)
+        # e.g. a display disconnecting
+        await first.aclose()
+        self.assertIn("test", update_stream.versions)
+        await second.aclose()
+        self.assertNotIn("test", update_stream.versions)
+        self.assertNotIn("test", update_stream.stream_counts)
+        # streams which end by themselves forget their key too
+        await self.read_stream("other", get_version)
+        self.assertEqual(update_stream.versions, {})
+        self.assertEqual(update_stream.stream_counts, {})
+
+    async def test_shared_version(self, mock_localdate):
+        get_version = mock.Mock(return_value="a")
+        results = await asyncio.gather(
+            *[update_stream.get_shared_version("test", get_version) for i in range(20)]
+        )
+        self.assertEqual(results, ["a"] * 20)
+        # checked once for all displays
+        get_version.assert_called_once()
+        await update_stream.get_shared_version("test", get_version)
+        get_version.assert_called_once()
+        await asyncio.sleep(0.02)
+        await update_stream.get_shared_version("test", get_version)
+        self.assertEqual(get_version.call_count, 2)
+
+    async def test_check_error(self, mock_localdate):
+        get_version = mock.Mock(side_effect=ValueError)
+        with self.assertLogs("signs.update_stream", "ERROR"):
+            version = await update_stream.get_shared_version("test", get_version)
+        self.assertIsNone(version)
+
+    async def test_stream_hours(self, mock_localdate):
+        # once hours are cached, checking them doesn't need the database
+        etag = (await self.async_client.get("/api/v1/hours/20525"))["ETag"]
+        response = await self.async_client.get("/api/v1/hours/20525/stream")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertIn("no-cache", response["Cache-Control"])
+        content = "".join(
+            [message.decode() async for message in response.streaming_content]
+        )
+        self.assertEqual(content.count("event: update"), 1)
+        self.assertIn(json.dumps({"etag": etag}), content)
+
+    def test_stream_hours_wsgi(self, mock_localdate):
+        etag = self.client.get("/api/v1/hours/20525")["ETag"]
+        response = self.client.get("/api/v1/hours/20525/stream")
+        # without ASGI, the response ends after the current version
+        self.assertFalse(response.streaming)
+        self.assertEqual(
+            response.content.decode(),
+            f"retry: 30000\n\nevent: update\ndata: {json.dumps({'etag': etag})}\n\n",
+        )
+        response = self.client.get("/api/v1/hours/1/stream")
+        self.assertEqual(response.status_code, 404)
+
+    def test_stream_events_wsgi(self, mock_localdate):
+        self.mock_get.return_value = HttpResponse(self.events_html)
+        url = f"/api/v1/events/{self.screen.id}"
+        etag = self.client.get(f"{url}?start=18:00")["ETag"]
+        response = self.client.get(f"{url}/stream?start=18:00")
+        self.assertContains(response, json.dumps({"etag": etag}))
+        response = self.client.get(f"/api/v1/events/{self.screen.id + 100}/stream")
+        self.assertEqual(response.status_code, 404)
+
+    def test_live_stream_urls(self, mock_localdate):
+        response = self.client.get("/live/display_hours/20525/portrait_small")
+        self.assertContains(response, 'data-stream-url="/api/v1/hours/20525/stream"')
+        response = self.client.get(f"/live/display_events/{self.screen.id}?slot=15")
+        self.assertContains(
+            response,
+            f'data-stream-url="/api/v1/events/{self.screen.id}/stream?slot=15"',
+        )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+@mock.patch(
+    "signs.views_utils.timezone.localdate", return_value=datetime.date(2024, 2, 6)
+)
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        Location.objects.create(name="Arts Library Reference Desk", location_id=20525)
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.hours_json = f.read()
+        cache.clear()
+        views_utils.local_pages.clear()
+        self.stub = LibCalStubServer().start()
+        self.addCleanup(self.stub.stop)
+        libcal_client.close_session()
+        self.addCleanup(libcal_client.close_session)
+        self.widget_url = f"{self.stub.url}/widget/hours/grid?"
+
+    def get_value(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_server_timing(self, mock_localdate):
+        self.stub.add_response(
+            "/widget/hours/grid", self.hours_json, content_type="application/json"
+        )
+        with self.settings(LIBCAL_HOURS_WIDGET=self.widget_url):
+            response = self.client.get("/display_hours/20525/portrait_small")
+        stages = [
+            timing.split(";")[0] for timing in response["Server-Timing"].split(", ")
+        ]
+        for stage in [
+            "location",
+            "get_formatted_hours",
+            "get_hours",
+            "libcal",
+            "get_single_location_hours",
+            "format_hours",
+            "render",
+        ]:
+            self.assertIn(stage, stages)
+        self.assertRegex(response["Server-Timing"], r"render;dur=\d+\.\d$")
+
+    def test_stage_histogram(self, mock_localdate):
+        count = self.get_value("signs_stage_seconds_count", stage="parse_events")
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            parse_events(HttpResponse(f.read()))
+        self.assertEqual(
+            self.get_value("signs_stage_seconds_count", stage="parse_events"),
+            count + 1,
+        )
+        # outside of a request, stages are only recorded in the histograms
+        self.assertIsNone(metrics.server_timings.get())
+
+    def test_cache_counters(self, mock_localdate):
+        self.stub.add_response(
+            "/widget/hours/grid", self.hours_json, content_type="application/json"
+        )
+        hits = self.get_value("signs_cache_requests_total", cache="page", result="hit")
+        misses = self.get_value(
+            "signs_cache_requests_total", cache="page", result="miss"
+        )
+        with self.settings(LIBCAL_HOURS_WIDGET=self.widget_url):
+            self.client.get("/display_hours/20525/portrait_small")
+            self.client.get("/display_hours/20525/portrait_small")
+        self.assertEqual(
+            self.get_value("signs_cache_requests_total", cache="page", result="miss"),
+            misses + 1,
+        )
+        self.assertEqual(
+            self.get_value("signs_cache_requests_total", cache="page", result="hit"),
+            hits + 1,
+        )
+
+    @override_settings(LIBCAL_MAX_RETRIES=0)
+    def test_libcal_errors(self, mock_localdate):
+        self.stub.add_response("/widget/hours/grid", "Unavailable", status=503)
+        requests_count = self.get_value("signs_libcal_requests_total", method="GET")
+        errors = self.get_value("signs_libcal_errors_total", error="HTTP 503")
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            fetch_hours(self.widget_url, "20525")
+        self.assertEqual(
+            self.get_value("signs_libcal_requests_total", method="GET"),
+            requests_count + 1,
+        )
+        self.assertEqual(
+            self.get_value("signs_libcal_errors_total", error="HTTP 503"), errors + 1
+        )
+
+        errors = self.get_value("signs_libcal_errors_total", error="ConnectionError")
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            fetch_hours("http://127.0.0.1:1/widget/hours/grid?", "20525")
+        self.assertEqual(
+            self.get_value("signs_libcal_errors_total", error="ConnectionError"),
+            errors + 1,
+        )
+
+    def test_metrics_endpoint(self, mock_localdate):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertContains(response, "signs_stage_seconds_bucket")
+        self.assertContains(response, "# TYPE signs_libcal_errors_total counter")
+
+    @override_settings(
+        SIGNS_METRICS_ALLOWED_IPS=["127.0.0.1", "10.0.0.0/8"],
+        SIGNS_METRICS_TOKEN="secret",
+    )
+    def test_metrics_restricted(self, mock_localdate):
+        response = self.client.get("/metrics", REMOTE_ADDR="10.1.2.3")
+        self.assertEqual(response.status_code, 200)
+        # other addresses need the token
+        response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.5")
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(b"signs_stage_seconds", response.content)
+        response = self.client.get(
+            "/metrics", REMOTE_ADDR="203.0.113.5", HTTP_AUTHORIZATION="Bearer wrong"
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(
+            "/metrics", REMOTE_ADDR="203.0.113.5", HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(response.status_code, 200)
+        # a non-ASCII header is rejected, rather than failing to compare
+        response = self.client.get(
+            "/metrics", REMOTE_ADDR="203.0.113.5", HTTP_AUTHORIZATION="Bearer sécret"
+        )
+        self.assertEqual(response.status_code, 403)
+        # without a token set, only the addresses are allowed
+        with self.settings(SIGNS_METRICS_TOKEN=None):
+            response = self.client.get(
+                "/metrics", REMOTE_ADDR="203.0.113.5", HTTP_AUTHORIZATION="Bearer "
+            )
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    LIBCAL_MAX_RETRIES=2,
+    LIBCAL_RETRY_BACKOFF=0,
+)
+class AsyncDisplayTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
+            self.hours_json = f.read()
+        cache.clear()
+        location_registry.invalidate()
+        self.stub = LibCalStubServer().start()
+        self.addCleanup(self.stub.stop)
+        libcal_client.close_session()
+        self.addCleanup(libcal_client.close_session)
+
+    async def test_aget_retries(self):
+        self.stub.add_response("/widget/hours/grid", "Unavailable", status=503)
+        self.stub.add_response(
+            "/widget/hours/grid", self.hours_json, content_type="application/json"
+        )
+        response = await libcal_client.aget(f"{self.stub.url}/widget/hours/grid")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.stub.requests), 2)
+
+    async def test_aget_retries_exhausted(self):
+        self.stub.add_response("/widget/hours/grid", "Unavailable", status=503)
+        response = await libcal_client.aget(f"{self.stub.url}/widget/hours/grid")
+        # LibCal's last response is returned, after LIBCAL_MAX_RETRIES retries
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.stub.requests), 3)
+        with self.assertRaises(httpx.ConnectError):
+            await libcal_client.aget("http://127.0.0.1:1/widget/hours/grid")
+
+    async def test_single_flight(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return "result"
+
+        async def lookup():
+            return None
+
+        results = await asyncio.gather(
+            *[single_flight.acall("test-key", fetch, lookup) for _ in range(5)]
+        )
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    async def test_concurrent_displays(self):
+        for location_id in [4690, 20525, 2572]:
+            await Location.objects.acreate(
+                name=f"Location {location_id}", location_id=location_id
+            )
+        # each location's hours take 0.5 seconds to come from LibCal
+        self.stub.add_fixture_responses()
+        self.stub.latency = 0.5
+        with self.settings(LIBCAL_HOURS_WIDGET=f"{self.stub.url}/widget/hours/grid?"):
+            started = time.monotonic()
+            responses = await asyncio.gather(
+                *[
+                    self.async_client.get(f"/display_hours/{location_id}/portrait")
+                    for location_id in [4690, 20525, 2572]
+                ]
+            )
+            elapsed = time.monotonic() - started
+        # requests wait for LibCal together, rather than one after another
+        self.assertLess(elapsed, 1.4)
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.has_header("ETag"))
+            # stages are timed in async views too
+            self.assertIn("libcal;dur=", response["Server-Timing"])
+
+
 class GetSingleLocationHoursTestCase(TestCase):
     def test_get_single_location_hours(self):
         with open("signs/fixtures/libcal_hours_response_two_weeks.json") as f:
@@ -240,6 +1871,95 @@ class ParseLocationEventsTestCase(TestCase):
         self.assertEqual(parsed_events, [])
 
 
+def print_cost_per_event(
+    name: str, implementations: dict[str, Callable[[], object]], count: int
+) -> None:
+    """Print the best of 5 runs of each implementation, in microseconds per event.
+    Used by benchmark tests, which only run with SIGNS_BENCHMARKS=1, since
+    timings on shared machines are too noisy to assert on."""
+    costs = []
+    for label, implementation in implementations.items():
+        times = []
+        for _ in range(5):
+            started = time.perf_counter()
+            implementation()
+            times.append(time.perf_counter() - started)
+        costs.append(f"{label} {min(times) / count * 1e6:.2f} µs/event")
+    print(f"\n{name}: {', '.join(costs)}")
+
+
+def parse_events_soup(html: str) -> list[dict]:
+    """Reference parser, using BeautifulSoup as parse_events originally did."""
+    soup = BeautifulSoup(html, "html.parser")
+    events = []
+    for li in soup.find_all("li"):
+        a_content = li.find("a").text if li.find("a") else ""
+        span_content = li.find("span").text if li.find("span") else ""
+        events.append({"title": a_content, "times": span_content})
+    return events
+
+
+class EventParserParityTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            self.html = f.read()
+        # a large calendar, built from the fixture's events
+        items = self.html[self.html.index("<li>") : self.html.rindex("</ul>")]
+        self.large_html = f"<ul>{items * 250}</ul>"
+
+    def assert_parity(self, html: str) -> None:
+        self.assertEqual(extract_events(html), parse_events_soup(html))
+
+    def test_fixture_parity(self):
+        self.assert_parity(self.html)
+        self.assert_parity(self.large_html)
+
+    def test_markup_parity(self):
+        examples = [
+            # nested tags, entities and missing fields
+            "<ul><li><a href='#'>A &amp; <b>B</b></a><span>9:00am - 10:00am</span></li>"
+            "<li><span>No title</span></li><li><a>No times</a></li><li></li></ul>",
+            # only the first <a> and <span> are used
+            "<li><a>First</a><a>Second</a><span>One</span><span>Two</span></li>",
+            # nested list items
+            "<li><ul><li><a>Inner</a><span>x</span></li></ul><span>Outer</span></li>",
+            # unclosed tags
+            "<li><a>Unclosed<li><span>Next</span>",
+            "<li><a>Closed by li</li><span>after</span>",
+            # no list items
+            "<p>Nothing here</p>",
+            # end tags of enclosing elements close the fields and items in them
+            "<ul><li><a>Closed by ul</ul>after<li><span>Next</span></li>",
+            "<p><li><a>Closed by p</p>more</a><span>x</span>",
+            "<div><li><span>Closed by div</div><a>after</a>",
+            # end tags without a start tag are ignored
+            "<li><a>Stray</b> end tag</a></li>",
+            # script and style text isn't part of the title
+            "<li><a>Title<script>var x = '</a>';</script> continued</a></li>",
+            "<li><a><style>a { }</style>Styled</a><span>x</span></li>",
+            # whitespace-only text is collapsed, except in <pre>
+            "<li><a>  <b>A</b>\n\n  <b>B</b></a><span><pre>  </pre></span></li>",
+            # void and self-closing elements
+            "<li><a>Line<br>break</br><img src='x'>image</a><span/>after</li>",
+        ]
+        for html in examples:
+            with self.subTest(html=html):
+                self.assert_parity(html)
+
+    @skipUnless(os.getenv("SIGNS_BENCHMARKS"), "set SIGNS_BENCHMARKS=1 to run")
+    def test_parse_events_benchmark(self):
+        for html in [self.html, self.large_html]:
+            count = len(extract_events(html))
+            print_cost_per_event(
+                f"parse_events, {count} events",
+                {
+                    "BeautifulSoup": lambda: parse_events_soup(html),
+                    "single pass": lambda: extract_events(html),
+                },
+                count,
+            )
+
+
 class FormatEventsTestCase(TestCase):
     def test_format_events(self):
         with open("signs/fixtures/libcal_events_response_3363.html") as f:
@@ -264,6 +1984,105 @@ class FormatEventsTestCase(TestCase):
         self.assertEqual(formatted_events, [])
 
 
+def format_events_strptime(events: list[dict]) -> list[dict]:
+    """The original strptime-based event formatting, as a reference."""
+    strptime_format = "%I:%M%p"
+    parsed_events = []
+    for event in events:
+        times = event["times"].split(",")[0]
+        start, end = (time.strip() for time in times.split(" - "))
+        start_time = datetime.datetime.strptime(start, strptime_format).time()
+        end_time = datetime.datetime.strptime(end, strptime_format).time()
+        if (
+            start_time >= datetime.datetime.strptime("8:00am", strptime_format).time()
+        ) and (
+            end_time <= datetime.datetime.strptime("8:00pm", strptime_format).time()
+        ):
+            rows = []
+            for event_time in [start_time, end_time]:
+                hour = event_time.hour
+                if event_time.minute >= 30:
+                    hour += 0.5
+                rows.append(str(int((hour - 8) * 2 + 2)))
+            parsed_events.append(
+                {
+                    "title": event["title"],
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "start_css_row": rows[0],
+                    "end_css_row": rows[1],
+                }
+            )
+    return parsed_events
+
+
+class FormatEventsLookupTestCase(TestCase):
+    def setUp(self):
+        # a synthetic day with an event starting at every 5 minutes, many times over
+        self.events = []
+        for i in range(10000):
+            start = datetime.datetime(2024, 2, 2, 6) + datetime.timedelta(
+                minutes=5 * (i % 200)
+            )
+            end = start + datetime.timedelta(minutes=90)
+            self.events.append(
+                {
+                    "title": f"Event {i}",
+                    "times": f"{self.libcal_time(start)} - {self.libcal_time(end)}, "
+                    "Friday, February 2, 2024",
+                }
+            )
+
+    @staticmethod
+    def libcal_time(value: datetime.datetime) -> str:
+        # LibCal's format, e.g. "8:00am", with no leading zero on the hour
+        return value.strftime("%I:%M%p").lstrip("0").lower()
+
+    def assert_times_parity(self, events: list[dict]):
+        expected = [
+            (event["title"], event["start_time"], event["end_time"])
+            for event in format_events_strptime(events)
+        ]
+        self.assertEqual(
+            [
+                (event["title"], event["start_time"], event["end_time"])
+                for event in get_timed_events(events)
+                if event["start_time"] >= datetime.time(8)
+                and event["end_time"] <= datetime.time(20)
+            ],
+            expected,
+        )
+
+    def test_get_timed_events_parity(self):
+        self.assert_times_parity(self.events)
+
+    def test_get_timed_events_unusual_times(self):
+        # times outside the lookup table are still parsed
+        self.assert_times_parity(
+            [
+                {"title": "Padded", "times": "09:00am - 10:30am, Friday"},
+                {"title": "Uppercase", "times": "9:00AM - 10:30AM, Friday"},
+            ]
+        )
+
+    def test_get_css_grid_row_parity(self):
+        for minute in range(24 * 60):
+            event_time = datetime.time(minute // 60, minute % 60)
+            hour = event_time.hour + (0.5 if event_time.minute >= 30 else 0)
+            self.assertEqual(get_css_grid_row(event_time), str(int((hour - 8) * 2 + 2)))
+
+    @skipUnless(os.getenv("SIGNS_BENCHMARKS"), "set SIGNS_BENCHMARKS=1 to run")
+    def test_format_events_benchmark(self):
+        print_cost_per_event(
+            f"format_events, {len(self.events)} events",
+            {
+                "strptime": lambda: format_events_strptime(self.events),
+                "lookup table": lambda: format_events(self.events),
+            },
+            len(self.events),
+        )
+
+
 class GetCSSGridRowTestCase(TestCase):
     def test_get_css_grid_row(self):
         nine_am = datetime.time(9, 0)
@@ -280,3 +2099,792 @@ class GetCSSGridRowTestCase(TestCase):
         row = get_css_grid_row(nine_fifteen_am)
         # should round down to 9:00am, row 4
         self.assertEqual(row, "4")
+
+
+class EventWindowTestCase(TestCase):
+    def timed_event(self, title: str, start: str, end: str) -> dict:
+        return {
+            "title": title,
+            "start_time": datetime.time.fromisoformat(start),
+            "end_time": datetime.time.fromisoformat(end),
+        }
+
+    def test_default_window(self):
+        self.assertEqual(get_event_window(), EventWindow(8 * 60, 20 * 60, 30))
+        self.assertEqual(get_event_window({}), get_event_window())
+
+    @override_settings(
+        SIGNS_EVENTS_WINDOW_START="07:00",
+        SIGNS_EVENTS_WINDOW_END="22:00",
+        SIGNS_EVENTS_SLOT_MINUTES=15,
+    )
+    def test_window_from_settings(self):
+        self.assertEqual(get_event_window(), EventWindow(7 * 60, 22 * 60, 15))
+
+    def test_window_from_params(self):
+        window = get_event_window({"start": "07:10", "end": "21:50", "slot": "15"})
+        # widened to whole slots
+        self.assertEqual(window, EventWindow(7 * 60, 22 * 60, 15))
+        window = get_event_window({"end": "24:00"})
+        self.assertEqual(window, EventWindow(8 * 60, 24 * 60, 30))
+
+    def test_invalid_window_params(self):
+        for params in [
+            {"start": "22:00", "end": "08:00"},
+            {"slot": "7"},
+            {"slot": "0"},
+            {"start": "noon"},
+            {"end": "25:00"},
+        ]:
+            with self.subTest(params=params):
+                with self.assertLogs("signs.views_utils", "WARNING"):
+                    self.assertEqual(get_event_window(params), get_event_window())
+
+    def test_evening_events(self):
+        events = [self.timed_event("Evening class", "18:30", "21:00")]
+        # clipped to the default window
+        event = format_timed_events(events)[0]
+        self.assertEqual(event["start_css_row"], "23")
+        self.assertEqual(event["end_css_row"], "26")
+        self.assertEqual(event["end_time"], datetime.time(21))
+        window = get_event_window({"end": "22:00"})
+        event = format_timed_events(events, window)[0]
+        self.assertEqual(event["end_css_row"], "28")
+        # events entirely outside the window aren't displayed
+        self.assertEqual(
+            format_timed_events(events, get_event_window({"end": "18:30"})), []
+        )
+
+    def test_events_ending_at_midnight(self):
+        window = get_event_window({"end": "24:00"})
+        events = [self.timed_event("Late night study", "22:00", "00:00")]
+        event = format_timed_events(events, window)[0]
+        self.assertEqual(event["end_css_row"], "34")
+        # an event which starts and ends at the same time has no duration,
+        # rather than lasting until midnight
+        events = [self.timed_event("Announcement", "10:00", "10:00")]
+        self.assertEqual(format_timed_events(events, window), [])
+
+    def test_slot_minutes(self):
+        events = [self.timed_event("Short session", "09:15", "09:40")]
+        event = format_timed_events(events, get_event_window({"slot": "15"}))[0]
+        # 9:15 is the sixth slot after 8am, and 9:40 ends partway through the
+        # 9:30 slot, so the event fills it
+        self.assertEqual(event["start_css_row"], "7")
+        self.assertEqual(event["end_css_row"], "9")
+        event = format_timed_events(events)[0]
+        self.assertEqual((event["start_css_row"], event["end_css_row"]), ("4", "6"))
+
+    def test_overlapping_events(self):
+        events = [
+            self.timed_event("C", "11:00", "13:00"),
+            self.timed_event("A", "09:00", "11:00"),
+            self.timed_event("B", "10:00", "12:00"),
+            self.timed_event("D", "14:00", "15:00"),
+        ]
+        lanes = {
+            event["title"]: (event["lane"], event["lanes"])
+            for event in format_timed_events(events)
+        }
+        # C starts as A ends, so it takes A's lane; D doesn't overlap anything
+        self.assertEqual(lanes, {"A": (0, 2), "B": (1, 2), "C": (0, 2), "D": (0, 1)})
+
+    def test_many_overlapping_events(self):
+        events = [self.timed_event(str(i), "09:00", "10:00") for i in range(5)]
+        lanes = [
+            (event["lane"], event["lanes"]) for event in format_timed_events(events)
+        ]
+        self.assertEqual(lanes, [(lane, 5) for lane in range(5)])
+
+    def test_time_markers(self):
+        context = get_display_events_context(
+            "Screen", [], get_event_window({"start": "07:30", "end": "10:00"})
+        )
+        self.assertEqual(
+            context["time_markers"],
+            [
+                {"label": "8 AM", "css_row": "3"},
+                {"label": "9 AM", "css_row": "5"},
+                {"label": "10 AM", "css_row": "7"},
+            ],
+        )
+        self.assertEqual(context["grid_rows"], 7)
+        context = get_display_events_context(
+            "Screen", [], get_event_window({"end": "24:00"})
+        )
+        self.assertEqual(context["time_markers"][4]["label"], "12 PM")
+        self.assertEqual(context["time_markers"][-1]["label"], "12 AM")
+
+    def test_display_window(self):
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            html_response = f.read()
+        cache.clear()
+        with mock.patch(
+            "signs.libcal_client.get", return_value=HttpResponse(html_response)
+        ) as mock_get, mock.patch("signs.libcal_client.aget", side_effect=mock_get):
+            response = self.client.get("/display_clicc_events/")
+            evening = self.client.get(
+                "/display_clicc_events/?start=07:00&end=22:00&slot=15"
+            )
+        self.assertContains(response, "repeat(26, 1fr)")
+        self.assertContains(response, ">8 PM<")
+        self.assertNotContains(response, ">10 PM<")
+        self.assertContains(evening, "repeat(62, 1fr)")
+        self.assertContains(evening, ">10 PM<")
+        # the 7am event is in the evening display's window
+        self.assertContains(evening, "grid-row-start:2;")
+        self.assertNotEqual(evening["ETag"], response["ETag"])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class EventScreenTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            self.events_html = f.read()
+        self.screen = EventScreen.objects.create(name="Study Rooms")
+        EventRoom.objects.create(
+            screen=self.screen, name="Room 2", location_id=4357, position=2
+        )
+        EventRoom.objects.create(
+            screen=self.screen, name="Room 1", location_id=3363, position=1
+        )
+        cache.clear()
+        self.mock_get = patch_libcal_get(
+            self, return_value=HttpResponse(self.events_html)
+        )
+
+    def test_get_screen_rooms(self):
+        with self.assertNumQueries(1):
+            screen, rooms = get_screen_rooms(self.screen.id)
+            self.assertEqual(screen.name, "Study Rooms")
+            self.assertEqual([room.name for room in rooms], ["Room 1", "Room 2"])
+
+    def test_get_screen_rooms_empty(self):
+        screen = EventScreen.objects.create(name="No Rooms")
+        self.assertEqual(get_screen_rooms(screen.id), (screen, []))
+        with self.assertRaises(EventScreen.DoesNotExist):
+            get_screen_rooms(screen.id + 1)
+
+    def test_display_events(self):
+        response = self.client.get(f"/display_events/{self.screen.id}")
+        self.assertContains(response, "<h1>Study Rooms</h1>")
+        self.assertContains(response, "repeat(2, minmax(0, 1fr))")
+        content = response.content.decode()
+        self.assertLess(content.index("Room 1"), content.index("Room 2"))
+        self.assertContains(response, "Philosophy 31", count=2)
+        self.assertEqual(self.mock_get.call_count, 2)
+
+    def test_display_events_not_found(self):
+        response = self.client.get(f"/display_events/{self.screen.id + 100}")
+        self.assertEqual(response.status_code, 404)
+
+    def test_rooms_share_calendar(self):
+        EventRoom.objects.create(
+            screen=self.screen, name="Room 1 again", location_id=3363, position=3
+        )
+        response = self.client.get(f"/display_events/{self.screen.id}")
+        self.assertContains(response, "Philosophy 31", count=3)
+        # each calendar is only requested once
+        self.assertEqual(self.mock_get.call_count, 2)
+
+    def test_display_clicc_events(self):
+        screen = EventScreen.objects.get(slug=CLICC_SCREEN_SLUG)
+        response = self.client.get("/display_clicc_events/")
+        self.assertContains(response, "<h1>CLICC Classroom Schedules</h1>")
+        self.assertContains(response, "InqLab 3")
+        self.assertEqual(
+            response.content,
+            self.client.get(f"/display_events/{screen.id}").content,
+        )
+
+    def test_display_clicc_events_renamed(self):
+        screen = EventScreen.objects.get(slug=CLICC_SCREEN_SLUG)
+        screen.name = "CLICC Classrooms"
+        screen.save()
+        # another screen with the old name doesn't matter either
+        EventScreen.objects.create(name="CLICC Classroom Schedules")
+        response = self.client.get("/display_clicc_events/")
+        self.assertContains(response, "<h1>CLICC Classrooms</h1>")
+        self.assertContains(response, "InqLab 3")
+
+
+class LocationEventsCacheTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            self.html_response = f.read()
+        self.widget_url = "https://calendar.example.com/api_events.php?cid="
+        cache.clear()
+
+    @mock.patch("signs.libcal_client.get")
+    def test_get_formatted_location_events_cached(self, mock_get):
+        mock_get.return_value = HttpResponse(self.html_response)
+        first = get_formatted_location_events(self.widget_url, 3363)
+        second = get_formatted_location_events(self.widget_url, 3363)
+        self.assertEqual(mock_get.call_count, 1)
+        # all the location's events are cached, including those outside the default window
+        self.assertEqual(len(first), 4)
+        self.assertEqual(first, second)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_get_formatted_location_events_error_not_cached(self, mock_get):
+        mock_get.return_value = HttpResponse("Server error", status=500)
+        events = get_formatted_location_events(self.widget_url, 3363)
+        self.assertEqual(events, [])
+        get_formatted_location_events(self.widget_url, 3363)
+        self.assertEqual(mock_get.call_count, 2)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class GetAllLocationEventsTestCase(TestCase):
+    def setUp(self):
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            self.html_response = f.read()
+        self.widget_url = "https://calendar.example.com/api_events.php?cid="
+        self.location_ids = [3363, 4357, 4358, 4799]
+        cache.clear()
+
+    def slow_get(self, url):
+        # the slowest location takes longer than any test deadline
+        time.sleep(1 if url.endswith("4799") else 0.1)
+        return HttpResponse(self.html_response)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_requests_are_concurrent(self, mock_get):
+        mock_get.side_effect = lambda url: time.sleep(0.2) or HttpResponse(
+            self.html_response
+        )
+        started = time.monotonic()
+        location_events = get_all_location_events(
+            self.widget_url, self.location_ids, deadline=5
+        )
+        elapsed = time.monotonic() - started
+        # 4 requests of 0.2 seconds each should take about 0.2 seconds, not 0.8
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(list(location_events), self.location_ids)
+        for events in location_events.values():
+            self.assertEqual(len(events), 4)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_deadline(self, mock_get):
+        mock_get.side_effect = self.slow_get
+        started = time.monotonic()
+        with self.assertLogs("signs.views_utils", "WARNING"):
+            location_events = get_all_location_events(
+                self.widget_url, self.location_ids, deadline=0.3
+            )
+        self.assertLess(time.monotonic() - started, 0.9)
+        # the slow location has no events, the others are unaffected
+        self.assertEqual(location_events[4799], [])
+        self.assertEqual(len(location_events[3363]), 4)
+        # don't leave the slow request in flight for the next test
+        for future in list(single_flight.in_flight.values()):
+            future.result()
+
+    @mock.patch("signs.libcal_client.get")
+    def test_error(self, mock_get):
+        def get_or_fail(url):
+            if url.endswith("4357"):
+                raise ConnectionError("LibCal unavailable")
+            return HttpResponse(self.html_response)
+
+        mock_get.side_effect = get_or_fail
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            location_events = get_all_location_events(
+                self.widget_url, self.location_ids, deadline=5
+            )
+        self.assertEqual(location_events[4357], [])
+        self.assertEqual(len(location_events[4358]), 4)
+
+
+@override_settings(
+    LIBCAL_HOURS_WIDGET="https://calendar.example.com/widget/hours/grid?",
+    LIBCAL_EVENTS_WIDGET="https://calendar.example.com/api_events.php?cid=",
+)
+class PrefetchSignageTestCase(TestCase):
+    def setUp(self):
+        Location.objects.create(name="Arts Library", location_id=4690)
+        Location.objects.create(name="Arts Library Reference Desk", location_id=20525)
+        with open("signs/fixtures/libcal_hours_response_multiple_locations.json") as f:
+            self.hours_data = json.load(f)
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            self.events_html = f.read()
+        cache.clear()
+        # Closing the connection would end the test's transaction
+        patcher = mock.patch(
+            "signs.management.commands.prefetch_signage.close_old_connections"
+        )
+        self.mock_close_old_connections = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def mock_get(self, url, params=None):
+        if params:
+            response = mock.Mock()
+            response.json.return_value = self.hours_data
+            return response
+        return HttpResponse(self.events_html)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_prefetch_signage_once(self, mock_get):
+        mock_get.side_effect = self.mock_get
+        call_command("prefetch_signage", "--once", "--jitter", "0")
+        # one hours request for the parent location, which also covers its child,
+        # plus one events request per CLICC classroom
+        hours_calls = [c for c in mock_get.call_args_list if c.kwargs.get("params")]
+        self.assertEqual(len(hours_calls), 1)
+        self.assertEqual(mock_get.call_count, 5)
+
+        # views should now be served entirely from the cache
+        mock_get.reset_mock()
+        response = self.client.get("/display_hours/20525/portrait_small")
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get("/display_clicc_events/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_get.call_count, 0)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_prefetch_signage_continues_after_error(self, mock_get):
+        mock_get.side_effect = ConnectionError("LibCal unavailable")
+        # errors are logged, and don't stop the other locations being refreshed
+        with self.assertLogs("signs.management.commands.prefetch_signage", "ERROR"):
+            call_command("prefetch_signage", "--once", "--jitter", "0")
+        self.assertEqual(mock_get.call_count, 6)
+
+    @mock.patch("signs.libcal_client.get")
+    def test_prefetch_signage_continues_after_database_error(self, mock_get):
+        mock_get.side_effect = self.mock_get
+        with mock.patch(
+            "signs.management.commands.prefetch_signage.Location.objects.values_list",
+            side_effect=DatabaseError("connection lost"),
+        ), self.assertLogs(
+            "signs.management.commands.prefetch_signage", "ERROR"
+        ) as logs:
+            call_command("prefetch_signage", "--once", "--jitter", "0")
+        self.assertIn("Unable to prefetch LibCal data", logs.output[0])
+        # events are still refreshed, after connections were checked
+        self.mock_close_old_connections.assert_called_once()
+        self.assertEqual(mock_get.call_count, 4)
+
+    def test_prefetch_signage_loop(self):
+        class Stop(Exception):
+            pass
+
+        # the first pass fails, the second succeeds, then the loop is stopped
+        with mock.patch(
+            "signs.management.commands.prefetch_signage.Command.prefetch_hours",
+            side_effect=[DatabaseError("connection lost"), None],
+        ), mock.patch(
+            "signs.management.commands.prefetch_signage.Command.prefetch_events"
+        ) as mock_prefetch_events, mock.patch(
+            "signs.management.commands.prefetch_signage.time.sleep",
+            side_effect=[None, Stop],
+        ), self.assertLogs(
+            "signs.management.commands.prefetch_signage", "ERROR"
+        ):
+            with self.assertRaises(Stop):
+                call_command("prefetch_signage", "--interval", "0", "--jitter", "0")
+        self.assertEqual(self.mock_close_old_connections.call_count, 2)
+        self.assertEqual(mock_prefetch_events.call_count, 2)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class BenchmarkSignsTestCase(TestCase):
+    def setUp(self):
+        Location.objects.create(name="Arts Library", location_id=4690)
+        cache.clear()
+
+    def test_benchmark_signs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = f"{directory}/results.json"
+            page_hits = REGISTRY.get_sample_value(
+                "signs_cache_requests_total", {"cache": "page", "result": "hit"}
+            )
+            call_command(
+                "benchmark_signs",
+                "--players=2",
+                "--requests=5",
+                "--latency=0",
+                "--seed=1",
+                f"--output={output}",
+                stdout=StringIO(),
+            )
+            with open(output) as f:
+                results = json.load(f)
+
+            self.assertEqual(results["overall"]["count"], 10)
+            self.assertEqual(results["overall"]["errors"], 0)
+            for key in ["p50_ms", "p95_ms", "p99_ms", "throughput"]:
+                self.assertIn(key, results["overall"])
+            counts = [summary["count"] for summary in results["endpoints"].values()]
+            self.assertEqual(sum(counts), 10)
+            # displays are cached after warming up, so there are no more LibCal requests
+            self.assertGreater(results["upstream"]["warmup_requests"], 0)
+            self.assertEqual(results["upstream"]["requests"], {})
+            # hours displays use the page cache, as real signs' do
+            self.assertGreater(
+                REGISTRY.get_sample_value(
+                    "signs_cache_requests_total", {"cache": "page", "result": "hit"}
+                ),
+                page_hits or 0,
+            )
+            # the stub's hours are kept out of the caches and HoursSnapshot
+            self.assertFalse(HoursSnapshot.objects.exists())
+            page_cache_key = get_page_cache_key(
+                4690, "portrait_small", timezone.localdate()
+            )
+            self.assertIsNone(cache.get(page_cache_key))
+            self.assertIsNone(views_utils.local_pages.get(page_cache_key))
+
+            # a baseline which was much faster fails the comparison
+            for summary in [*results["endpoints"].values(), results["overall"]]:
+                summary["p95_ms"] = 0.001
+            baseline = f"{directory}/baseline.json"
+            with open(baseline, "w") as f:
+                json.dump(results, f)
+            with self.assertRaisesRegex(CommandError, "Slower than baseline"):
+                call_command(
+                    "benchmark_signs",
+                    "--players=1",
+                    "--requests=2",
+                    "--latency=0",
+                    f"--baseline={baseline}",
+                    stdout=StringIO(),
+                )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    LIBCAL_HOURS_WIDGET="https://calendar.example.com/widget/hours/grid?",
+    LIBCAL_EVENTS_WIDGET="https://calendar.example.com/api_events.php?cid=",
+)
+@mock.patch(
+    "signs.views_utils.timezone.localdate", return_value=datetime.date(2024, 2, 6)
+)
+class RenderSignsTestCase(TransactionTestCase):
+    # Pages are rendered in worker threads, which save hours snapshots on their
+    # own database connections, so they must be committed, and removed after
+    # each test. The rollback restores the CLICC screen created by a migration.
+    serialized_rollback = True
+
+    def setUp(self):
+        Location.objects.create(name="Arts Library", location_id=4690)
+        Location.objects.create(name="Arts Library Reference Desk", location_id=20525)
+        with open("signs/fixtures/libcal_hours_response_multiple_locations.json") as f:
+            self.hours_data = json.load(f)
+        with open("signs/fixtures/libcal_events_response_3363.html") as f:
+            self.events_html = f.read()
+        self.output = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.output)
+        cache.clear()
+        patcher = mock.patch("signs.libcal_client.get", side_effect=self.mock_get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def mock_get(self, url, params=None):
+        if params:
+            response = mock.Mock()
+            response.json.return_value = self.hours_data
+            return response
+        return HttpResponse(self.events_html)
+
+    def render_signs(self) -> str:
+        stdout = StringIO()
+        # One worker thread, since SQLite's shared in-memory test database
+        # fails writes from several threads at once with "table is locked"
+        call_command(
+            "render_signs",
+            "--output",
+            str(self.output),
+            "--workers",
+            "1",
+            stdout=stdout,
+        )
+        return stdout.getvalue()
+
+    def test_render_signs(self, mock_localdate):
+        output = self.render_signs()
+        # 2 locations x 4 orientations, plus the CLICC event screen
+        self.assertIn("9 written, 0 unchanged, 0 failed", output)
+        page = self.output / "display_hours/20525/portrait_small/index.html"
+        self.assertIn("Arts Library Reference Desk", page.read_text())
+        screen = EventScreen.objects.get(slug=CLICC_SCREEN_SLUG)
+        self.assertIn(
+            "Philosophy 31",
+            (self.output / f"display_events/{screen.id}/index.html").read_text(),
+        )
+        # no temporary files are left behind
+        self.assertEqual(list(self.output.rglob("*.tmp")), [])
+
+    def test_render_signs_unchanged(self, mock_localdate):
+        self.render_signs()
+        page = self.output / "display_hours/20525/portrait_small/index.html"
+        modified = page.stat().st_mtime_ns
+        output = self.render_signs()
+        self.assertIn("0 written, 9 unchanged", output)
+        self.assertEqual(page.stat().st_mtime_ns, modified)
+
+    def test_render_signs_changed_hours(self, mock_localdate):
+        self.render_signs()
+        self.hours_data["loc_20525"]["weeks"][0]["Tuesday"]["rendered"] = "Closed"
+        cache.clear()
+        output = self.render_signs()
+        # only the child location's pages changed
+        self.assertIn("4 written, 5 unchanged", output)
+
+    def test_render_signs_keeps_pages_on_error(self, mock_localdate):
+        self.render_signs()
+        page = self.output / "display_hours/20525/portrait_small/index.html"
+        content = page.read_text()
+        # no hours from LibCal, the cache, or HoursSnapshot
+        cache.clear()
+        HoursSnapshot.objects.all().delete()
+        self.hours_data = {}
+        with self.assertLogs("signs", "ERROR"):
+            output = self.render_signs()
+        self.assertIn("8 failed", output)
+        self.assertEqual(page.read_text(), content)
+
+    def test_render_signs_uses_snapshot_on_error(self, mock_localdate):
+        self.render_signs()
+        self.assertEqual(HoursSnapshot.objects.count(), 14)
+        page = self.output / "display_hours/20525/portrait_small/index.html"
+        content = page.read_text()
+        # e.g. a new deployment with an empty cache, while LibCal is down:
+        # pages are rendered from this week's stored hours, as signs display them
+        cache.clear()
+        self.hours_data = {}
+        with self.assertLogs("signs", "ERROR"):
+            output = self.render_signs()
+        self.assertIn("0 written, 9 unchanged, 0 failed", output)
+        self.assertEqual(page.read_text(), content)
+
+    def test_render_signs_keeps_events_page_on_error(self, mock_localdate):
+        self.render_signs()
+        screen = EventScreen.objects.get(slug=CLICC_SCREEN_SLUG)
+        page = self.output / f"display_events/{screen.id}/index.html"
+        content = page.read_text()
+        cache.clear()
+        # a room whose events are unavailable would be displayed without events
+        self.events_html = "Unavailable"
+        with mock.patch("signs.views_utils.parse_events", side_effect=ValueError):
+            with self.assertLogs("signs", "ERROR"):
+                output = self.render_signs()
+        self.assertIn("0 written, 8 unchanged, 1 failed", output)
+        self.assertEqual(page.read_text(), content)
+
+    def test_render_signs_continues_after_exception(self, mock_localdate):
+        def get_context(location_name, orientation, hours):
+            if location_name == "Arts Library":
+                raise RuntimeError("Unexpected error")
+            return views_utils.get_display_hours_context(
+                location_name, orientation, hours
+            )
+
+        with mock.patch(
+            "signs.management.commands.render_signs.get_display_hours_context",
+            side_effect=get_context,
+        ), self.assertLogs("signs", "ERROR") as logs:
+            output = self.render_signs()
+        # the other location and the event screen are still rendered
+        self.assertIn("5 written, 0 unchanged, 4 failed", output)
+        self.assertIn("Unable to render hours for 4690", logs.output[0])
+        self.assertFalse((self.output / "display_hours/4690").exists())
+
+
+class LibCalAPITestCase(TestCase):
+    def setUp(self):
+        self.stub = LibCalStubServer().start()
+        self.addCleanup(self.stub.stop)
+        settings_override = override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+            },
+            LIBCAL_API_URL=f"{self.stub.url}/1.1/",
+            LIBCAL_API_CLIENT_ID="1301",
+            LIBCAL_API_CLIENT_SECRET="secret",
+            LIBCAL_MAX_RETRIES=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        libcal_client.close_session()
+        self.addCleanup(libcal_client.close_session)
+        cache.clear()
+
+        self.add_token("token-1")
+        self.events = {
+            "events": [
+                self.make_event(3363, "Philosophy 31", "09:30", "11:30"),
+                self.make_event(3363, "ASL 5", "12:00", "14:00"),
+                # too early to display
+                self.make_event(3363, "Early", "07:00", "08:00"),
+                self.make_event(4357, "ELTS: C101XP", "15:00", "18:00"),
+            ]
+        }
+        self.stub.add_response(
+            "/1.1/events", json.dumps(self.events), content_type="application/json"
+        )
+
+    def add_token(self, token: str, expires_in: int = 3600) -> None:
+        self.stub.add_response(
+            "/1.1/oauth/token",
+            json.dumps({"access_token": token, "expires_in": expires_in}),
+            content_type="application/json",
+        )
+
+    def make_event(self, cal_id: int, title: str, start: str, end: str) -> dict:
+        # LibCal returns times with the UTC offset of the calendar's time zone
+        return {
+            "id": 1,
+            "title": title,
+            "start": f"2024-02-14T{start}:00-08:00",
+            "end": f"2024-02-14T{end}:00-08:00",
+            "calendar": {"id": cal_id, "name": "CLICC"},
+        }
+
+    def requests_to(self, path: str) -> list:
+        return [request for request in self.stub.requests if request.path == path]
+
+    def test_get_events_batched(self):
+        events = libcal_api.get_events([3363, 4357, 4358, 4799])
+        # one request covers all calendars
+        events_requests = self.requests_to("/1.1/events")
+        self.assertEqual(len(events_requests), 1)
+        self.assertIn("cal_id=3363%2C4357%2C4358%2C4799", events_requests[0].query)
+        self.assertEqual(events_requests[0].headers["Authorization"], "Bearer token-1")
+        self.assertEqual(len(events[3363]), 3)
+        self.assertEqual(len(events[4357]), 1)
+        self.assertEqual(events[4358], [])
+        # times are datetimes, in the local time zone
+        self.assertEqual(events[3363][0]["start"].time(), datetime.time(9, 30))
+        self.assertEqual(str(events[3363][0]["start"].tzinfo), "America/Los_Angeles")
+
+    def test_token_cached(self):
+        libcal_api.get_events([3363])
+        libcal_api.get_events([4357])
+        token_requests = self.requests_to("/1.1/oauth/token")
+        self.assertEqual(len(token_requests), 1)
+        self.assertEqual(token_requests[0].method, "POST")
+        self.assertIn(b"grant_type=client_credentials", token_requests[0].body)
+
+    def test_token_expiry(self):
+        self.stub.responses.pop("/1.1/oauth/token")
+        # tokens are only used until shortly before they expire
+        self.add_token("token-1", expires_in=libcal_api.TOKEN_EXPIRY_MARGIN)
+        self.add_token("token-2")
+        libcal_api.get_events([3363])
+        libcal_api.get_events([3363])
+        self.assertEqual(len(self.requests_to("/1.1/oauth/token")), 2)
+
+    def test_token_rejected(self):
+        self.stub.responses.pop("/1.1/events")
+        self.stub.add_response("/1.1/events", "Unauthorized", status=401)
+        self.stub.add_response(
+            "/1.1/events", json.dumps(self.events), content_type="application/json"
+        )
+        self.add_token("token-2")
+        events = libcal_api.get_events([3363])
+        # a new token is requested, and the request retried with it
+        events_requests = self.requests_to("/1.1/events")
+        self.assertEqual(events_requests[1].headers["Authorization"], "Bearer token-2")
+        self.assertEqual(len(events[3363]), 3)
+
+    def test_api_error(self):
+        self.stub.responses.pop("/1.1/events")
+        self.stub.add_response("/1.1/events", "Unavailable", status=503)
+        with self.assertRaises(libcal_api.LibCalAPIError):
+            libcal_api.get_events([3363])
+
+    def test_malformed_events(self):
+        self.stub.responses.pop("/1.1/events")
+        naive = self.make_event(3363, "No offset", "10:00", "11:00")
+        naive["start"] = "2024-02-14T10:00:00"
+        self.events["events"] += [
+            {"id": 2, "title": "No calendar"},
+            self.make_event(3363, "Bad time", "25:00", "26:00"),
+            naive,
+            "not an event",
+        ]
+        self.stub.add_response(
+            "/1.1/events", json.dumps(self.events), content_type="application/json"
+        )
+        with self.assertLogs("signs.libcal_api", "ERROR") as logs:
+            events = libcal_api.get_events([3363, 4357])
+        self.assertEqual(len(logs.output), 4)
+        # the other events are unaffected
+        self.assertEqual(
+            [event["title"] for event in events[3363]],
+            ["Philosophy 31", "ASL 5", "Early"],
+        )
+        self.assertEqual(len(events[4357]), 1)
+
+    def test_unexpected_response(self):
+        self.stub.responses.pop("/1.1/events")
+        self.stub.add_response(
+            "/1.1/events", json.dumps(["events"]), content_type="application/json"
+        )
+        with self.assertRaises(libcal_api.LibCalAPIError):
+            libcal_api.get_events([3363])
+
+    def test_get_api_location_events_cached(self):
+        location_events = get_api_location_events([3363, 4357])
+        self.assertEqual(
+            [event["title"] for event in location_events[3363]],
+            ["Philosophy 31", "ASL 5", "Early"],
+        )
+        self.assertEqual(location_events[3363][0]["start_time"], datetime.time(9, 30))
+        # cached locations aren't requested again; the rest are requested together
+        get_api_location_events([3363, 4357, 4358, 4799])
+        events_requests = self.requests_to("/1.1/events")
+        self.assertEqual(len(events_requests), 2)
+        self.assertIn("cal_id=4358%2C4799", events_requests[1].query)
+
+    def get_clicc_rooms(self) -> list[EventRoom]:
+        return list(EventRoom.objects.filter(screen__slug=CLICC_SCREEN_SLUG))
+
+    def test_get_screen_events_from_api(self):
+        columns = get_screen_events(
+            "https://unused.example.com/", self.get_clicc_rooms(), deadline=5
+        )
+        self.assertEqual(len(self.requests_to("/1.1/events")), 1)
+        self.assertEqual(columns[0]["name"], "Class B")
+        self.assertEqual(columns[0]["events"][0]["title"], "ELTS: C101XP")
+
+    def test_get_screen_events_api_error(self):
+        self.stub.responses.pop("/1.1/events")
+        self.stub.add_response("/1.1/events", "Unavailable", status=503)
+        with self.assertLogs("signs.views_utils", "ERROR"):
+            columns = get_screen_events(
+                "https://unused.example.com/", self.get_clicc_rooms(), 5
+            )
+        self.assertEqual([column["events"] for column in columns], [[]] * 4)
+
+    async def test_api_events_dont_block_async_views(self):
+        rooms = await sync_to_async(self.get_clicc_rooms)()
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_events(location_ids: list[int], deadline: float) -> dict:
+            started.set()
+            release.wait(5)
+            return {location_id: [] for location_id in location_ids}
+
+        with mock.patch(
+            "signs.views_utils.get_all_api_location_events", side_effect=slow_events
+        ):
+            task = asyncio.create_task(
+                aget_screen_events("https://unused.example.com/", rooms, 5)
+            )
+            await asyncio.to_thread(started.wait, 5)
+            try:
+                # the cache's async methods use the thread sensitive executor,
+                # which a slow LibCal API request shouldn't hold
+                await asyncio.wait_for(cache.aget("unrelated"), 2)
+            finally:
+                release.set()
+            columns = await task
+        self.assertEqual([column["events"] for column in columns], [[]] * 4)
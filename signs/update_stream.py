@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from signs.views_utils import set_cache_headers
+
+logger = logging.getLogger(__name__)
+
+# The latest version of each stream's data in this process, and when it was
+# checked, shared by all of the displays connected to the stream
+versions: dict[str, tuple[float, str | None]] = {}
+# Checks in progress, by key, so displays wait for them instead of repeating them
+checks: dict[str, asyncio.Future] = {}
+# Number of open streams for each key. Keys include the query parameters of
+# events streams, so a key's version is forgotten when its last stream closes.
+stream_counts: dict[str, int] = {}
+
+
+def get_stream_response(
+    request: HttpRequest, key: str, get_version: Callable[[], str | None]
+) -> HttpResponse:
+    """Return a Server-Sent Events response with updates to key's data, for
+    an EventSource in the browser. Under WSGI, where each open stream would
+    hold a worker, the response only has the current version, and the browser
+    reconnects after SIGNS_LIVE_POLL_INTERVAL seconds."""
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(
+            stream_updates(key, get_version), content_type="text/event-stream"
+        )
+    else:
+        content = format_retry()
+        version = get_version()
+        if version is not None:
+            content += format_update(version)
+        response = HttpResponse(content, content_type="text/event-stream")
+    # Proxies (e.g. nginx) mustn't buffer updates
+    response["X-Accel-Buffering"] = "no"
+    return set_cache_headers(response, None)
+
+
+async def stream_updates(
+    key: str, get_version: Callable[[], str | None]
+) -> AsyncIterator[str]:
+    """Yield an "update" event with the version of key's data when it's
+    available, and whenever it changes, with comments in between to keep the
+    connection open. The stream ends after SIGNS_STREAM_MAX_AGE seconds, so
+    displays reconnect, and are spread over the current processes."""
+    stream_counts[key] = stream_counts.get(key, 0) + 1
+    try:
+        yield format_retry()
+        started = last_sent = time.monotonic()
+        last_version = None
+        while time.monotonic() - started < settings.SIGNS_STREAM_MAX_AGE:
+            version = await get_shared_version(key, get_version)
+            now = time.monotonic()
+            if version is not None and version != last_version:
+                yield format_update(version)
+                last_version = version
+                last_sent = now
+            elif now - last_sent >= settings.SIGNS_STREAM_KEEPALIVE:
+                yield ": keepalive\n\n"
+                last_sent = now
+            await asyncio.sleep(settings.SIGNS_STREAM_CHECK_INTERVAL)
+    finally:
+        # Also run when the display disconnects, and the stream is closed
+        stream_counts[key] -= 1
+        if not stream_counts[key]:
+            del stream_counts[key]
+            versions.pop(key, None)
+
+
+async def get_shared_version(
+    key: str, get_version: Callable[[], str | None]
+) -> str | None:
+    """Return the current version of key's data. It's checked at most once every
+    SIGNS_STREAM_CHECK_INTERVAL seconds, however many displays are connected."""
+    checked = versions.get(key)
+    if checked is not None:
+        checked_at, version = checked
+        if time.monotonic() - checked_at < settings.SIGNS_STREAM_CHECK_INTERVAL:
+            return version
+
+    check = checks.get(key)
+    if check is None:
+        check = asyncio.ensure_future(check_version(key, get_version))
+        checks[key] = check
+        check.add_done_callback(lambda _: checks.pop(key, None))
+    # A display disconnecting mustn't cancel the check for the others
+    return await asyncio.shield(check)
+
+
+async def check_version(key: str, get_version: Callable[[], str | None]) -> str | None:
+    """Check the version of key's data, and store it for other displays."""
+    try:
+        # Run in the shared thread pool, rather than a thread per connection
+        version = await sync_to_async(call_version, thread_sensitive=False)(get_version)
+    except Exception:
+        logger.exception("Error checking for updates to %s", key)
+        version = None
+    versions[key] = (time.monotonic(), version)
+    return version
+
+
+def call_version(get_version: Callable[[], str | None]) -> str | None:
+    """Return get_version(), closing its database connection afterwards as
+    requests do, since checks run outside of the request cycle."""
+    try:
+        return get_version()
+    finally:
+        close_old_connections()
+
+
+def format_retry() -> str:
+    """Return the field telling the browser how long to wait before reconnecting."""
+    return f"retry: {settings.SIGNS_LIVE_POLL_INTERVAL * 1000}\n\n"
+
+
+def format_update(version: str) -> str:
+    """Return an "update" event with the ETag of the data's JSON API response."""
+    return f"event: update\ndata: {json.dumps({'etag': version})}\n\n"
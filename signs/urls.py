@@ -9,9 +9,37 @@ urlpatterns = [
         views.display_hours,
         name="display_hours",
     ),
+    path(
+        "display_events/<int:screen_id>",
+        views.display_events,
+        name="display_events",
+    ),
     path(
         "display_clicc_events/", views.display_clicc_events, name="display_clicc_events"
     ),
+    path(
+        "live/display_hours/<int:location_id>/<str:orientation>",
+        views.display_hours_live,
+        name="display_hours_live",
+    ),
+    path(
+        "live/display_events/<int:screen_id>",
+        views.display_events_live,
+        name="display_events_live",
+    ),
+    path("api/v1/hours/<int:location_id>", views.api_hours, name="api_hours"),
+    path("api/v1/events/<int:screen_id>", views.api_events, name="api_events"),
+    path(
+        "api/v1/hours/<int:location_id>/stream",
+        views.stream_hours,
+        name="stream_hours",
+    ),
+    path(
+        "api/v1/events/<int:screen_id>/stream",
+        views.stream_events,
+        name="stream_events",
+    ),
+    path("metrics", views.show_metrics, name="show_metrics"),
     path("logs/", views.show_log, name="show_log"),
     path("logs/<int:line_count>", views.show_log, name="show_log"),
     path("release_notes/", views.release_notes, name="release_notes"),
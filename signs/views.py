@@ -1,24 +1,66 @@
 import logging
-from django.shortcuts import render
-from django.http import HttpRequest, HttpResponse
+import os
+from collections.abc import AsyncIterator, Iterator
+from functools import partial
+from django.shortcuts import aget_object_or_404, get_object_or_404, render
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.clickjacking import xframe_options_exempt
 from django.conf import settings
-from signs.models import Location
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from signs.location_registry import aget_location_name, get_location_name
+from signs import metrics
+from signs.log_reader import tail_log
+from signs.models import EventScreen
+from signs.update_stream import get_stream_response
 from signs.views_utils import (
-    format_hours,
-    get_hours,
-    get_single_location_hours,
-    get_start_end_dates,
+    aget_cached_page,
+    aget_formatted_hours_entry,
+    aget_screen_events,
+    aget_screen_rooms,
+    aset_cached_page,
+    get_formatted_hours_entry,
+    get_etag,
+    get_page_cache_key,
+    set_cache_headers,
     construct_display_url,
-    get_location_events,
-    parse_events,
-    format_events,
+    get_display_events_context,
+    get_display_hours_context,
+    get_event_window,
+    get_events_api_data,
+    get_events_api_etag,
+    get_events_version,
+    get_hours_api_data,
+    get_hours_api_etag,
+    get_hours_version,
+    get_screen_events,
+    get_screen_rooms,
+    CLICC_SCREEN_SLUG,
 )
-from signs.forms import LocationForm
+from signs.forms import LocationForm, LogFilterForm, ORIENTATION_CHOICES
 
 logger = logging.getLogger(__name__)
 
+# Stands in for the lines in the rendered log page, which are streamed in its place.
+# It's marked safe, so it's rendered as is, while text from the request (like the
+# filter form's values) is escaped, so can't contain it.
+LOG_DATA_PLACEHOLDER = mark_safe("<!-- log data -->")
+# Number of log lines in each chunk of the streamed log page
+LOG_PAGE_CHUNK_LINES = 100
+
 
 @login_required
 def get_hours_url(request: HttpRequest) -> HttpResponse:
@@ -43,84 +85,281 @@ def get_hours_url(request: HttpRequest) -> HttpResponse:
     )
 
 
+# The display views are async, so under ASGI, signs waiting on LibCal don't
+# each hold a worker thread.
 # This view is public, and needs to be allowed in a Rise Vision iframe.
 @xframe_options_exempt
-def display_hours(
+async def display_hours(
     request: HttpRequest, location_id: int, orientation: str
 ) -> HttpResponse:
     """Display hours for a location. This view is used by the digital signage system."""
 
     hours_widget_url = settings.LIBCAL_HOURS_WIDGET
 
-    location_name = Location.objects.get(location_id=location_id).name
-    stylesheet = f"css/{orientation}.css"
+    with metrics.timed("location"):
+        location_name = await aget_location_name(location_id)
+    if location_name is None:
+        raise Http404(f"No location {location_id}")
 
-    hours = get_hours(hours_widget_url, location_id)
-    single_location_hours = get_single_location_hours(hours, location_id)
-    formatted_hours = format_hours(single_location_hours)
-    if not formatted_hours:
-        # formatted_hours will be an empty list if there was an error
-        context = {
-            "location_name": location_name,
-            "stylesheet": stylesheet,
-            "error": "There was an error retrieving hours for this location.",
-        }
-        return render(request, "signs/display.html", context)
+    with metrics.timed("get_formatted_hours"):
+        hours_entry = await aget_formatted_hours_entry(hours_widget_url, location_id)
+    if hours_entry is None:
+        # There are no usable hours if there was an error
+        context = get_display_hours_context(location_name, orientation, [])
+        with metrics.timed("render"):
+            response = render(request, "signs/display.html", context)
+        return set_cache_headers(response, None)
 
-    start, end = get_start_end_dates(formatted_hours)
+    # Rendered pages are cached until the hours or location name change.
+    # Only cache known orientations, so arbitrary URLs can't fill the cache.
+    cacheable = orientation in dict(ORIENTATION_CHOICES)
+    today = timezone.localdate()
+    page_cache_key = get_page_cache_key(location_id, orientation, today)
+    page_version = f"{hours_entry['digest']}:{location_name}"
 
-    context = {
-        "start": start,
-        "end": end,
-        "hours": formatted_hours,
-        "stylesheet": stylesheet,
-        "location_name": location_name,
-    }
-    return render(request, "signs/display.html", context)
+    # Players which already have this page get a 304 Not Modified
+    etag = get_etag(page_version, orientation, today)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return set_cache_headers(response, etag)
+
+    if cacheable:
+        content = await aget_cached_page(page_cache_key, page_version)
+        if content is not None:
+            return set_cache_headers(HttpResponse(content), etag)
+
+    context = get_display_hours_context(
+        location_name, orientation, hours_entry["hours"]
+    )
+    with metrics.timed("render"):
+        response = render(request, "signs/display.html", context)
+    if cacheable:
+        await aset_cached_page(page_cache_key, page_version, response.content)
+    return set_cache_headers(response, etag)
 
 
 # This view is public, and needs to be allowed in a Rise Vision iframe.
 @xframe_options_exempt
-def display_clicc_events(request: HttpRequest) -> HttpResponse:
-    """Display events for CLICC classroom locations.
+async def display_events(request: HttpRequest, screen_id: int) -> HttpResponse:
+    """Display events for the rooms on an event screen.
     This view is used by the digital signage system."""
+    try:
+        with metrics.timed("screen"):
+            screen, rooms = await aget_screen_rooms(screen_id)
+    except EventScreen.DoesNotExist:
+        raise Http404(f"No event screen {screen_id}")
 
     events_widget_url = settings.LIBCAL_EVENTS_WIDGET
-    # location IDs for CLICC classrooms, with corresponding names used as CSS classes
-    locations = [
-        {"location_id": 3363, "css_class": "classA"},
-        {"location_id": 4357, "css_class": "classB"},
-        {"location_id": 4358, "css_class": "classC"},
-        {"location_id": 4799, "css_class": "inq3"},
-    ]
-    location_events = {}
+    window = get_event_window(request.GET)
+    with metrics.timed("get_screen_events"):
+        columns = await aget_screen_events(
+            events_widget_url, rooms, settings.LIBCAL_EVENTS_DEADLINE, window
+        )
+
+    etag = get_etag(screen.name, columns, window)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return set_cache_headers(response, etag)
+
+    context = get_display_events_context(screen.name, columns, window)
+    with metrics.timed("render"):
+        response = render(request, "signs/display_events.html", context)
+    return set_cache_headers(response, etag)
+
+
+# This view is public, and needs to be allowed in a Rise Vision iframe.
+@xframe_options_exempt
+async def display_clicc_events(request: HttpRequest) -> HttpResponse:
+    """Display events for CLICC classroom locations.
+    Kept for existing signs; this is the same as display_events for the CLICC screen."""
+    screen = await aget_object_or_404(EventScreen, slug=CLICC_SCREEN_SLUG)
+    return await display_events(request, screen.id)
+
+
+# Display shells render the page once, then fetch data from the JSON API when
+# their update stream says it has changed.
+# These views are public, and need to be allowed in a Rise Vision iframe.
+@xframe_options_exempt
+def display_hours_live(
+    request: HttpRequest, location_id: int, orientation: str
+) -> HttpResponse:
+    """Display hours for a location, updated from the JSON API in the browser."""
+    location_name = get_location_name(location_id)
+    if location_name is None:
+        raise Http404(f"No location {location_id}")
+
+    context = {
+        "location_name": location_name,
+        "stylesheet": f"css/{orientation}.css",
+        "api_url": reverse("api_hours", args=[location_id]),
+        "stream_url": reverse("stream_hours", args=[location_id]),
+        "poll_interval": settings.SIGNS_LIVE_POLL_INTERVAL,
+    }
+    etag = get_etag(context)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(request, "signs/display_live.html", context)
+    return set_cache_headers(response, etag)
+
+
+@xframe_options_exempt
+def display_events_live(request: HttpRequest, screen_id: int) -> HttpResponse:
+    """Display events for an event screen, updated from the JSON API in the browser."""
+    screen = get_object_or_404(EventScreen, id=screen_id)
+    # The event window's parameters are passed on to the API
+    api_url = reverse("api_events", args=[screen_id])
+    stream_url = reverse("stream_events", args=[screen_id])
+    if request.GET:
+        api_url += f"?{request.GET.urlencode()}"
+        stream_url += f"?{request.GET.urlencode()}"
+
+    context = {
+        "screen_name": screen.name,
+        "api_url": api_url,
+        "stream_url": stream_url,
+        "poll_interval": settings.SIGNS_LIVE_POLL_INTERVAL,
+    }
+    etag = get_etag(context)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(request, "signs/display_events_live.html", context)
+    return set_cache_headers(response, etag)
+
+
+def api_hours(request: HttpRequest, location_id: int) -> HttpResponse:
+    """Return a location's formatted hours as JSON (API version 1)."""
+    location_name = get_location_name(location_id)
+    if location_name is None:
+        response = JsonResponse({"error": f"No location {location_id}"}, status=404)
+        return set_cache_headers(response, None)
+
+    hours_entry = get_formatted_hours_entry(settings.LIBCAL_HOURS_WIDGET, location_id)
+    if hours_entry is None:
+        error = "There was an error retrieving hours for this location."
+        response = JsonResponse({"error": error}, status=503)
+        return set_cache_headers(response, None)
+
+    # Unchanged hours get a 304 without formatting or serializing anything
+    today = timezone.localdate()
+    etag = get_hours_api_etag(hours_entry["digest"], location_name, today)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return set_cache_headers(response, etag)
+
+    data = get_hours_api_data(location_id, location_name, hours_entry["hours"], today)
+    return set_cache_headers(JsonResponse(data), etag)
+
+
+def api_events(request: HttpRequest, screen_id: int) -> HttpResponse:
+    """Return an event screen's formatted events as JSON (API version 1).
+    Takes the same event window parameters as display_events."""
+    try:
+        screen, rooms = get_screen_rooms(screen_id)
+    except EventScreen.DoesNotExist:
+        response = JsonResponse({"error": f"No event screen {screen_id}"}, status=404)
+        return set_cache_headers(response, None)
+
+    window = get_event_window(request.GET)
+    columns = get_screen_events(
+        settings.LIBCAL_EVENTS_WIDGET, rooms, settings.LIBCAL_EVENTS_DEADLINE, window
+    )
+
+    etag = get_events_api_etag(screen.name, columns, window)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return set_cache_headers(response, etag)
+
+    data = get_events_api_data(screen, columns, window)
+    return set_cache_headers(JsonResponse(data), etag)
+
+
+# Update streams are long-lived under ASGI, but each process only checks for
+# changes once per interval, so idle displays cost little.
+def stream_hours(request: HttpRequest, location_id: int) -> HttpResponse:
+    """Stream updates to a location's hours, as Server-Sent Events."""
+    location_name = get_location_name(location_id)
+    if location_name is None:
+        response = JsonResponse({"error": f"No location {location_id}"}, status=404)
+        return set_cache_headers(response, None)
 
-    for location in locations:
-        location_id = location["location_id"]
-        events = get_location_events(events_widget_url, location_id)
-        parsed_events = parse_events(events)
-        formatted_events = format_events(parsed_events)
-        location_events[location_id] = formatted_events
-        for event in formatted_events:
-            event["css_class"] = location["css_class"]
-    context = {"location_events": location_events}
-    return render(request, "signs/display_events.html", context)
+    get_version = partial(get_hours_version, location_id, location_name)
+    return get_stream_response(request, f"hours:{location_id}", get_version)
+
+
+def stream_events(request: HttpRequest, screen_id: int) -> HttpResponse:
+    """Stream updates to an event screen's events, as Server-Sent Events.
+    Takes the same event window parameters as display_events."""
+    try:
+        screen, rooms = get_screen_rooms(screen_id)
+    except EventScreen.DoesNotExist:
+        response = JsonResponse({"error": f"No event screen {screen_id}"}, status=404)
+        return set_cache_headers(response, None)
+
+    # Rooms are looked up once per connection, so changes to them reach
+    # displays when they reconnect
+    window = get_event_window(request.GET)
+    get_version = partial(get_events_version, screen.name, rooms, window)
+    key = f"events:{screen_id}:{window.start}:{window.end}:{window.slot_minutes}"
+    return get_stream_response(request, key, get_version)
+
+
+def show_metrics(request: HttpRequest) -> HttpResponse:
+    """Return metrics for Prometheus, from all of this server's processes.
+    Only allowed addresses, or requests with the metrics token, can read them."""
+    if not metrics.is_scrape_allowed(request):
+        raise PermissionDenied
+    return HttpResponse(
+        metrics.generate_metrics(), content_type=metrics.CONTENT_TYPE_LATEST
+    )
 
 
 @login_required
 def show_log(request: HttpRequest, line_count: int = 200) -> HttpResponse:
-    """Display log."""
-    log_file = "logs/application.log"
-    try:
-        with open(log_file, "r") as f:
-            # Get just the last line_count lines in the log.
-            lines = f.readlines()[-line_count:]
-            # Template prints these as a single block, so join lines into one chunk.
-            log_data = "".join(lines)
-    except FileNotFoundError:
-        log_data = f"Log file {log_file} not found"
-
-    return render(request, "signs/log.html", {"log_data": log_data})
+    """Display the last line_count lines of the log, optionally filtered by
+    minimum level and text."""
+    filter_form = LogFilterForm(request.GET)
+    level = contains = None
+    if filter_form.is_valid():
+        level = filter_form.cleaned_data["level"]
+        contains = filter_form.cleaned_data["contains"]
+
+    log_file = settings.LOG_FILE
+    # Older lines are in the rotated files, application.log.1 being the newest
+    paths = [log_file] + [
+        f"{log_file}.{number}" for number in range(1, settings.LOG_BACKUP_COUNT + 1)
+    ]
+    if not os.path.exists(log_file):
+        lines = [f"Log file {log_file} not found"]
+    else:
+        lines = tail_log(paths, line_count, level, contains)
+
+    # The page is rendered around a placeholder, and the lines are streamed in
+    # its place, rather than joined into one string. Only the template itself
+    # can produce the unescaped placeholder, so the page is split at its first one.
+    context = {"log_data": LOG_DATA_PLACEHOLDER, "filter_form": filter_form}
+    page = render_to_string("signs/log.html", context, request)
+    header, footer = page.split(LOG_DATA_PLACEHOLDER, 1)
+    chunks = iter_log_page(header, lines, footer)
+    if isinstance(request, ASGIRequest):
+        # Served without consuming the chunks in a thread first
+        chunks = aiter_chunks(chunks)
+    return StreamingHttpResponse(chunks)
+
+
+def iter_log_page(header: str, lines: list[str], footer: str) -> Iterator[str]:
+    """Yield the log page's header, its lines, escaped, LOG_PAGE_CHUNK_LINES
+    at a time, and its footer."""
+    yield header
+    for start in range(0, len(lines), LOG_PAGE_CHUNK_LINES):
+        separator = "\n" if start else ""
+        yield separator + escape("\n".join(lines[start : start + LOG_PAGE_CHUNK_LINES]))
+    yield footer
+
+
+async def aiter_chunks(chunks: Iterator[str]) -> AsyncIterator[str]:
+    """Yield chunks, as an async iterator for ASGI."""
+    for chunk in chunks:
+        yield chunk
 
 
 @login_required
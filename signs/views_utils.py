@@ -1,24 +1,720 @@
+import asyncio
+import httpx
 import requests
+import hashlib
+import heapq
+import json
 import logging
-from datetime import datetime
-from bs4 import BeautifulSoup
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from collections.abc import Mapping, Sequence
+from datetime import date, datetime, time, timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError, connections
+from django.db.models import QuerySet
 from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.formats import localize
+from django.utils.http import quote_etag
+from typing import NamedTuple
+from signs import libcal_api, libcal_client, metrics, single_flight
+from signs.event_parser import extract_events
+from signs.log_handlers import Abbreviated
+from signs.models import EventRoom, EventScreen, HoursSnapshot
 
 logger = logging.getLogger(__name__)
 
+# The slug of the event screen displayed by display_clicc_events, which is
+# created by a migration. Its name can be changed in the admin.
+CLICC_SCREEN_SLUG = "clicc"
+# Number of weeks of hours requested from LibCal for displays: this week and next
+DISPLAY_HOURS_WEEKS = 2
 
-def get_hours(widget_url: str, location_id: str) -> dict:
-    """Retrieve hours for a location from the LibCal widget.
-    Results for parent locations will include hours for all child locations."""
-    # We request 2 weeks of hours from the widget to cover Monday-Sunday
-    # instead of Sunday-Saturday
-    response = requests.get(
-        widget_url, params={"lid": location_id, "weeks": 2, "format": "json"}
+
+class EventWindow(NamedTuple):
+    """The part of the day shown on an events display, divided into grid rows
+    of slot_minutes each. start and end are minutes after midnight."""
+
+    start: int
+    end: int
+    slot_minutes: int
+
+
+# Shared by all requests in this process, to bound the number of concurrent
+# LibCal requests. Threads are only started once work is submitted.
+events_executor = ThreadPoolExecutor(
+    max_workers=settings.LIBCAL_EVENTS_MAX_WORKERS, thread_name_prefix="libcal-events"
+)
+# Background refreshes of stale hours, by cache key, so each is only run once at a time
+refresh_executor = ThreadPoolExecutor(
+    max_workers=settings.LIBCAL_REFRESH_MAX_WORKERS, thread_name_prefix="libcal-refresh"
+)
+pending_refreshes: dict[str, Future] = {}
+pending_refreshes_lock = threading.Lock()
+# Async events requests which outlived their display's deadline, kept until
+# they finish so they can cache their events
+pending_event_tasks: set[asyncio.Task] = set()
+# Rendered pages in this process's memory, in front of the shared cache,
+# so a cached page doesn't need another database query. Unused if
+# SIGNS_LOCAL_PAGE_CACHE_ENTRIES is 0.
+local_pages = LocMemCache(
+    "signs-pages",
+    {"OPTIONS": {"MAX_ENTRIES": settings.SIGNS_LOCAL_PAGE_CACHE_ENTRIES}},
+)
+
+
+def get_hours(
+    widget_url: str, location_id: str, weeks: int = DISPLAY_HOURS_WEEKS
+) -> dict:
+    """Retrieve hours for a location from the LibCal widget, using the shared cache
+    when possible. Results for parent locations will include hours for all
+    child locations."""
+    return get_hours_entry(widget_url, location_id, weeks)["data"]
+
+
+def get_hours_entry(
+    widget_url: str,
+    location_id: str,
+    weeks: int = DISPLAY_HOURS_WEEKS,
+    use_parent: bool = True,
+) -> dict:
+    """Return the cache entry for a location's LibCal hours, fetching and caching
+    the hours if there is no current entry.
+    Entries are dicts with "data" (the LibCal response) and "fetched_at".
+
+    If the location is known to be a child location, its parent's hours are
+    requested instead, which fills the cache for all of the parent's children."""
+    cache_key = get_hours_cache_key(widget_url, location_id, weeks)
+    entry = cache.get(cache_key)
+    metrics.record_cache("hours", entry is not None)
+    if entry is not None:
+        return entry
+
+    parent_id = cache.get(get_hours_parent_key(widget_url, location_id, weeks))
+    if use_parent and parent_id is not None:
+        # Only follow one level of the index, in case it has become circular
+        get_hours_entry(widget_url, parent_id, weeks, use_parent=False)
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return entry
+        # The parent response no longer includes this location, so stop using it
+        logger.info("Location %s not found in hours for %s", location_id, parent_id)
+        cache.delete(get_hours_parent_key(widget_url, location_id, weeks))
+
+    # When many signs ask for the same hours at once, only one request goes to LibCal
+    return single_flight.call(
+        cache_key,
+        lambda: refresh_hours_entry(widget_url, location_id, weeks),
+        lambda: cache.get(cache_key),
+    )
+
+
+async def aget_hours_entry(
+    widget_url: str,
+    location_id: str,
+    weeks: int = DISPLAY_HOURS_WEEKS,
+    use_parent: bool = True,
+) -> dict:
+    """Async version of get_hours_entry, for async views."""
+    cache_key = get_hours_cache_key(widget_url, location_id, weeks)
+    entry = await cache.aget(cache_key)
+    metrics.record_cache("hours", entry is not None)
+    if entry is not None:
+        return entry
+
+    parent_key = get_hours_parent_key(widget_url, location_id, weeks)
+    parent_id = await cache.aget(parent_key)
+    if use_parent and parent_id is not None:
+        await aget_hours_entry(widget_url, parent_id, weeks, use_parent=False)
+        entry = await cache.aget(cache_key)
+        if entry is not None:
+            return entry
+        logger.info("Location %s not found in hours for %s", location_id, parent_id)
+        await cache.adelete(parent_key)
+
+    return await single_flight.acall(
+        cache_key,
+        lambda: arefresh_hours_entry(widget_url, location_id, weeks),
+        lambda: cache.aget(cache_key),
     )
-    data = response.json()
+
+
+def refresh_hours_entry(
+    widget_url: str, location_id: str, weeks: int = DISPLAY_HOURS_WEEKS
+) -> dict:
+    """Fetch a location's hours from LibCal and store them in the cache,
+    along with the hours of any child locations in the response."""
+    entry = {
+        "data": fetch_hours(widget_url, location_id, weeks),
+        "fetched_at": timezone.now(),
+    }
+    # Don't cache empty responses, so the next request tries LibCal again
+    if entry["data"]:
+        cache_key = get_hours_cache_key(widget_url, location_id, weeks)
+        cache.set(cache_key, entry, settings.LIBCAL_HOURS_CACHE_TTL)
+        cache_child_location_hours(widget_url, location_id, weeks, entry)
+    return entry
+
+
+async def arefresh_hours_entry(
+    widget_url: str, location_id: str, weeks: int = DISPLAY_HOURS_WEEKS
+) -> dict:
+    """Async version of refresh_hours_entry."""
+    entry = {
+        "data": await afetch_hours(widget_url, location_id, weeks),
+        "fetched_at": timezone.now(),
+    }
+    if entry["data"]:
+        cache_key = get_hours_cache_key(widget_url, location_id, weeks)
+        await cache.aset(cache_key, entry, settings.LIBCAL_HOURS_CACHE_TTL)
+        child_entries, parent_index = get_child_location_entries(
+            widget_url, location_id, weeks, entry
+        )
+        await cache.aset_many(child_entries, settings.LIBCAL_HOURS_CACHE_TTL)
+        await cache.aset_many(parent_index, None)
+    return entry
+
+
+def cache_child_location_hours(
+    widget_url: str, location_id: str, weeks: int, entry: dict
+) -> None:
+    """Given the cache entry for a location's hours, cache hours for every other
+    location in the response and index each one under its parent location."""
+    child_entries, parent_index = get_child_location_entries(
+        widget_url, location_id, weeks, entry
+    )
+    cache.set_many(child_entries, settings.LIBCAL_HOURS_CACHE_TTL)
+    # The parent index rarely changes, so keep it longer than the hours themselves
+    cache.set_many(parent_index, None)
+
+
+def get_child_location_entries(
+    widget_url: str, location_id: str, weeks: int, entry: dict
+) -> tuple[dict, dict]:
+    """Given the cache entry for a location's hours, return cache entries for
+    every other location in the response, and the parent location index,
+    each by cache key."""
+    child_entries = {}
+    parent_index = {}
+    for location_key, location_data in entry["data"].items():
+        child_id = str(location_data.get("lid", location_key.removeprefix("loc_")))
+        parent_id = location_data.get("parent_lid")
+        if parent_id is not None:
+            # Next time this location's hours are needed, request its parent
+            # so all of the parent's children are refreshed at once
+            parent_index[get_hours_parent_key(widget_url, child_id, weeks)] = parent_id
+        if child_id != str(location_id):
+            child_entries[get_hours_cache_key(widget_url, child_id, weeks)] = {
+                "data": {location_key: location_data},
+                "fetched_at": entry["fetched_at"],
+            }
+    return child_entries, parent_index
+
+
+def get_hours_cache_key(widget_url: str, location_id: str, weeks: int) -> str:
+    """Return the cache key for a LibCal hours response."""
+    # Widget URLs contain characters which aren't safe in all cache backends,
+    # so use a hash of the parts instead of the parts themselves.
+    key_parts = f"{widget_url}|{location_id}|{weeks}"
+    return f"libcal-hours:{hashlib.sha256(key_parts.encode()).hexdigest()}"
+
+
+def get_hours_parent_key(widget_url: str, location_id: str, weeks: int) -> str:
+    """Return the cache key for the parent location index of a location."""
+    key_parts = f"{widget_url}|{location_id}|{weeks}"
+    return f"libcal-hours-parent:{hashlib.sha256(key_parts.encode()).hexdigest()}"
+
+
+def fetch_hours(
+    widget_url: str, location_id: str, weeks: int = DISPLAY_HOURS_WEEKS
+) -> dict:
+    """Request hours for a location from the LibCal widget, bypassing the cache.
+    Returns an empty dict if there's an error."""
+    # We request 2 weeks of hours from the widget by default to cover Monday-Sunday
+    # instead of Sunday-Saturday
+    try:
+        response = libcal_client.get(
+            widget_url, params={"lid": location_id, "weeks": weeks, "format": "json"}
+        )
+        response.raise_for_status()
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        logger.error("Unable to get LibCal hours for location %s: %s", location_id, e)
+        return {}
     return data
 
 
+async def afetch_hours(
+    widget_url: str, location_id: str, weeks: int = DISPLAY_HOURS_WEEKS
+) -> dict:
+    """Async version of fetch_hours, using the async LibCal client."""
+    try:
+        response = await libcal_client.aget(
+            widget_url, params={"lid": location_id, "weeks": weeks, "format": "json"}
+        )
+        response.raise_for_status()
+        data = response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error("Unable to get LibCal hours for location %s: %s", location_id, e)
+        return {}
+    return data
+
+
+class HoursRange(Sequence):
+    """A location's day records (as from get_day_record) for consecutive dates,
+    formatted from LibCal's day data when they're accessed. Slices are
+    HoursRanges sharing the same data, so slicing doesn't copy or format days."""
+
+    def __init__(self, days: dict[str, tuple[str, dict]], ordinals: range):
+        # LibCal day data and its weekday, by date (e.g. "2024-02-05")
+        self.days = days
+        # The dates in the range, as date.toordinal() values
+        self.ordinals = ordinals
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def __getitem__(self, index: int | slice) -> "dict | HoursRange":
+        if isinstance(index, slice):
+            return HoursRange(self.days, self.ordinals[index])
+        day = date.fromordinal(self.ordinals[index]).isoformat()
+        weekday, day_data = self.days[day]
+        return get_day_record(weekday, day_data)
+
+    def __repr__(self) -> str:
+        return f"<HoursRange {list(self)}>"
+
+
+def get_hours_range(
+    widget_url: str, location_id: str, start: date, end: date
+) -> HoursRange | None:
+    """Return a location's day records from start to end (inclusive), or None if
+    LibCal's hours don't include every day.
+
+    Days are merged from any cached LibCal responses for the location. If they
+    don't cover the range, the fewest weeks which do are requested. LibCal's
+    hours start on the Sunday of the current week, so start can't be earlier,
+    and end can be at most LIBCAL_HOURS_MAX_WEEKS weeks ahead.
+    Raises ValueError for ranges outside these limits."""
+    first_sunday = get_week_start(timezone.localdate())
+    weeks = (end - first_sunday).days // 7 + 1
+    if start > end:
+        raise ValueError(f"start {start} is after end {end}")
+    if start < first_sunday:
+        raise ValueError(f"LibCal hours start on {first_sunday}, not {start}")
+    if weeks > settings.LIBCAL_HOURS_MAX_WEEKS:
+        raise ValueError(
+            f"{end} is more than {settings.LIBCAL_HOURS_MAX_WEEKS} weeks ahead"
+        )
+
+    hours_range = HoursRange(
+        get_cached_hours_days(widget_url, location_id),
+        range(start.toordinal(), end.toordinal() + 1),
+    )
+    if not is_complete_range(hours_range):
+        entry = get_hours_entry(widget_url, location_id, weeks)
+        hours_range.days.update(get_hours_days(entry["data"], location_id))
+        if not is_complete_range(hours_range):
+            logger.error(
+                "No LibCal hours for location %s from %s to %s", location_id, start, end
+            )
+            return None
+    return hours_range
+
+
+def is_complete_range(hours_range: HoursRange) -> bool:
+    """Return whether there is LibCal day data for every date in a range."""
+    return all(
+        date.fromordinal(ordinal).isoformat() in hours_range.days
+        for ordinal in hours_range.ordinals
+    )
+
+
+def get_cached_hours_days(
+    widget_url: str, location_id: str
+) -> dict[str, tuple[str, dict]]:
+    """Return a location's LibCal day data, with its weekday, by date, merged
+    from every cached LibCal response for the location. Where responses overlap,
+    the most recently fetched day is used."""
+    cache_keys = [
+        get_hours_cache_key(widget_url, location_id, weeks)
+        for weeks in range(1, settings.LIBCAL_HOURS_MAX_WEEKS + 1)
+    ]
+    entries = sorted(
+        cache.get_many(cache_keys).values(), key=lambda entry: entry["fetched_at"]
+    )
+    days = {}
+    for entry in entries:
+        days.update(get_hours_days(entry["data"], location_id))
+    return days
+
+
+def get_hours_days(data: dict, location_id: str) -> dict[str, tuple[str, dict]]:
+    """Given a LibCal hours response, return a location's day data, with its
+    weekday, by date."""
+    location_data = data.get(f"loc_{location_id}", {})
+    return {
+        day["date"]: (weekday, day)
+        for week in location_data.get("weeks", [])
+        for weekday, day in week.items()
+    }
+
+
+def get_week_start(day: date) -> date:
+    """Return the Sunday starting the LibCal week which includes day."""
+    return day - timedelta(days=(day.weekday() + 1) % 7)
+
+
+def get_formatted_hours(widget_url: str, location_id: str) -> list[dict]:
+    """Return formatted hours for a single location, or an empty list if no
+    usable hours are available. See get_formatted_hours_entry."""
+    entry = get_formatted_hours_entry(widget_url, location_id)
+    return entry["hours"] if entry is not None else []
+
+
+def get_formatted_hours_entry(widget_url: str, location_id: str) -> dict | None:
+    """Return the cache entry for a location's formatted hours.
+    Entries are dicts with "hours" (formatted hours), "fetched_at" and "digest"
+    (a hash of the hours, which changes only when the hours do).
+
+    Hours older than LIBCAL_HOURS_CACHE_TTL are returned immediately, while they
+    are refreshed in the background. The last successfully formatted hours are
+    kept indefinitely, and are returned if LibCal fails, as long as they still
+    include today. If there are no current cached hours, this week's hours from
+    HoursSnapshot are returned while they're refreshed.
+    Returns None if no usable hours are available."""
+    entry = cache.get(get_formatted_hours_cache_key(widget_url, location_id))
+    current = entry is not None and is_current_hours(entry["hours"])
+    metrics.record_cache("formatted_hours", current)
+    if current:
+        if timezone.now() - entry["fetched_at"] > timedelta(
+            seconds=settings.LIBCAL_HOURS_CACHE_TTL
+        ):
+            schedule_hours_refresh(widget_url, location_id)
+        return entry
+
+    # Without current cached hours (e.g. after the cache is cleared), display
+    # this week's stored hours while they're refreshed in the background
+    snapshot_entry = (
+        get_snapshot_hours_entry(location_id)
+        if settings.SIGNS_HOURS_SNAPSHOTS
+        else None
+    )
+    if snapshot_entry is not None:
+        schedule_hours_refresh(widget_url, location_id)
+        return snapshot_entry
+
+    # Cached hours which don't include today aren't used even if LibCal fails,
+    # since every day in them has passed
+    return refresh_formatted_hours(widget_url, location_id)
+
+
+async def aget_formatted_hours_entry(widget_url: str, location_id: str) -> dict | None:
+    """Async version of get_formatted_hours_entry, for async views.
+    Background refreshes still run in worker threads."""
+    entry = await cache.aget(get_formatted_hours_cache_key(widget_url, location_id))
+    current = entry is not None and is_current_hours(entry["hours"])
+    metrics.record_cache("formatted_hours", current)
+    if current:
+        if timezone.now() - entry["fetched_at"] > timedelta(
+            seconds=settings.LIBCAL_HOURS_CACHE_TTL
+        ):
+            schedule_hours_refresh(widget_url, location_id)
+        return entry
+
+    snapshot_entry = (
+        await aget_snapshot_hours_entry(location_id)
+        if settings.SIGNS_HOURS_SNAPSHOTS
+        else None
+    )
+    if snapshot_entry is not None:
+        schedule_hours_refresh(widget_url, location_id)
+        return snapshot_entry
+
+    # Cached hours which don't include today aren't used even if LibCal fails,
+    # since every day in them has passed
+    return await arefresh_formatted_hours(widget_url, location_id)
+
+
+def refresh_formatted_hours(widget_url: str, location_id: str) -> dict | None:
+    """Format a location's hours from the LibCal hours cache (fetching them if
+    needed), and store them as the location's last known good hours.
+    Returns the new formatted hours entry, or None if there was an error."""
+    with metrics.timed("get_hours"):
+        hours_entry = get_hours_entry(widget_url, location_id)
+    entry = get_formatted_hours_from_entry(hours_entry, location_id)
+    # Empty hours mean there was an error, so keep the last known good hours
+    if entry is None:
+        return None
+
+    cache.set(get_formatted_hours_cache_key(widget_url, location_id), entry, None)
+    if not settings.SIGNS_HOURS_SNAPSHOTS:
+        return entry
+    try:
+        save_hours_snapshot(location_id, entry["hours"], entry["fetched_at"])
+    except DatabaseError as e:
+        logger.error(
+            "Unable to save hours snapshot for location %s: %s", location_id, e
+        )
+    return entry
+
+
+async def arefresh_formatted_hours(widget_url: str, location_id: str) -> dict | None:
+    """Async version of refresh_formatted_hours."""
+    with metrics.timed("get_hours"):
+        hours_entry = await aget_hours_entry(widget_url, location_id)
+    entry = get_formatted_hours_from_entry(hours_entry, location_id)
+    if entry is None:
+        return None
+
+    key = get_formatted_hours_cache_key(widget_url, location_id)
+    await cache.aset(key, entry, None)
+    if not settings.SIGNS_HOURS_SNAPSHOTS:
+        return entry
+    try:
+        # Saving changed days uses a bulk upsert, which has no async version
+        await sync_to_async(save_hours_snapshot)(
+            location_id, entry["hours"], entry["fetched_at"]
+        )
+    except DatabaseError as e:
+        logger.error(
+            "Unable to save hours snapshot for location %s: %s", location_id, e
+        )
+    return entry
+
+
+def get_formatted_hours_from_entry(hours_entry: dict, location_id: str) -> dict | None:
+    """Return a formatted hours entry for a location, from the cache entry for
+    its LibCal hours, or None if its hours can't be formatted."""
+    single_location_hours = get_single_location_hours(hours_entry["data"], location_id)
+    hours = format_hours(single_location_hours)
+    if not hours:
+        return None
+    return {
+        "hours": hours,
+        "fetched_at": hours_entry["fetched_at"],
+        "digest": get_digest(hours),
+    }
+
+
+def save_hours_snapshot(
+    location_id: str, hours: list[dict], fetched_at: datetime
+) -> int:
+    """Store a location's formatted hours in HoursSnapshot, writing only the days
+    which are new or have changed. Returns the number of days written."""
+    existing = {
+        snapshot["date"].isoformat(): snapshot
+        for snapshot in HoursSnapshot.objects.filter(
+            location_id=location_id, date__in=[day["date"] for day in hours]
+        ).values("date", "weekday", "rendered_hours", "status")
+    }
+    changed = []
+    for day in hours:
+        snapshot = existing.get(day["date"])
+        if snapshot is not None and all(
+            snapshot[field] == day[field]
+            for field in ["weekday", "rendered_hours", "status"]
+        ):
+            continue
+        changed.append(
+            HoursSnapshot(
+                location_id=location_id,
+                date=date.fromisoformat(day["date"]),
+                weekday=day["weekday"],
+                rendered_hours=day["rendered_hours"],
+                status=day["status"],
+                fetched_at=fetched_at,
+            )
+        )
+
+    if changed:
+        # Insert new days and update changed ones in one statement
+        HoursSnapshot.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=["location_id", "date"],
+            update_fields=["weekday", "rendered_hours", "status", "fetched_at"],
+        )
+    return len(changed)
+
+
+def get_snapshot_hours_entry(location_id: str) -> dict | None:
+    """Return an entry like get_formatted_hours_entry's, with this week's
+    hours from HoursSnapshot, or None if any days are missing."""
+    return get_snapshot_entry(list(get_snapshot_queryset(location_id)))
+
+
+async def aget_snapshot_hours_entry(location_id: str) -> dict | None:
+    """Async version of get_snapshot_hours_entry."""
+    snapshots = [snapshot async for snapshot in get_snapshot_queryset(location_id)]
+    return get_snapshot_entry(snapshots)
+
+
+def get_snapshot_queryset(location_id: str) -> QuerySet:
+    """Return this week's HoursSnapshot values for a location, in date order."""
+    start, end = get_display_week(timezone.localdate())
+    return (
+        HoursSnapshot.objects.filter(location_id=location_id, date__range=(start, end))
+        .order_by("date")
+        .values("date", "weekday", "rendered_hours", "status", "fetched_at")
+    )
+
+
+def get_snapshot_entry(snapshots: list[dict]) -> dict | None:
+    """Return a formatted hours entry from a week of HoursSnapshot values,
+    or None if any days are missing."""
+    if len(snapshots) != 7:
+        return None
+
+    hours = [
+        {
+            "date": snapshot["date"].isoformat(),
+            "weekday": snapshot["weekday"],
+            "rendered_hours": snapshot["rendered_hours"],
+            "status": snapshot["status"],
+        }
+        for snapshot in snapshots
+    ]
+    return {
+        "hours": hours,
+        "fetched_at": min(snapshot["fetched_at"] for snapshot in snapshots),
+        "digest": get_digest(hours),
+    }
+
+
+def get_display_week(day: date) -> tuple[date, date]:
+    """Return the first and last dates of the week displayed on day, Monday to
+    Sunday, matching format_hours. LibCal's weeks start on Sunday, so on
+    Sundays this is the following Monday to Sunday."""
+    sunday = get_week_start(day)
+    return sunday + timedelta(days=1), sunday + timedelta(days=7)
+
+
+def get_digest(data: list | dict) -> str:
+    """Return a hash of JSON-serializable data, which changes only when the data does."""
+    serialized = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def get_etag(*parts) -> str:
+    """Return a strong ETag for the data a page is rendered from."""
+    return quote_etag(get_digest(list(parts)))
+
+
+def set_cache_headers(response: HttpResponse, etag: str | None) -> HttpResponse:
+    """Add ETag and Cache-Control headers to a display response.
+    Responses without an ETag (e.g. errors) must not be cached."""
+    if etag is None:
+        patch_cache_control(response, no_cache=True)
+        return response
+    response["ETag"] = etag
+    patch_cache_control(response, max_age=settings.SIGNS_DISPLAY_MAX_AGE)
+    return response
+
+
+def get_page_cache_key(location_id: int, orientation: str, day: date) -> str:
+    """Return the cache key for a rendered display_hours page.
+    Pages depend on the date, since the current day is highlighted."""
+    return f"signs-page:{location_id}:{orientation}:{day.isoformat()}"
+
+
+def get_cached_page(cache_key: str, version: str) -> bytes | None:
+    """Return a rendered page from this process's memory or the shared cache,
+    if it was rendered from the given version of its data."""
+    page = get_local_page(cache_key)
+    if page is None or page["version"] != version:
+        page = cache.get(cache_key)
+        if page is not None and page["version"] == version:
+            set_local_page(cache_key, page)
+    hit = page is not None and page["version"] == version
+    metrics.record_cache("page", hit)
+    return page["content"] if hit else None
+
+
+def set_cached_page(cache_key: str, version: str, content: bytes) -> None:
+    """Store a rendered page in this process's memory and the shared cache,
+    with the version of the data it was rendered from."""
+    page = {"version": version, "content": content}
+    set_local_page(cache_key, page)
+    cache.set(cache_key, page, settings.SIGNS_PAGE_CACHE_TTL)
+
+
+async def aget_cached_page(cache_key: str, version: str) -> bytes | None:
+    """Async version of get_cached_page."""
+    page = get_local_page(cache_key)
+    if page is None or page["version"] != version:
+        page = await cache.aget(cache_key)
+        if page is not None and page["version"] == version:
+            set_local_page(cache_key, page)
+    hit = page is not None and page["version"] == version
+    metrics.record_cache("page", hit)
+    return page["content"] if hit else None
+
+
+async def aset_cached_page(cache_key: str, version: str, content: bytes) -> None:
+    """Async version of set_cached_page."""
+    page = {"version": version, "content": content}
+    set_local_page(cache_key, page)
+    await cache.aset(cache_key, page, settings.SIGNS_PAGE_CACHE_TTL)
+
+
+def get_local_page(cache_key: str) -> dict | None:
+    """Return a cached page from this process's memory, if it's kept there."""
+    if not settings.SIGNS_LOCAL_PAGE_CACHE_ENTRIES:
+        return None
+    return local_pages.get(cache_key)
+
+
+def set_local_page(cache_key: str, page: dict) -> None:
+    """Keep a cached page in this process's memory, unless
+    SIGNS_LOCAL_PAGE_CACHE_ENTRIES is 0."""
+    if settings.SIGNS_LOCAL_PAGE_CACHE_ENTRIES:
+        local_pages.set(cache_key, page, settings.SIGNS_PAGE_CACHE_TTL)
+
+
+def schedule_hours_refresh(widget_url: str, location_id: str) -> None:
+    """Refresh a location's formatted hours in the background, unless a refresh
+    is already running in this process."""
+    cache_key = get_formatted_hours_cache_key(widget_url, location_id)
+    with pending_refreshes_lock:
+        if cache_key in pending_refreshes:
+            return
+        pending_refreshes[cache_key] = refresh_executor.submit(
+            refresh_hours_task, widget_url, location_id, cache_key
+        )
+
+
+def refresh_hours_task(widget_url: str, location_id: str, cache_key: str) -> None:
+    """Run refresh_formatted_hours in a worker thread."""
+    try:
+        refresh_formatted_hours(widget_url, location_id)
+    except Exception:
+        logger.exception("Unable to refresh hours for location %s", location_id)
+    finally:
+        with pending_refreshes_lock:
+            pending_refreshes.pop(cache_key, None)
+        # Worker threads aren't managed by Django's request cycle,
+        # so close any database connections the cache opened.
+        connections.close_all()
+
+
+def is_current_hours(hours: list[dict]) -> bool:
+    """Return whether formatted hours include today or later."""
+    return hours[-1]["date"] >= timezone.localdate().isoformat()
+
+
+def get_formatted_hours_cache_key(widget_url: str, location_id: str) -> str:
+    """Return the cache key for a location's formatted hours."""
+    key_parts = f"{widget_url}|{location_id}"
+    return f"signs-hours:{hashlib.sha256(key_parts.encode()).hexdigest()}"
+
+
+@metrics.timed("get_single_location_hours")
 def get_single_location_hours(data: dict, location_id: str) -> dict:
     """Given a LibCal hours response, return hours for a single location."""
 
@@ -27,7 +723,9 @@ def get_single_location_hours(data: dict, location_id: str) -> dict:
 
     if location_key not in data:
         logger.error(
-            f"Location {location_id} not found in LibCal hours response: {data}"
+            "Location %s not found in LibCal hours response: %s",
+            location_id,
+            Abbreviated(data),
         )
         return {}
     else:
@@ -36,6 +734,7 @@ def get_single_location_hours(data: dict, location_id: str) -> dict:
     return data
 
 
+@metrics.timed("format_hours")
 def format_hours(data: dict) -> list[dict]:
     """Reformat and remove unnecessary data from LibCal hours response."""
     # Hours data is nested three dictionaries deep in LibCal's response
@@ -63,18 +762,25 @@ def format_hours(data: dict) -> list[dict]:
     weeks = list(data.values())[0]["weeks"]
 
     # Check that the data contains the expected number of values:
-    # 1 location, 2 weeks, 7 days each
+    # 1 location, DISPLAY_HOURS_WEEKS weeks, 7 days each
     if len(data) != 1:
-        logger.error(f"Unexpected number of locations in LibCal hours response: {data}")
+        logger.error(
+            "Unexpected number of locations in LibCal hours response: %s",
+            Abbreviated(data),
+        )
         return []
-    if len(weeks) != 2:
-        logger.error(f"Unexpected number of weeks in LibCal hours response: {data}")
+    if len(weeks) != DISPLAY_HOURS_WEEKS:
+        logger.error(
+            "Unexpected number of weeks in LibCal hours response: %s", Abbreviated(data)
+        )
         return []
 
     first_week = weeks[0]
     second_week = weeks[1]
     if (len(first_week) != 7) or (len(second_week) != 7):
-        logger.error(f"Unexpected number of days in LibCal hours response: {data}")
+        logger.error(
+            "Unexpected number of days in LibCal hours response: %s", Abbreviated(data)
+        )
         return []
 
     # We want to display Monday-Sunday, so we use the first week's Monday-Saturday
@@ -83,19 +789,73 @@ def format_hours(data: dict) -> list[dict]:
     days["Sunday"] = second_week["Sunday"]
 
     # Days dicts contain data we don't need, so reformat into a new list of dicts
-    hours = []
-    for day in days:
-        item = {}
-        item["date"] = days[day]["date"]
-        item["weekday"] = day
-        item["rendered_hours"] = days[day]["rendered"]
-        hours.append(item)
+    hours = [get_day_record(weekday, day) for weekday, day in days.items()]
 
     # Sort the final hours list by date
     hours = sorted(hours, key=lambda x: x["date"])
     return hours
 
 
+def get_day_record(weekday: str, day: dict) -> dict:
+    """Given a weekday and its day data from LibCal, return the day's date,
+    weekday, rendered hours and status (e.g. "open" or "closed")."""
+    return {
+        "date": day["date"],
+        "weekday": weekday,
+        "rendered_hours": day["rendered"],
+        "status": day.get("times", {}).get("status", ""),
+    }
+
+
+def get_display_hours_context(
+    location_name: str, orientation: str, hours: list[dict]
+) -> dict:
+    """Return the context for rendering display.html. Hours are empty if there
+    was an error retrieving them."""
+    context = {
+        "location_name": location_name,
+        "stylesheet": f"css/{orientation}.css",
+    }
+    if not hours:
+        context["error"] = "There was an error retrieving hours for this location."
+        return context
+
+    start, end = get_start_end_dates(hours)
+    context.update({"start": start, "end": end, "hours": hours})
+    return context
+
+
+def get_hours_api_data(
+    location_id: int, location_name: str, hours: list[dict], today: date
+) -> dict:
+    """Return a location's formatted hours for the JSON API."""
+    start, end = get_start_end_dates(hours)
+    return {
+        "location": {"id": location_id, "name": location_name},
+        "today": today.isoformat(),
+        "start": start,
+        "end": end,
+        "hours": hours,
+    }
+
+
+def get_hours_api_etag(digest: str, location_name: str, today: date) -> str:
+    """Return the ETag for a location's hours from the JSON API. It's computed
+    from the cached hours' digest, so it's cheap to check for changes."""
+    return get_etag("api/v1/hours", digest, location_name, today)
+
+
+def get_hours_version(location_id: int, location_name: str) -> str | None:
+    """Return the current ETag for a location's hours from the JSON API,
+    or None if hours aren't available."""
+    hours_entry = get_formatted_hours_entry(settings.LIBCAL_HOURS_WIDGET, location_id)
+    if hours_entry is None:
+        return None
+    return get_hours_api_etag(
+        hours_entry["digest"], location_name, timezone.localdate()
+    )
+
+
 def get_start_end_dates(hours: list[dict]) -> tuple[str, str]:
     """Given a formatted list of hours, return start and end dates in short
     month-day format, e.g. ("Feb 05","Feb 11")."""
@@ -135,29 +895,506 @@ def get_location_events(widget_url: str, location_id: int) -> HttpResponse:
     """Get events for a location from the LibCal widget."""
 
     widget_url += f"{location_id}"
-    response = requests.get(widget_url)
+    response = libcal_client.get(widget_url)
     return response
 
 
+def get_formatted_location_events(widget_url: str, location_id: int) -> list[dict]:
+    """Return timed events for a location, using the shared cache when possible."""
+    cache_key = get_events_cache_key(widget_url, location_id)
+    entry = cache.get(cache_key)
+    metrics.record_cache("events", entry is not None)
+    if entry is None:
+        entry = single_flight.call(
+            cache_key,
+            lambda: refresh_location_events(widget_url, location_id),
+            lambda: cache.get(cache_key),
+        )
+    return entry["events"]
+
+
+async def aget_formatted_location_events(
+    widget_url: str, location_id: int
+) -> list[dict]:
+    """Async version of get_formatted_location_events, for async views."""
+    cache_key = get_events_cache_key(widget_url, location_id)
+    entry = await cache.aget(cache_key)
+    metrics.record_cache("events", entry is not None)
+    if entry is None:
+        entry = await single_flight.acall(
+            cache_key,
+            lambda: arefresh_location_events(widget_url, location_id),
+            lambda: cache.aget(cache_key),
+        )
+    return entry["events"]
+
+
+def get_all_location_events(
+    widget_url: str, location_ids: list[int], deadline: float
+) -> dict[int, list[dict]]:
+    """Return timed events for several locations, fetching them concurrently.
+    Locations whose events aren't available within deadline seconds, or which
+    can't be retrieved, have no events."""
+    futures = {
+        location_id: events_executor.submit(
+            get_location_events_task, widget_url, location_id
+        )
+        for location_id in location_ids
+    }
+    # Unfinished requests keep running, and will cache their events when done
+    wait(futures.values(), timeout=deadline)
+    return get_finished_location_events(futures)
+
+
+async def aget_all_location_events(
+    widget_url: str, location_ids: list[int], deadline: float
+) -> dict[int, list[dict]]:
+    """Async version of get_all_location_events, which requests all of the
+    locations' events at once in the event loop, instead of in worker threads."""
+    tasks = {
+        location_id: asyncio.ensure_future(
+            aget_formatted_location_events(widget_url, location_id)
+        )
+        for location_id in location_ids
+    }
+    if tasks:
+        await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in tasks.values():
+        if not task.done():
+            pending_event_tasks.add(task)
+            task.add_done_callback(pending_event_tasks.discard)
+    return get_finished_location_events(tasks)
+
+
+def get_finished_location_events(
+    futures: dict[int, Future | asyncio.Future],
+) -> dict[int, list[dict]]:
+    """Return the events from each location's future, or no events for
+    locations whose future is unfinished, or failed."""
+    location_events = {}
+    for location_id, future in futures.items():
+        if not future.done():
+            logger.warning("Timed out getting events for location %s", location_id)
+            location_events[location_id] = []
+        elif future.exception() is not None:
+            logger.error(
+                "Unable to get events for location %s: %s",
+                location_id,
+                future.exception(),
+            )
+            location_events[location_id] = []
+        else:
+            location_events[location_id] = future.result()
+    return location_events
+
+
+def get_screen_rooms(screen_id: int) -> tuple[EventScreen, list[EventRoom]]:
+    """Return an event screen and its rooms, in display order.
+    The screen is loaded with its rooms, in one query, unless it has no rooms.
+    Raises EventScreen.DoesNotExist if there's no such screen."""
+    rooms = list(EventRoom.objects.select_related("screen").filter(screen_id=screen_id))
+    if rooms:
+        return rooms[0].screen, rooms
+    return EventScreen.objects.get(id=screen_id), rooms
+
+
+async def aget_screen_rooms(screen_id: int) -> tuple[EventScreen, list[EventRoom]]:
+    """Async version of get_screen_rooms."""
+    rooms = [
+        room
+        async for room in EventRoom.objects.select_related("screen").filter(
+            screen_id=screen_id
+        )
+    ]
+    if rooms:
+        return rooms[0].screen, rooms
+    return await EventScreen.objects.aget(id=screen_id), rooms
+
+
+def get_screen_events(
+    widget_url: str,
+    rooms: list[EventRoom],
+    deadline: float,
+    window: EventWindow | None = None,
+) -> list[dict]:
+    """Return a column for each room on an event screen, with its name, grid
+    column, and formatted events in the window (by default, from settings).
+    All the rooms' events are fetched together.
+    Events come from the LibCal API if it's configured, otherwise from the widget."""
+    # Rooms on the same calendar share its events
+    location_ids = list(dict.fromkeys(room.location_id for room in rooms))
+    if libcal_api.is_configured():
+        location_events = get_all_api_location_events(location_ids, deadline)
+    else:
+        location_events = get_all_location_events(widget_url, location_ids, deadline)
+    return get_screen_columns(rooms, location_events, window or get_event_window())
+
+
+async def aget_screen_events(
+    widget_url: str,
+    rooms: list[EventRoom],
+    deadline: float,
+    window: EventWindow | None = None,
+) -> list[dict]:
+    """Async version of get_screen_events, for async views."""
+    location_ids = list(dict.fromkeys(room.location_id for room in rooms))
+    if libcal_api.is_configured():
+        # The LibCal API client (with its token handling) is synchronous,
+        # so it's called in a thread, outside the thread sensitive executor which
+        # the cache's and ORM's async methods share
+        location_events = await sync_to_async(
+            get_all_api_location_events, thread_sensitive=False
+        )(location_ids, deadline)
+    else:
+        location_events = await aget_all_location_events(
+            widget_url, location_ids, deadline
+        )
+    return get_screen_columns(rooms, location_events, window or get_event_window())
+
+
+def has_cached_events(widget_url: str, location_ids: list[int]) -> bool:
+    """Return whether every location's events are in the cache. Events are
+    cached whenever they're retrieved, and errors never are, so after
+    get_screen_events, this is whether all of the rooms' events were available."""
+    if libcal_api.is_configured():
+        cache_keys = [
+            get_api_events_cache_key(location_id) for location_id in location_ids
+        ]
+    else:
+        cache_keys = [
+            get_events_cache_key(widget_url, location_id)
+            for location_id in location_ids
+        ]
+    return len(cache.get_many(cache_keys)) == len(set(cache_keys))
+
+
+def get_screen_columns(
+    rooms: list[EventRoom], location_events: dict[int, list[dict]], window: EventWindow
+) -> list[dict]:
+    """Return a column for each room on an event screen, with its name, grid
+    column, and its location's events formatted for the window."""
+    return [
+        {
+            "name": room.name,
+            # the first column has the time markers
+            "css_column": str(column),
+            "events": format_timed_events(location_events[room.location_id], window),
+        }
+        for column, room in enumerate(rooms, start=2)
+    ]
+
+
+def get_all_api_location_events(
+    location_ids: list[int], deadline: float
+) -> dict[int, list[dict]]:
+    """Return timed events for several locations from the LibCal API.
+    Locations have no events if they aren't available within deadline seconds."""
+    future = events_executor.submit(get_api_location_events_task, location_ids)
+    try:
+        return future.result(timeout=deadline)
+    except FutureTimeoutError:
+        logger.warning("Timed out getting events for locations %s", location_ids)
+    except libcal_api.LibCalAPIError as e:
+        logger.error("Unable to get events for locations %s: %s", location_ids, e)
+    return {location_id: [] for location_id in location_ids}
+
+
+def get_api_location_events_task(location_ids: list[int]) -> dict[int, list[dict]]:
+    """Run get_api_location_events in a worker thread."""
+    try:
+        return get_api_location_events(location_ids)
+    finally:
+        connections.close_all()
+
+
+def get_api_location_events(location_ids: list[int]) -> dict[int, list[dict]]:
+    """Return timed events for several locations from the LibCal API, using
+    the shared cache when possible. Locations which aren't cached are all
+    requested together, in one API call."""
+    cache_keys = {
+        location_id: get_api_events_cache_key(location_id)
+        for location_id in location_ids
+    }
+    entries = cache.get_many(cache_keys.values())
+    for cache_key in cache_keys.values():
+        metrics.record_cache("api_events", cache_key in entries)
+    missing = [
+        location_id
+        for location_id, cache_key in cache_keys.items()
+        if cache_key not in entries
+    ]
+    if missing:
+        missing_keys = [cache_keys[location_id] for location_id in missing]
+
+        def lookup() -> dict | None:
+            # Another worker's fetch is only useful once all its entries are cached
+            found = cache.get_many(missing_keys)
+            return found if len(found) == len(missing_keys) else None
+
+        batch_key = "libcal-api-events:" + ",".join(str(lid) for lid in sorted(missing))
+        entries.update(
+            single_flight.call(batch_key, lambda: refresh_api_events(missing), lookup)
+        )
+    return {
+        location_id: entries[cache_key]["events"]
+        for location_id, cache_key in cache_keys.items()
+    }
+
+
+def refresh_api_events(location_ids: list[int]) -> dict[str, dict]:
+    """Get events for several locations from the LibCal API in one request,
+    and store their titles and times in the cache.
+    Returns the new cache entries, by cache key."""
+    api_events = libcal_api.get_events(location_ids)
+    fetched_at = timezone.now()
+    entries = {}
+    for location_id, events in api_events.items():
+        # API events already have datetimes, so no text needs to be parsed
+        timed_events = [
+            {
+                "title": event["title"],
+                "start_time": event["start"].time(),
+                "end_time": event["end"].time(),
+            }
+            for event in events
+        ]
+        entries[get_api_events_cache_key(location_id)] = {
+            "events": timed_events,
+            "fetched_at": fetched_at,
+        }
+    cache.set_many(entries, settings.LIBCAL_EVENTS_CACHE_TTL)
+    return entries
+
+
+def get_api_events_cache_key(location_id: int) -> str:
+    """Return the cache key for a location's timed events from the LibCal API."""
+    key_parts = f"{settings.LIBCAL_API_URL}|{location_id}"
+    return f"libcal-api-events:{hashlib.sha256(key_parts.encode()).hexdigest()}"
+
+
+def get_location_events_task(widget_url: str, location_id: int) -> list[dict]:
+    """Run get_formatted_location_events in a worker thread."""
+    try:
+        return get_formatted_location_events(widget_url, location_id)
+    finally:
+        # Worker threads aren't managed by Django's request cycle,
+        # so close any database connections the cache opened.
+        connections.close_all()
+
+
+def refresh_location_events(widget_url: str, location_id: int) -> dict:
+    """Get and parse events for a location from the LibCal widget,
+    and store their titles and times in the cache.
+    Entries are dicts with "events" (as from get_timed_events) and "fetched_at".
+    Events are laid out for each display when they're displayed."""
+    response = get_location_events(widget_url, location_id)
+    entry = get_location_events_entry(response, location_id)
+    # Don't cache errors, so the next request tries LibCal again
+    if response.status_code == 200:
+        cache.set(
+            get_events_cache_key(widget_url, location_id),
+            entry,
+            settings.LIBCAL_EVENTS_CACHE_TTL,
+        )
+    return entry
+
+
+async def arefresh_location_events(widget_url: str, location_id: int) -> dict:
+    """Async version of refresh_location_events, using the async LibCal client."""
+    response = await libcal_client.aget(f"{widget_url}{location_id}")
+    entry = get_location_events_entry(response, location_id)
+    if response.status_code == 200:
+        await cache.aset(
+            get_events_cache_key(widget_url, location_id),
+            entry,
+            settings.LIBCAL_EVENTS_CACHE_TTL,
+        )
+    return entry
+
+
+def get_location_events_entry(
+    response: HttpResponse | httpx.Response, location_id: int
+) -> dict:
+    """Return a location's events cache entry, from the LibCal widget's response.
+    If the request failed, the error is logged, and the entry has no events."""
+    entry = {"events": [], "fetched_at": timezone.now()}
+    if response.status_code != 200:
+        logger.error(
+            "LibCal events request for %s failed: %s", location_id, response.status_code
+        )
+        return entry
+    entry["events"] = get_timed_events(parse_events(response))
+    return entry
+
+
+def get_events_cache_key(widget_url: str, location_id: int) -> str:
+    """Return the cache key for a location's timed events."""
+    key_parts = f"{widget_url}|{location_id}"
+    return f"libcal-events:{hashlib.sha256(key_parts.encode()).hexdigest()}"
+
+
+@metrics.timed("parse_events")
 def parse_events(response: HttpResponse) -> list[dict]:
-    """Parse the HTML response from the LibCal widget using BeautifulSoup.
+    """Parse the HTML response from the LibCal widget in a single pass.
     Return a list of events, each as a dictionary with title and times."""
     if b"No events are scheduled." in response.content:
         return []
-    else:
-        soup = BeautifulSoup(response.content, "html.parser")
-        events = []
-        for li in soup.find_all("li"):
-            # events are in the form <li><a>Event Title</a><span>Event Times</span></li>
-            a_content = li.find("a").text if li.find("a") else ""
-            span_content = li.find("span").text if li.find("span") else ""
-            events.append({"title": a_content, "times": span_content})
-    return events
+    return extract_events(response.content.decode("utf-8", errors="replace"))
+
+
+def get_event_window(params: Mapping[str, str] | None = None) -> EventWindow:
+    """Return the event window for a display, from its "start", "end" and "slot"
+    query parameters, e.g. ?start=07:00&end=22:00&slot=15.
+    Missing parameters, or all of them if any are invalid, come from settings."""
+    default = make_event_window(
+        settings.SIGNS_EVENTS_WINDOW_START,
+        settings.SIGNS_EVENTS_WINDOW_END,
+        settings.SIGNS_EVENTS_SLOT_MINUTES,
+    )
+    if not params:
+        return default
+
+    try:
+        return make_event_window(
+            params.get("start", settings.SIGNS_EVENTS_WINDOW_START),
+            params.get("end", settings.SIGNS_EVENTS_WINDOW_END),
+            params.get("slot", settings.SIGNS_EVENTS_SLOT_MINUTES),
+        )
+    except ValueError as e:
+        logger.warning("Invalid event window %s, using default: %s", dict(params), e)
+        return default
+
+
+def make_event_window(start: str, end: str, slot_minutes: int | str) -> EventWindow:
+    """Given start and end times like "08:00" and a slot size in minutes, return
+    an EventWindow, widened to whole slots.
+    Raises ValueError if they don't describe a window."""
+    slot_minutes = int(slot_minutes)
+    # Slots have to divide hours evenly, so each hour marker starts a row
+    if slot_minutes <= 0 or 60 % slot_minutes:
+        raise ValueError(f"slot of {slot_minutes} minutes doesn't divide an hour")
+    start_minute = parse_window_time(start)
+    end_minute = parse_window_time(end)
+    if start_minute >= end_minute:
+        raise ValueError(f"start {start} isn't before end {end}")
+    return EventWindow(
+        start_minute - start_minute % slot_minutes,
+        end_minute + -end_minute % slot_minutes,
+        slot_minutes,
+    )
+
+
+def parse_window_time(text: str) -> int:
+    """Given a time like "08:00" or "24:00", return minutes after midnight.
+    Raises ValueError if it isn't a time of day."""
+    hours, minutes = (int(part) for part in text.split(":"))
+    minute = hours * 60 + minutes
+    if hours < 0 or not 0 <= minutes < 60 or minute > 24 * 60:
+        raise ValueError(f"{text} isn't a time of day")
+    return minute
+
+
+def get_display_events_context(
+    screen_name: str, columns: list[dict], window: EventWindow
+) -> dict:
+    """Return the context for rendering display_events.html, given the
+    columns from get_screen_events."""
+    return {
+        "screen_name": screen_name,
+        "columns": columns,
+        "time_markers": get_time_markers(window),
+        # a row for the location names, the slots, and the marker for the end time
+        "grid_rows": (window.end - window.start) // window.slot_minutes + 2,
+    }
+
+
+def get_events_api_data(
+    screen: EventScreen, columns: list[dict], window: EventWindow
+) -> dict:
+    """Return an event screen's formatted events for the JSON API, with
+    everything a display shell needs to lay them out."""
+    context = get_display_events_context(screen.name, columns, window)
+    return {
+        "screen": {"id": screen.id, "name": screen.name},
+        "window": {
+            "start": format_minute(window.start),
+            "end": format_minute(window.end),
+            "slot_minutes": window.slot_minutes,
+        },
+        "grid_rows": context["grid_rows"],
+        "time_markers": context["time_markers"],
+        "columns": [
+            {
+                "name": column["name"],
+                "css_column": column["css_column"],
+                "events": [
+                    {
+                        "title": event["title"],
+                        "start_time": event["start_time"].isoformat("minutes"),
+                        "end_time": event["end_time"].isoformat("minutes"),
+                        # as the events template displays the times
+                        "times": f"{localize(event['start_time'])} - "
+                        f"{localize(event['end_time'])}",
+                        "start_css_row": event["start_css_row"],
+                        "end_css_row": event["end_css_row"],
+                        "lane": event["lane"],
+                        "lanes": event["lanes"],
+                    }
+                    for event in column["events"]
+                ],
+            }
+            for column in columns
+        ],
+    }
+
 
+def get_events_api_etag(
+    screen_name: str, columns: list[dict], window: EventWindow
+) -> str:
+    """Return the ETag for an event screen's events from the JSON API."""
+    return get_etag("api/v1/events", screen_name, columns, window)
+
+
+def get_events_version(
+    screen_name: str, rooms: list[EventRoom], window: EventWindow
+) -> str:
+    """Return the current ETag for an event screen's events from the JSON API."""
+    columns = get_screen_events(
+        settings.LIBCAL_EVENTS_WIDGET, rooms, settings.LIBCAL_EVENTS_DEADLINE, window
+    )
+    return get_events_api_etag(screen_name, columns, window)
 
-def format_events(events: list[dict]) -> list[dict]:
+
+def format_minute(minute: int) -> str:
+    """Given minutes after midnight, return the time like "08:00"."""
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def get_time_markers(window: EventWindow) -> list[dict]:
+    """Return a label (e.g. "8 AM") and grid row for each hour in the window."""
+    first_hour = window.start + -window.start % 60
+    markers = []
+    for minute in range(first_hour, window.end + 1, 60):
+        hour = minute // 60 % 24
+        suffix = "AM" if hour < 12 else "PM"
+        markers.append(
+            {
+                "label": f"{hour % 12 or 12} {suffix}",
+                "css_row": str(get_grid_row(minute, window)),
+            }
+        )
+    return markers
+
+
+def format_events(events: list[dict], window: EventWindow | None = None) -> list[dict]:
     """Format events for display on the digital sign."""
-    parsed_events = []
+    return format_timed_events(get_timed_events(events), window)
+
+
+def get_timed_events(events: list[dict]) -> list[dict]:
+    """Given events parsed from the LibCal widget, return their titles,
+    with start_time and end_time as datetime.time."""
+    timed_events = []
     for event in events:
         # events are in the form of "8:00am - 12:00pm, Friday, February 2, 2024"
         # we only want the times, trimmed of spaces if needed.
@@ -165,40 +1402,120 @@ def format_events(events: list[dict]) -> list[dict]:
         start, end = (time.strip() for time in times.split(" - "))
 
         # we now have times in the form of "8:00am"
-        # convert to datetime.time
-        strptime_format = "%I:%M%p"
-        start_time = datetime.strptime(start, strptime_format).time()
-        end_time = datetime.strptime(end, strptime_format).time()
-
-        # only display events starting and ending between 8am and 8pm
-        if (start_time >= datetime.strptime("8:00am", strptime_format).time()) and (
-            end_time <= datetime.strptime("8:00pm", strptime_format).time()
-        ):
-            start_css_row = get_css_grid_row(start_time)
-            end_css_row = get_css_grid_row(end_time)
-            parsed_events.append(
-                {
-                    "title": event["title"],
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "start_css_row": start_css_row,
-                    "end_css_row": end_css_row,
-                }
-            )
+        timed_events.append(
+            {
+                "title": event["title"],
+                "start_time": get_event_time(start),
+                "end_time": get_event_time(end),
+            }
+        )
+    return timed_events
+
+
+@metrics.timed("format_events")
+def format_timed_events(
+    events: list[dict], window: EventWindow | None = None
+) -> list[dict]:
+    """Given events with title, start_time and end_time (as datetime.time),
+    return the events to display in the window, with their grid rows.
+    Events are clipped to the window, and overlapping events are given lanes
+    so they can be displayed side by side: each event has a "lane", and
+    "lanes", the number of lanes used by the events it overlaps."""
+    window = window or get_event_window()
+    spans = []
+    for event in events:
+        start = get_minute(event["start_time"])
+        end = get_minute(event["end_time"])
+        if end < start:
+            # the event ends at midnight
+            end = 24 * 60
+        start, end = max(start, window.start), min(end, window.end)
+        if start < end:
+            spans.append((start, end, event))
+    spans.sort(key=lambda span: span[:2])
+
+    parsed_events = []
+    # Sweep through events by start time. Each group of overlapping events
+    # shares a set of lanes, and events take the lowest lane free when they start.
+    ending = []  # (end, lane) of events in the current group, by end
+    free_lanes = []
+    lane_count = 0
+    group = []
+    for start, end, event in spans:
+        while ending and ending[0][0] <= start:
+            heapq.heappush(free_lanes, heapq.heappop(ending)[1])
+        if not ending:
+            # nothing still running overlaps this event, so start a new group
+            for parsed_event in group:
+                parsed_event["lanes"] = lane_count
+            group, free_lanes, lane_count = [], [], 0
+        if free_lanes:
+            lane = heapq.heappop(free_lanes)
+        else:
+            lane = lane_count
+            lane_count += 1
+        heapq.heappush(ending, (end, lane))
+
+        parsed_event = {
+            "title": event["title"],
+            "start_time": event["start_time"],
+            "end_time": event["end_time"],
+            "start_css_row": str(get_grid_row(start, window)),
+            # events ending partway through a slot fill it
+            "end_css_row": str(get_grid_row(end, window, round_up=True)),
+            "lane": lane,
+        }
+        group.append(parsed_event)
+        parsed_events.append(parsed_event)
+    for parsed_event in group:
+        parsed_event["lanes"] = lane_count
     return parsed_events
 
 
-def get_css_grid_row(time: datetime) -> str:
+def get_event_time(text: str) -> time:
+    """Given a LibCal event time, e.g. "8:00am", return it as a time."""
+    try:
+        return EVENT_TIMES[text]
+    except KeyError:
+        # Not in the usual format, e.g. uppercase, so parse it the slow way
+        return datetime.strptime(text, EVENT_TIME_FORMAT).time()
+
+
+def get_minute(event_time: time) -> int:
+    """Return a time as minutes after midnight."""
+    return event_time.hour * 60 + event_time.minute
+
+
+def get_grid_row(minute: int, window: EventWindow, round_up: bool = False) -> int:
+    """Given minutes after midnight, return the grid row of the slot containing
+    them, or of the next slot if round_up and they're partway through a slot."""
+    # the window's start is row 2, below the location names
+    slots, remainder = divmod(minute - window.start, window.slot_minutes)
+    if round_up and remainder:
+        slots += 1
+    return slots + 2
+
+
+def get_css_grid_row(event_time: time, window: EventWindow | None = None) -> str:
     """Given a time, return the grid row that corresponds to the time."""
-    # time is a datetime object with only the time set
-    # return the grid row that corresponds to the time
-    # 8am is row 2, 8:30am is row 3, 9am is row 4, etc.
-    hour = time.hour
-    minute = time.minute
-
-    # events starting on the half hour or later should be on the next row
-    # so add 0.5 to the hour (since we multiply by 2 in getting the row number)
-    if minute >= 30:
-        hour += 0.5
-
-    return str(int((hour - 8) * 2 + 2))
+    # e.g. with the default window, 8am is row 2, 8:30am is row 3, 9am is row 4
+    return str(get_grid_row(get_minute(event_time), window or get_event_window()))
+
+
+def build_event_times() -> dict[str, time]:
+    """Return every time of day in LibCal's event format, e.g. "8:00am",
+    mapped to its time."""
+    event_times = {}
+    for minute in range(24 * 60):
+        event_time = time(minute // 60, minute % 60)
+        hour = event_time.hour % 12 or 12
+        suffix = "am" if event_time.hour < 12 else "pm"
+        # LibCal doesn't zero-pad hours, but accept them like strptime does
+        event_times[f"{hour}:{event_time.minute:02d}{suffix}"] = event_time
+        event_times[f"{hour:02d}:{event_time.minute:02d}{suffix}"] = event_time
+    return event_times
+
+
+# Lookup table for event times, so they aren't parsed for every event
+EVENT_TIME_FORMAT = "%I:%M%p"
+EVENT_TIMES = build_event_times()
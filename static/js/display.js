@@ -0,0 +1,144 @@
+// Display shells (signs/templates/signs/display_live.html and display_events_live.html)
+// fetch data from the signs JSON API, and update the page only when it changes.
+// Browsers with EventSource fetch when the update stream says the data has changed;
+// others poll the API.
+(function () {
+  "use strict";
+
+  const main = document.querySelector("main[data-api-url]");
+  const apiUrl = main.dataset.apiUrl;
+  const streamUrl = main.dataset.streamUrl;
+  const pollInterval = Number(main.dataset.pollInterval) * 1000;
+  const render = main.dataset.display === "events" ? renderEvents : renderHours;
+  let lastETag = null;
+
+  async function refresh() {
+    try {
+      // "no-cache" revalidates the browser's copy with its ETag, so unchanged
+      // data is a small 304 response, and is reused from the browser's cache
+      const response = await fetch(apiUrl, { cache: "no-cache" });
+      const eTag = response.headers.get("ETag");
+      if (response.ok && eTag !== lastETag) {
+        render(await response.json());
+        lastETag = eTag;
+      } else if (!response.ok && lastETag === null) {
+        showError((await response.json()).error);
+      }
+    } catch (error) {
+      // Keep displaying the last data until the API is available again
+      console.error(error);
+    }
+  }
+
+  async function poll() {
+    await refresh();
+    setTimeout(poll, pollInterval);
+  }
+
+  function listen() {
+    // The stream sends the API's current ETag when connected, and whenever it
+    // changes. EventSource reconnects by itself when the stream ends or fails.
+    const source = new EventSource(streamUrl);
+    source.addEventListener("update", (event) => {
+      if (JSON.parse(event.data).etag !== lastETag) {
+        refresh();
+      }
+    });
+  }
+
+  function showError(message) {
+    const error = main.querySelector(".error");
+    if (error) {
+      error.textContent = message;
+      error.hidden = false;
+    }
+  }
+
+  function element(tagName, className, text) {
+    const node = document.createElement(tagName);
+    if (className) {
+      node.className = className;
+    }
+    if (text !== undefined) {
+      node.textContent = text;
+    }
+    return node;
+  }
+
+  function renderHours(data) {
+    main.querySelector(".error").hidden = true;
+    main.querySelector("h1").textContent = data.location.name;
+    main.querySelector(".dates").textContent = `${data.start} - ${data.end}`;
+
+    // Landscape displays split the week into two lists, after Thursday
+    const lists = main.querySelectorAll(".columns ul");
+    const split = lists.length > 1 ? 4 : data.hours.length;
+    const days = [data.hours.slice(0, split), data.hours.slice(split)];
+    lists.forEach((list, index) => {
+      // Reuse the existing list items, so only changed text is replaced
+      while (list.children.length > days[index].length) {
+        list.lastElementChild.remove();
+      }
+      while (list.children.length < days[index].length) {
+        const item = element("li");
+        item.append(element("span", "day"), element("span", "time"));
+        list.append(item);
+      }
+      days[index].forEach((day, position) => {
+        const item = list.children[position];
+        item.classList.toggle("today", day.date === data.today);
+        setText(item.querySelector(".day"), day.weekday);
+        setText(item.querySelector(".time"), day.rendered_hours);
+      });
+    });
+  }
+
+  function setText(node, text) {
+    if (node.textContent !== text) {
+      node.textContent = text;
+    }
+  }
+
+  function renderEvents(data) {
+    main.querySelector("h1").textContent = data.screen.name;
+    const calendar = main.querySelector(".calendar");
+    calendar.style.gridTemplateRows = `repeat(${data.grid_rows}, 1fr)`;
+    calendar.style.gridTemplateColumns =
+      `80px repeat(${data.columns.length}, minmax(0, 1fr))`;
+
+    // The same elements as signs/templates/signs/display_events.html
+    const nodes = [];
+    data.columns.forEach((column) => {
+      const marker = element("div", "loc-marker", column.name);
+      marker.style.gridRow = "1";
+      marker.style.gridColumn = column.css_column;
+      nodes.push(marker);
+    });
+    nodes.push(element("div", "time-marker"));
+    data.time_markers.forEach((timeMarker) => {
+      const marker = element("div", "time-marker", timeMarker.label);
+      marker.style.gridRowStart = timeMarker.css_row;
+      nodes.push(marker);
+    });
+    data.columns.forEach((column) => {
+      column.events.forEach((event) => {
+        const node = element("div", "event");
+        node.style.gridColumn = column.css_column;
+        node.style.gridRowStart = event.start_css_row;
+        node.style.gridRowEnd = event.end_css_row;
+        node.style.width = `${Math.round(100 / event.lanes)}%`;
+        node.style.marginLeft = `${Math.round((100 * event.lane) / event.lanes)}%`;
+        node.append(element("p", null, event.title), element("p", null, event.times));
+        nodes.push(node);
+      });
+    });
+    calendar.replaceChildren(...nodes);
+  }
+
+  if (streamUrl && window.EventSource) {
+    refresh();
+    listen();
+  } else {
+    poll();
+  }
+})();